@@ -4,6 +4,8 @@ from typing import Any, Callable, Coroutine
 
 from app.db import Database
 from app.http import HTTPClient
+from app.leaderboard import LeaderboardRefresher
+from app.scheduler import SyncScheduler
 from app.state import State
 from app.sync import OWSync
 from fastapi import FastAPI as OriginalFastAPI
@@ -25,6 +27,8 @@ class FastAPI(OriginalFastAPI):
     http: HTTPClient
     app_state: State
     ow_sync: OWSync
+    sync_scheduler: SyncScheduler
+    leaderboard_refresher: LeaderboardRefresher
 
     def set_db(self, db: Database) -> None:
         self.db = db
@@ -38,6 +42,14 @@ class FastAPI(OriginalFastAPI):
     def set_ow_sync(self, ow_sync: OWSync) -> None:
         self.ow_sync = ow_sync
 
+    def set_sync_scheduler(self, sync_scheduler: SyncScheduler) -> None:
+        self.sync_scheduler = sync_scheduler
+
+    def set_leaderboard_refresher(
+        self, leaderboard_refresher: LeaderboardRefresher
+    ) -> None:
+        self.leaderboard_refresher = leaderboard_refresher
+
 
 class Request(OriginalRequest):
     app: FastAPI
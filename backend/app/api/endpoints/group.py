@@ -2,17 +2,31 @@
 Group endpoints
 """
 
-from typing import Any
+from typing import Any, Awaitable, Callable, Hashable
 
 from app.api import APIRoute, Request
-from app.exceptions import DatabaseIntegrityException, NotFound, PunishmentTypeNotExists
+from app.exceptions import (
+    DatabaseIntegrityException,
+    InvalidCursor,
+    NotFound,
+    NotInGroup,
+    PunishmentTypeNotExists,
+)
 from app.models.group import Group, GroupCreate
 from app.models.group_member import GroupMemberCreate
+from app.models.group_stats import GroupStats, StatsBucket
 from app.models.group_user import GroupUser
-from app.models.punishment import PunishmentCreate
+from app.models.punishment import PunishmentCreate, PunishmentFilters, PunishmentPage
 from app.models.punishment_type import PunishmentTypeCreate
 from app.types import GroupId, OWGroupUserId, PunishmentTypeId, UserId
-from fastapi import APIRouter, HTTPException
+from app.utils.etag import gzip_etag, make_etag, match_etag, not_modified
+from app.utils.pagination import decode_cursor, encode_cursor
+from asyncpg import Pool
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+
+PUNISHMENTS_PAGE_SIZE = 20
+MAX_PUNISHMENTS_PAGE_SIZE = 100
 
 router = APIRouter(
     prefix="/group",
@@ -21,10 +35,61 @@ router = APIRouter(
 )
 
 
+async def group_response(
+    request: Request,
+    group_id: GroupId,
+    load: Callable[[Pool], Awaitable[str]],
+    *,
+    cache_key: Hashable | None = None,
+) -> Response:
+    """Responds with the JSON body returned by `load`, with an ETag of the
+    group's version, or with 304 if the client has it already. With a
+    `cache_key`, identifying the body within the group, the body is cached
+    with its gzip variant while the group is unchanged.
+
+    The version and the body are read on the connection passed to `load`,
+    so both come from the same server, the primary or the read replica.
+    """
+    app = request.app
+    async with app.db.read_pool.acquire() as conn:
+        try:
+            version = await app.db.get_group_version(group_id, conn=conn)
+        except NotFound:
+            return Response(content=await load(conn), media_type="application/json")
+
+        etag = make_etag(request, version)
+        matched = match_etag(request, etag)
+        if matched is not None:
+            return not_modified(matched)
+
+        # A write between reading the version and the body only makes the
+        # next request miss the cache and the ETag.
+        if cache_key is None:
+            content = await load(conn)
+            response = Response(content=content, media_type="application/json")
+        else:
+            cache = app.app_state.group_responses
+            key = (cache_key, group_id, version)
+            cached = cache.get(key)
+            if cached is None:
+                cached = cache.set(key, (await load(conn)).encode())
+
+            accept_encoding = request.headers.get("Accept-Encoding", "")
+            response = cached.to_response(
+                accept_encoding, media_type="application/json"
+            )
+            if response.headers.get("Content-Encoding") == "gzip":
+                etag = gzip_etag(etag)
+
+    response.headers["ETag"] = etag
+    return response
+
+
 @router.get("/me")
 async def get_my_groups(
     request: Request,
     wait_for_updates: bool = True,
+    force: bool = False,
 ) -> list[dict[str, Any]]:
     app = request.app
     access_token = request.raise_if_missing_authorization()
@@ -41,6 +106,7 @@ async def get_my_groups(
         ow_user_id,
         user_id,
         wait_for_updates=wait_for_updates,
+        force=force,
     )
 
     groups = await app.db.get_user_groups(user_id)
@@ -50,39 +116,162 @@ async def get_my_groups(
 @router.get("/{group_id}/user/{user_id}")
 async def get_group_user(
     request: Request,
+    response: Response,
     group_id: GroupId,
     user_id: UserId,
-) -> GroupUser:
+    punishments: bool = True,
+) -> GroupUser | Response:
     """
     Endpoint to get a user in the context of a group.
     """
     app = request.app
     try:
-        return await app.db.get_group_user(group_id, user_id)
+        etag = make_etag(request, await app.db.get_group_version(group_id))
+        matched = match_etag(request, etag)
+        # The group's version says nothing of whether the user is a member
+        if matched is not None and await app.db.is_in_group(user_id, group_id):
+            return not_modified(matched)
+
+        response.headers["ETag"] = etag
+        return await app.db.get_group_user(
+            group_id,
+            user_id,
+            punishments=punishments,
+        )
     except NotFound as exc:
         raise HTTPException(
             status_code=404, detail="User not found or not in group"
         ) from exc
 
 
-@router.get("/{group_id}/users")
-async def get_group_users(request: Request, group_id: GroupId) -> list[GroupUser]:
+@router.get("/{group_id}/user/{user_id}/punishments")
+async def get_group_user_punishments(
+    request: Request,
+    group_id: GroupId,
+    user_id: UserId,
+    limit: int = Query(
+        default=PUNISHMENTS_PAGE_SIZE, ge=1, le=MAX_PUNISHMENTS_PAGE_SIZE
+    ),
+    cursor: str | None = None,
+    filters: PunishmentFilters = Depends(),
+) -> PunishmentPage:
     """
-    Endpoint to get all users in a group.
+    Endpoint to get a page of a user's punishments in a group, newest first.
+    Pass the `next_cursor` of a page as `cursor` to get the next page.
     """
     app = request.app
 
-    return await app.db.get_group_users(group_id)
+    try:
+        after = decode_cursor(cursor) if cursor is not None else None
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+
+    # Fetching one extra tells if there is a next page
+    punishments = await app.db.get_punishments_page(
+        group_id,
+        user_id,
+        limit + 1,
+        after=after,
+        filters=filters,
+    )
+
+    next_cursor = None
+    if len(punishments) > limit:
+        punishments = punishments[:limit]
+        last = punishments[-1]
+        next_cursor = encode_cursor(last.created_time, last.punishment_id)
+
+    return PunishmentPage(punishments=punishments, next_cursor=next_cursor)
 
 
-@router.get("/{group_id}")
-async def get_group(request: Request, group_id: GroupId) -> Group:
+@router.get("/{group_id}/stats")
+async def get_group_stats(
+    request: Request,
+    group_id: GroupId,
+    bucket: StatsBucket = StatsBucket.WEEK,
+) -> GroupStats:
     """
-    Endpoint to get a specific group.
+    Endpoint to get the punishments created, and the value issued and
+    verified, per day, week or month and per punishment type.
     """
     app = request.app
     try:
-        return await app.db.get_group(group_id)
+        version = await app.db.get_group_version(group_id)
+    except NotFound as exc:
+        raise HTTPException(status_code=404, detail="Group not found") from exc
+
+    stats = app.app_state.get_group_stats(group_id, bucket, version)
+    if stats is None:
+        # A write between reading the version and the statistics only makes
+        # the next read miss the cache.
+        stats = await app.db.get_group_stats(group_id, bucket)
+        app.app_state.add_group_stats(version, stats)
+
+    return stats
+
+
+@router.get("/{group_id}/users", response_model=list[GroupUser])
+async def get_group_users(
+    request: Request,
+    group_id: GroupId,
+    punishments: bool = True,
+    stream: bool = False,
+    filters: PunishmentFilters = Depends(),
+) -> Response:
+    """
+    Endpoint to get all users in a group. With `stream` the users are sent
+    in chunks as they are read from the database, for very large groups.
+    """
+    app = request.app
+
+    if stream:
+        return StreamingResponse(
+            app.db.stream_group_users_json(
+                group_id,
+                punishments=punishments,
+                filters=filters,
+            ),
+            media_type="application/json",
+        )
+
+    # The database returns the response body as JSON already
+    def load(conn: Pool) -> Awaitable[str]:
+        return app.db.get_group_users_json(
+            group_id,
+            punishments=punishments,
+            filters=filters,
+            conn=conn,
+        )
+
+    cache_key = ("users", punishments) if filters == PunishmentFilters() else None
+    return await group_response(request, group_id, load, cache_key=cache_key)
+
+
+@router.get("/{group_id}", response_model=Group)
+async def get_group(
+    request: Request,
+    group_id: GroupId,
+    punishments: bool = True,
+    filters: PunishmentFilters = Depends(),
+) -> Response:
+    """
+    Endpoint to get a specific group. The punishments of the members can be
+    filtered, e.g. `verified=false` for the unpaid ones. Unfiltered groups
+    are served from a cache until the group changes.
+    """
+    app = request.app
+
+    def load(conn: Pool) -> Awaitable[str]:
+        return app.db.get_group_json(
+            group_id,
+            punishments=punishments,
+            filters=filters,
+            conn=conn,
+        )
+
+    cache_key = ("group", punishments) if filters == PunishmentFilters() else None
+    try:
+        return await group_response(request, group_id, load, cache_key=cache_key)
     except NotFound as exc:
         raise HTTPException(status_code=404, detail="Group not found") from exc
 
@@ -115,28 +304,18 @@ async def add_punishment_type_to_group(
     access_token = request.raise_if_missing_authorization()
 
     app = request.app
-    user_id, _ = await app.ow_sync.sync_for_access_token(access_token)
+    principal = await app.ow_sync.resolve_principal(access_token)
 
-    async with app.db.pool.acquire() as conn:
-        res = await app.db.is_in_group(
-            user_id,
-            group_id,
-            conn=conn,
+    if group_id not in principal.group_ids:
+        raise HTTPException(
+            status_code=403,
+            detail="You must be a member of the group to perform this action",
         )
-        if not res:
-            raise HTTPException(
-                status_code=403,
-                detail="You must be a member of the group to perform this action",
-            )
 
-        try:
-            return await app.db.insert_punishment_type(
-                group_id,
-                punishment_type,
-                conn=conn,
-            )
-        except DatabaseIntegrityException as exc:
-            raise HTTPException(status_code=400, detail=exc.detail) from exc
+    try:
+        return await app.db.insert_punishment_type(group_id, punishment_type)
+    except DatabaseIntegrityException as exc:
+        raise HTTPException(status_code=400, detail=exc.detail) from exc
 
 
 @router.delete("/{group_id}/punishmentType/{punishment_type_id}")
@@ -151,31 +330,21 @@ async def delete_punishment_type_to_group(
     access_token = request.raise_if_missing_authorization()
 
     app = request.app
-    user_id, _ = await app.ow_sync.sync_for_access_token(access_token)
+    principal = await app.ow_sync.resolve_principal(access_token)
 
-    async with app.db.pool.acquire() as conn:
-        res = await app.db.is_in_group(
-            user_id,
-            group_id,
-            conn=conn,
+    if group_id not in principal.group_ids:
+        raise HTTPException(
+            status_code=403,
+            detail="You must be a member of the group to perform this action",
         )
-        if not res:
-            raise HTTPException(
-                status_code=403,
-                detail="You must be a member of the group to perform this action",
-            )
 
-        try:
-            await app.db.delete_punishment_type(
-                group_id,
-                punishment_type_id,
-                conn=conn,
-            )
-        except PunishmentTypeNotExists as exc:
-            raise HTTPException(
-                status_code=400,
-                detail="The punishment type does not exist in the group's context",
-            ) from exc
+    try:
+        await app.db.delete_punishment_type(group_id, punishment_type_id)
+    except PunishmentTypeNotExists as exc:
+        raise HTTPException(
+            status_code=400,
+            detail="The punishment type does not exist in the group's context",
+        ) from exc
 
 
 # @router.post("/{group_id}/user/{user_id}")  # Disabled
@@ -232,40 +401,27 @@ async def add_punishment(
     access_token = request.raise_if_missing_authorization()
 
     app = request.app
-    created_by, _ = await app.ow_sync.sync_for_access_token(access_token)
+    principal = await app.ow_sync.resolve_principal(access_token)
 
-    async with app.db.pool.acquire() as conn:
-        res = await app.db.is_in_group(
-            created_by,
-            group_id,
-            conn=conn,
+    if group_id not in principal.group_ids:
+        raise HTTPException(
+            status_code=403,
+            detail="You must be a member of the group to perform this action",
         )
-        if not res:
-            raise HTTPException(
-                status_code=403,
-                detail="You must be a member of the group to perform this action",
-            )
 
-        res = await app.db.is_in_group(
-            user_id,
+    try:
+        return await app.db.insert_punishments(
             group_id,
-            conn=conn,
+            user_id,
+            principal.user_id,
+            punishments,
         )
-        if not res:
-            raise HTTPException(
-                status_code=400,
-                detail="The user is not a member of the group",
-            )
-
-        try:
-            return await app.db.insert_punishments(
-                group_id,
-                user_id,
-                created_by,
-                punishments,
-                conn=conn,
-            )
-        except DatabaseIntegrityException as exc:
-            raise HTTPException(status_code=400, detail=exc.detail) from exc
-        except PunishmentTypeNotExists as exc:
-            raise HTTPException(status_code=400, **exc.kwargs) from exc
+    except NotInGroup as exc:
+        raise HTTPException(
+            status_code=400,
+            detail="The user is not a member of the group",
+        ) from exc
+    except DatabaseIntegrityException as exc:
+        raise HTTPException(status_code=400, detail=exc.detail) from exc
+    except PunishmentTypeNotExists as exc:
+        raise HTTPException(status_code=400, **exc.kwargs) from exc
@@ -0,0 +1,52 @@
+"""
+Leaderboard endpoints
+"""
+
+from app.api import APIRoute, Request
+from app.models.leaderboard import Leaderboard, LeaderboardOrder, LeaderboardPeriod
+from app.types import GroupId
+from fastapi import APIRouter, Query
+
+LEADERBOARD_SIZE = 10
+MAX_LEADERBOARD_SIZE = 100
+
+router = APIRouter(
+    tags=["Leaderboard"],
+    route_class=APIRoute,
+)
+
+
+@router.get("/leaderboard")
+async def get_leaderboard(
+    request: Request,
+    period: LeaderboardPeriod = LeaderboardPeriod.ALL_TIME,
+    order: LeaderboardOrder = LeaderboardOrder.TOTAL,
+    limit: int = Query(default=LEADERBOARD_SIZE, ge=1, le=MAX_LEADERBOARD_SIZE),
+) -> Leaderboard:
+    """
+    Endpoint to get the group members with the highest total or unpaid
+    punishment value in the period, across all groups. The leaderboard is
+    a snapshot refreshed in the background, as of `refreshed_at`.
+    """
+    return await request.app.db.get_leaderboard(period, order, limit)
+
+
+@router.get("/group/{group_id}/leaderboard")
+async def get_group_leaderboard(
+    request: Request,
+    group_id: GroupId,
+    period: LeaderboardPeriod = LeaderboardPeriod.ALL_TIME,
+    order: LeaderboardOrder = LeaderboardOrder.TOTAL,
+    limit: int = Query(default=LEADERBOARD_SIZE, ge=1, le=MAX_LEADERBOARD_SIZE),
+) -> Leaderboard:
+    """
+    Endpoint to get the members of a group with the highest total or unpaid
+    punishment value in the period. The leaderboard is a snapshot refreshed
+    in the background, as of `refreshed_at`.
+    """
+    return await request.app.db.get_leaderboard(
+        period,
+        order,
+        limit,
+        group_id=group_id,
+    )
@@ -0,0 +1,43 @@
+"""
+Metrics endpoints
+"""
+
+from typing import Any
+
+from app.api import APIRoute, Request
+from fastapi import APIRouter
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"],
+    route_class=APIRoute,
+)
+
+
+@router.get("")
+async def get_metrics(request: Request) -> dict[str, Any]:
+    """
+    Endpoint to get cache, sync, leaderboard, pool and query statistics for
+    this worker.
+    """
+    app = request.app
+    state = app.app_state
+
+    return {
+        "caches": {
+            "access_tokens": state.access_tokens_to_ow_user_ids.stats(),
+            "principals": state.principals.stats(),
+            "ow_group_users": state.ow_group_users.stats(),
+            "group_stats": state.group_stats.stats(),
+            "group_responses": state.group_responses.stats(),
+        },
+        "group_syncs": {
+            "applied": app.ow_sync.group_sync_counts["applied"],
+            "unchanged": app.ow_sync.group_sync_counts["unchanged"],
+            "fresh": app.ow_sync.group_sync_counts["fresh"],
+        },
+        "sync_scheduler": app.sync_scheduler.stats(),
+        "leaderboard": app.leaderboard_refresher.stats(),
+        "pool": app.db.pool_stats(),
+        "queries": app.db.query_stats(),
+    }
@@ -26,7 +26,8 @@ async def delete_punishment(
     access_token = request.raise_if_missing_authorization()
 
     app = request.app
-    user_id, _ = await app.ow_sync.sync_for_access_token(access_token)
+    principal = await app.ow_sync.resolve_principal(access_token)
+    user_id = principal.user_id
 
     async with app.db.pool.acquire() as conn:
         try:
@@ -59,7 +60,8 @@ async def verify_punishment(
     access_token = request.raise_if_missing_authorization()
 
     app = request.app
-    user_id, _ = await app.ow_sync.sync_for_access_token(access_token)
+    principal = await app.ow_sync.resolve_principal(access_token)
+    user_id = principal.user_id
 
     async with app.db.pool.acquire() as conn:
         try:
@@ -72,12 +74,7 @@ async def verify_punishment(
                 status_code=404, detail="The punishment could not be found."
             ) from exc
 
-        res = await app.db.is_in_group(
-            user_id=user_id,
-            group_id=punishment.group_id,
-            conn=conn,
-        )
-        if not res:
+        if punishment.group_id not in principal.group_ids:
             raise HTTPException(status_code=403, detail="You are not in the group")
 
         if punishment.verified_by is not None:
@@ -8,7 +8,8 @@ from app.api import APIRoute, Request
 from app.exceptions import DatabaseIntegrityException, NotFound
 from app.models.user import User, UserCreate
 from app.types import UserId
-from fastapi import APIRouter, HTTPException
+from app.utils.etag import make_etag, match_etag, not_modified
+from fastapi import APIRouter, HTTPException, Response
 
 router = APIRouter(
     prefix="/user",
@@ -41,23 +42,50 @@ async def post_user(request: Request, user: UserCreate) -> dict[str, int | None]
 
 
 @router.get("/{user_id}")
-async def get_user(request: Request, user_id: UserId) -> User:
+async def get_user(
+    request: Request,
+    response: Response,
+    user_id: UserId,
+) -> User | Response:
     """
     Endpoint to get a specific user.
     """
     app = request.app
     try:
+        etag = make_etag(request, await app.db.get_user_version(user_id))
+        matched = match_etag(request, etag)
+        if matched is not None:
+            return not_modified(matched)
+
+        response.headers["ETag"] = etag
         return await app.db.get_user(user_id)
     except NotFound as exc:
         raise HTTPException(status_code=404, detail="User not found") from exc
 
 
 @router.get("/{user_id}/group", tags=["User"])
-async def get_user_groups(request: Request, user_id: UserId) -> list[dict[str, Any]]:
+async def get_user_groups(
+    request: Request,
+    response: Response,
+    user_id: UserId,
+) -> list[dict[str, Any]] | Response:
     """
     Endpoint to get all groups a user is a member of.
     """
     app = request.app
+    try:
+        versions = await app.db.get_user_group_versions(user_id)
+    except NotFound:
+        # A user that does not exist has no groups, and no ETag to match
+        pass
+    else:
+        etag = make_etag(request, sorted(versions.items()))
+        matched = match_etag(request, etag)
+        if matched is not None:
+            return not_modified(matched)
+
+        response.headers["ETag"] = etag
+
     try:
         return await app.db.get_user_groups(user_id)
     except NotFound as exc:
@@ -9,14 +9,16 @@ import logging
 from timeit import default_timer as timer
 from typing import Any
 
-from app.api.endpoints import group, punishment, user
+from app.api.endpoints import group, leaderboard, metrics, punishment, user
 from app.config import settings
 from app.db import Database
 from app.http import HTTPClient
+from app.leaderboard import LeaderboardRefresher
+from app.scheduler import SyncScheduler
 from app.state import State
 from app.sync import OWSync
+from app.utils.compression import GZipMiddleware
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 
 from . import APIRoute, FastAPI, Request
 
@@ -58,6 +60,8 @@ def init_routes(app: FastAPI) -> None:
     app.include_router(user.router)
     app.include_router(group.router)
     app.include_router(punishment.router)
+    app.include_router(leaderboard.router)
+    app.include_router(metrics.router)
 
 
 def init_events(app: FastAPI, **db_settings: str) -> None:
@@ -72,11 +76,23 @@ def init_events(app: FastAPI, **db_settings: str) -> None:
         app.set_app_state(State())
         app.set_ow_sync(OWSync(app))
 
+        sync_scheduler = SyncScheduler(app.ow_sync)
+        app.set_sync_scheduler(sync_scheduler)
+
+        leaderboard_refresher = LeaderboardRefresher(database)
+        app.set_leaderboard_refresher(leaderboard_refresher)
+
         await database.async_init(**db_settings)
         await http.async_init()
+        sync_scheduler.start()
+        leaderboard_refresher.start()
 
     @app.on_event("shutdown")
     async def shutdown_handler() -> None:
+        # Let queued syncs finish while the database and HTTP client are open
+        await app.sync_scheduler.stop()
+        await app.leaderboard_refresher.stop()
+
         database = app.db
         if database is not None:
             await database.close()
@@ -16,11 +16,43 @@ class Settings(BaseSettings):
     postgres_user: str = "postgres"
     postgres_password: str = "postgres"
     postgres_db: str = "dev"
+    postgres_pool_min_size: int = 10
+    postgres_pool_max_size: int = 10
+    postgres_pool_max_queries: int = 50_000  # Before a connection is replaced
+    postgres_pool_max_inactive_lifetime: float = 300  # Seconds, 0 to keep idle
+    postgres_command_timeout: float | None = None  # Seconds
+    postgres_pool_warmup: bool = True  # Prepare the hot queries on connect
+    postgres_pool_adaptive: bool = False  # Grow the pool when acquires wait
+    postgres_pool_adaptive_max_size: int = 20
+    postgres_pool_grow_threshold: float = 0.05  # Seconds of acquire wait
+    postgres_pool_shrink_after: float = 60  # Seconds without slow acquires
+    postgres_replica_host: str | None = None  # Pure reads are routed to it
+    postgres_replica_port: int = 5432
+    replica_max_lag: float = 5  # Seconds before reads fall back to the primary
+    replica_check_interval: float = 1  # Seconds
+    pool_trace: bool = False
+    pool_trace_hold_threshold: float = 1  # Seconds
+    pool_trace_raise: bool = False  # Raise instead of logging violations
     max_punishment_types: int = 10
     max_groups_per_user: int = 20
     max_active_punishments_per_group: int = 1000
     max_group_members: int = 300
+    access_token_cache_size: int = 10_000
+    access_token_cache_ttl: float = 15 * 60  # Seconds
+    principal_cache_ttl: float = 60  # Seconds
+    ow_group_users_cache_ttl: float = 5  # Seconds
+    group_stats_cache_ttl: float = 60 * 60  # Seconds, or until the group changes
+    group_response_cache_size: int = 64 * 1024 * 1024  # Bytes
+    group_sync_freshness: float = 60  # Seconds
+    sync_workers: int = 4
+    sync_max_retries: int = 3
+    sync_retry_delay: float = 0.5  # Seconds, doubled for every retry
+    sync_drain_timeout: float = 10  # Seconds
+    sync_max_connections: int = 4  # Pool connections syncing may hold at once
+    leaderboard_refresh_interval: float = 60  # Seconds
     migrations_directory: Path = Path("app/migrations")
+    migration_lock_timeout: float = 5  # Seconds to wait for another migrator
+    migration_batch_pause: float = 0.1  # Seconds between backfill batches
     debug: bool = True
 
 
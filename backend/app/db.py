@@ -1,30 +1,70 @@
 """
 Functions for interacting with the SQLite database.
 """
-import asyncio
 import datetime
+import json
 import logging
 from collections import defaultdict
-from pathlib import Path
 from typing import Any, TypedDict, cast
 
 from app.config import settings
-from app.exceptions import DatabaseIntegrityException, NotFound, PunishmentTypeNotExists
+from app.exceptions import (
+    DatabaseIntegrityException,
+    NotFound,
+    NotInGroup,
+    PunishmentTypeNotExists,
+)
+from app.migrator import Migrator
 from app.models.group import Group, GroupCreate
 from app.models.group_member import GroupMemberCreate, GroupMemberUpdate
 from app.models.group_user import GroupUser
+from app.models.principal import Principal
 from app.models.punishment import PunishmentCreate, PunishmentRead
 from app.models.punishment_type import PunishmentTypeCreate, PunishmentTypeRead
 from app.models.user import User, UserCreate, UserUpdate
+from app.pools import DatabasePools
+from app.queries import (
+    DELETE_USERS_FROM_GROUP,
+    GET_FRESH_OW_GROUP_IDS,
+    GET_GROUP_USER,
+    GET_GROUP_USERS,
+    GET_PRINCIPAL,
+    GET_RAW_GROUP_USERS,
+    GET_USER,
+    GET_USER_BY_OW_USER_ID,
+    GET_USER_GROUPS,
+    GET_USER_GROUPS_BY_OW_USER_ID,
+    GET_USER_PUNISHMENTS,
+    GET_USERS_PUNISHMENTS,
+    INSERT_GROUP,
+    INSERT_GROUP_MEMBER,
+    INSERT_GROUP_MEMBERS,
+    INSERT_PUNISHMENT_TYPE,
+    INSERT_PUNISHMENTS,
+    INSERT_USER,
+    INSERT_USERS,
+    IS_IN_GROUP,
+    IS_IN_GROUP_BY_OW_USER_ID,
+    IS_LEADERBOARD_FRESH,
+    LEADERBOARD_LOCK_ID,
+    REFRESH_LEADERBOARD,
+    SET_GROUP_SYNCED,
+    TOUCH_GROUP_SYNC,
+    UPDATE_GROUP,
+    UPDATE_GROUP_MEMBERS,
+    UPDATE_USER,
+    UPDATE_USER_BY_OW_USER_ID,
+    UPDATE_USERS_BY_OW_USER_ID,
+    VERIFY_PUNISHMENT,
+    queries,
+)
+from app.read_queries import ReadQueries
 from app.types import GroupId, OWUserId, PunishmentId, PunishmentTypeId, UserId
 from app.utils.db import MaybeAcquire
-from asyncpg import Pool, create_pool
-from asyncpg.exceptions import (
-    CannotConnectNowError,
-    ForeignKeyViolationError,
-    UndefinedObjectError,
-    UniqueViolationError,
-)
+from app.utils.query_registry import QueryRunner
+from app.utils.replica import writes
+from asyncpg import Pool
+from asyncpg.exceptions import ForeignKeyViolationError, UniqueViolationError
 
 DEFAULT_PUSHISHMENT_TYPES = [
     PunishmentTypeCreate(
@@ -51,110 +91,110 @@ class InsertOrUpdateGroup(TypedDict):
     action: str
 
 
-def read_sql_file(filepath: Path) -> str:
-    """Reads an SQL file and ignores comments"""
-    with open(filepath, "r", encoding="utf-8") as file:
-        result = []
-
-        for line in file.readlines():
-            if line.startswith("--"):
-                continue
-
-            if "--" in line:
-                line = line.split("--")[0]
-
-            result.append(line.strip())
-
-        return "".join(result)
-
-
-class Database:
+class Database(ReadQueries):
     def __init__(self) -> None:
-        self._pool: Pool | None = None
-        self._db_name = ""
+        self._queries = QueryRunner(queries)
+        self._pools = DatabasePools(
+            init=self._queries.prepare_all if settings.postgres_pool_warmup else None
+        )
 
     @property
     def pool(self) -> Pool:
         """A little hacky but mypy won't shut up about pool being None."""
-        assert self._pool is not None
-        return self._pool
+        assert self._pools.primary is not None
+        return self._pools.primary
 
     @pool.setter
     def pool(self, value: Pool) -> None:
-        self._pool = value
+        self._pools.primary = value
+
+    @property
+    def raw_pool(self) -> Pool:
+        """The asyncpg pool, without the monitoring and tracing wrappers."""
+        assert self._pools.monitor is not None
+        return self._pools.monitor.pool
 
     async def async_init(self, **db_settings: str) -> None:
-        for _ in range(10):  # Try for 10*0.5 seconds
-            try:
-                logger.info("Connecting to postgres database.")
-
-                self._db_name = db_settings.get("database", settings.postgres_db)
-                self._pool = await create_pool(
-                    host=db_settings.get("host", settings.postgres_host),
-                    port=db_settings.get("port", settings.postgres_port),
-                    user=db_settings.get("user", settings.postgres_user),
-                    password=db_settings.get("password", settings.postgres_password),
-                    database=self._db_name,
-                )
-            except (ConnectionError, CannotConnectNowError):
-                logger.info(
-                    "Connection to postgres database could not be established. Retrying in 0.5s"
-                )
-                await asyncio.sleep(0.5)
-            else:
-                break
+        await self._pools.connect(db_settings)
 
-        if self._pool is None:
-            raise RuntimeError("Couldn't connect to postgres database.")
+        if await self.load_db_migrations() and settings.postgres_pool_warmup:
+            # Statements on tables created by the migrations could not be
+            # prepared when the pool was created.
+            await self._queries.warm(self.pool)
 
-        await self.load_db_migrations()
+    @property
+    def read_pool(self) -> Pool:
+        """The pool pure reads are routed through, the primary pool unless
+        a read replica is configured.
+        """
+        if self._pools.replica is None:
+            return self.pool
+        return cast(Pool, self._pools.replica)
 
     async def close(self) -> None:
-        await self.pool.close()
+        await self._pools.close()
 
-    async def _set_database_version(
-        self,
-        version: int,
-        conn: Pool | None = None,
-    ) -> None:
-        async with MaybeAcquire(conn, self.pool) as conn:
-            query = f"set mg.version to {version}; alter database {self._db_name} set mg.version from current;"
-            await conn.execute(query)
+    def pool_stats(self) -> dict[str, Any]:
+        return self._pools.stats()
+
+    def query_stats(self) -> dict[str, Any]:
+        return self._queries.stats()
 
-    async def load_db_migrations(self, conn: Pool | None = None) -> None:
+    async def load_db_migrations(self, conn: Pool | None = None) -> list[int]:
         """
-        Loads the database schema and applies new migrations.
+        Applies pending migrations. Returns the versions applied.
         """
+        async with MaybeAcquire(conn, self.pool) as conn:
+            return await Migrator().run(conn)
 
-        def get_version_from_name(name: str) -> int:
-            return int(name.split("_", 1)[0])
-
-        file_ = max(
-            (f for f in settings.migrations_directory.iterdir() if f.suffix == ".sql"),
-            key=lambda f: get_version_from_name(f.name),
-        )
-
+    async def get_fresh_ow_group_ids(
+        self,
+        user_id: UserId,
+        ow_group_ids: list[int],
+        max_age: datetime.timedelta,
+        conn: Pool | None = None,
+    ) -> set[int]:
+        """Returns the OW groups that were synced within `max_age` and that
+        the user is already a member of.
+        """
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = "SELECT current_setting('mg.version') as version"
-            try:
-                schema_version = await conn.fetchval(query)
-            except UndefinedObjectError:
-                schema_version = 0
-            else:
-                schema_version = int(schema_version)
+            res = await self._queries.fetch(
+                conn,
+                GET_FRESH_OW_GROUP_IDS,
+                user_id,
+                ow_group_ids,
+                max_age,
+            )
 
-            logger.debug("Schema version: %d", schema_version)
+        return {r["ow_group_id"] for r in res}
 
-            file_version = get_version_from_name(file_.name)
-            if file_version <= schema_version:
-                logger.debug("Skipping migration: %s", file_.name)
-                return
+    @writes
+    async def touch_group_sync_if_unchanged(
+        self,
+        ow_group_id: int,
+        payload_hash: str,
+        conn: Pool | None = None,
+    ) -> bool:
+        """Marks the group as synced if the stored payload hash matches.
 
-            sql_commands = read_sql_file(file_)
-            logger.info("Applying migration: %s", file_.name)
+        Returns whether it matched, in which case there is nothing to sync.
+        """
+        async with MaybeAcquire(conn, self.pool) as conn:
+            res = await self._queries.fetchval(
+                conn, TOUCH_GROUP_SYNC, ow_group_id, payload_hash
+            )
 
-            await conn.execute(sql_commands)
-            await self._set_database_version(file_version)
+        return res is not None
+
+    @writes
+    async def set_group_synced(
+        self,
+        group_id: GroupId,
+        payload_hash: str,
+        conn: Pool | None = None,
+    ) -> None:
+        async with MaybeAcquire(conn, self.pool) as conn:
+            await conn.execute(SET_GROUP_SYNCED, group_id, payload_hash)
 
     async def get_raw_users(self, conn: Pool | None = None) -> dict[str, list[Any]]:
         async with MaybeAcquire(conn, self.pool) as conn:
@@ -170,19 +210,28 @@ class Database:
         is_ow_user_id: bool = False,
         conn: Pool | None = None,
     ) -> User:
-        async with MaybeAcquire(conn, self.pool) as conn:
-            if not is_ow_user_id:
-                query = "SELECT * FROM users WHERE user_id = $1"
-            else:
-                query = "SELECT * FROM users WHERE ow_user_id = $1"
-
-            db_user = await conn.fetchrow(query, user_id)
+        async with MaybeAcquire(conn, self.read_pool) as conn:
+            query = GET_USER if not is_ow_user_id else GET_USER_BY_OW_USER_ID
+            db_user = await self._queries.fetchrow(conn, query, user_id)
 
             if db_user is None:
                 raise NotFound
 
             return User(**db_user)
 
+    async def get_principal(
+        self,
+        ow_user_id: OWUserId,
+        conn: Pool | None = None,
+    ) -> Principal:
+        async with MaybeAcquire(conn, self.pool) as conn:
+            db_principal = await self._queries.fetchrow(conn, GET_PRINCIPAL, ow_user_id)
+
+            if db_principal is None:
+                raise NotFound
+
+            return Principal(**db_principal)
+
     async def get_user_groups(
         self,
         user_id: UserId,
@@ -190,16 +239,11 @@ class Database:
         is_ow_user_id: bool = False,
         conn: Pool | None = None,
     ) -> list[dict[str, Any]]:
-        async with MaybeAcquire(conn, self.pool) as conn:
+        async with MaybeAcquire(conn, self.read_pool) as conn:
             if not is_ow_user_id:
-                query = """SELECT groups.* FROM groups
-                        INNER JOIN group_members ON groups.group_id = group_members.group_id
-                        WHERE group_members.user_id = $1"""
+                query = GET_USER_GROUPS
             else:
-                query = """SELECT groups.* FROM groups
-                        INNER JOIN group_members ON groups.group_id = group_members.group_id
-                        INNER JOIN users ON users.user_id = group_members.user_id
-                        WHERE users.ow_user_id = $1"""
+                query = GET_USER_GROUPS_BY_OW_USER_ID
 
             result = await conn.fetch(query, user_id)
             return [dict(row) for row in result]
@@ -213,15 +257,8 @@ class Database:
         conn: Pool | None = None,
     ) -> bool:
         async with MaybeAcquire(conn, self.pool) as conn:
-            if not is_ow_user_id:
-                query = """SELECT 1 FROM group_members
-                        WHERE group_id = $1 AND user_id = $2"""
-            else:
-                query = """SELECT 1 FROM group_members
-                        INNER JOIN users ON users.user_id = group_members.user_id
-                        WHERE group_id = $1 AND users.ow_user_id = $2"""
-
-            res = await conn.fetchval(query, group_id, user_id)
+            query = IS_IN_GROUP if not is_ow_user_id else IS_IN_GROUP_BY_OW_USER_ID
+            res = await self._queries.fetchval(conn, query, group_id, user_id)
             return res is not None
 
     async def get_group(
@@ -229,7 +266,9 @@ class Database:
         group_id: GroupId,
         conn: Pool | None = None,
     ) -> Group:
-        async with MaybeAcquire(conn, self.pool) as conn:
+        # Building the models from records is faster than parsing them from
+        # get_group_json, which is only faster when the JSON is served as is.
+        async with MaybeAcquire(conn, self.read_pool) as conn:
             query = "SELECT * FROM groups WHERE groups.group_id = $1"
             db_group = await conn.fetchrow(query, group_id)
 
@@ -254,13 +293,9 @@ class Database:
         conn: Pool | None = None,
     ) -> list[dict[str, Any]]:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """SELECT * FROM group_punishments
-                    WHERE group_id = $1
-                    AND user_id = $2
-                    """
 
             punishments = []
-            db_punishments = await conn.fetch(query, group_id, user_id)
+            db_punishments = await conn.fetch(GET_USER_PUNISHMENTS, group_id, user_id)
             for db_punishment in db_punishments:
                 punishments.append(dict(db_punishment))
 
@@ -273,12 +308,8 @@ class Database:
         conn: Pool | None = None,
     ) -> dict[UserId, list[dict[UserId, Any]]]:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """SELECT * FROM group_punishments
-                    WHERE group_id = $1
-                    AND user_id = ANY($2)
-                    """
 
-            db_punishments = await conn.fetch(query, group_id, user_ids)
+            db_punishments = await conn.fetch(GET_USERS_PUNISHMENTS, group_id, user_ids)
 
             punishments = defaultdict(list)
             for db_punishment in db_punishments:
@@ -295,14 +326,8 @@ class Database:
         conn: Pool | None = None,
     ) -> GroupUser:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """SELECT m.active, m.ow_group_user_id, users.*
-                    FROM users
-                    INNER JOIN group_members as m
-                    ON users.user_id = m.user_id
-                    WHERE users.user_id = $1 AND m.group_id = $2
-                    """
             db_user = await conn.fetchrow(
-                query,
+                GET_GROUP_USER,
                 user_id,
                 group_id,
             )
@@ -311,6 +336,7 @@ class Database:
                 raise NotFound
 
             user = dict(db_user)
+            user["punishment_type_totals"] = json.loads(user["punishment_type_totals"])
             user["punishments"] = []
             if punishments:
                 user["punishments"] = await self.get_raw_punishments_for_user(
@@ -327,13 +353,7 @@ class Database:
         conn: Pool | None = None,
     ) -> list[dict[str, Any]]:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """SELECT m.active, m.ow_group_user_id, users.*
-                    FROM users
-                    INNER JOIN group_members as m
-                    ON users.user_id = m.user_id
-                    WHERE m.group_id = $1
-                    """
-            db_users = await conn.fetch(query, group_id)
+            db_users = await conn.fetch(GET_RAW_GROUP_USERS, group_id)
 
         return [dict(row) for row in db_users]
 
@@ -343,8 +363,8 @@ class Database:
         punishments: bool = True,
         conn: Pool | None = None,
     ) -> list[GroupUser]:
-        async with MaybeAcquire(conn, self.pool) as conn:
-            db_users = await self.get_raw_group_users(group_id, conn=conn)
+        async with MaybeAcquire(conn, self.read_pool) as conn:
+            db_users = await conn.fetch(GET_GROUP_USERS, group_id)
 
             if punishments:
                 user_ids = [db_user["user_id"] for db_user in db_users]
@@ -359,6 +379,9 @@ class Database:
             users = []
             for db_user in db_users:
                 user = dict(db_user)
+                user["punishment_type_totals"] = json.loads(
+                    user["punishment_type_totals"]
+                )
                 user["punishments"] = db_punishments.get(user["user_id"], [])
                 users.append(GroupUser(**user))
 
@@ -375,6 +398,7 @@ class Database:
 
         return [dict(row) for row in res]
 
+    @writes
     async def delete_user_from_group(
         self,
         group_id: GroupId,
@@ -388,6 +412,7 @@ class Database:
             if res is None:
                 raise NotFound
 
+    @writes
     async def delete_users_from_group(
         self,
         group_id: GroupId,
@@ -395,12 +420,8 @@ class Database:
         conn: Pool | None = None,
     ) -> list[UserId]:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """DELETE FROM group_members
-                    WHERE group_id = $1 AND user_id = ANY($2::bigint[])
-                    RETURNING user_id;
-                    """
             res = await conn.fetch(
-                query,
+                DELETE_USERS_FROM_GROUP,
                 group_id,
                 users,
             )
@@ -423,7 +444,7 @@ class Database:
         group_id: GroupId,
         conn: Pool | None = None,
     ) -> list[PunishmentRead]:
-        async with MaybeAcquire(conn, self.pool) as conn:
+        async with MaybeAcquire(conn, self.read_pool) as conn:
             query = (
                 "SELECT * FROM group_punishments WHERE group_id = $1 AND user_id = $2"
             )
@@ -431,18 +452,41 @@ class Database:
 
         return [PunishmentRead(**dict(x)) for x in punishments]
 
+    @writes
+    async def refresh_leaderboard(
+        self,
+        max_age: float,
+        conn: Pool | None = None,
+    ) -> bool:
+        """Refreshes the leaderboard snapshot, unless another process is
+        refreshing it or it was refreshed less than `max_age` seconds ago.
+        Returns whether it was refreshed.
+        """
+        async with MaybeAcquire(conn, self.pool) as conn:
+            query = "SELECT pg_try_advisory_lock($1)"
+            if not await conn.fetchval(query, LEADERBOARD_LOCK_ID):
+                return False
+
+            try:
+                if await conn.fetchval(IS_LEADERBOARD_FRESH, max_age):
+                    return False
+
+                await conn.execute(REFRESH_LEADERBOARD)
+                return True
+            finally:
+                query = "SELECT pg_advisory_unlock($1)"
+                await conn.execute(query, LEADERBOARD_LOCK_ID)
+
+    @writes
     async def insert_user(
         self,
         user: UserCreate,
         conn: Pool | None = None,
     ) -> InsertOrUpdateUser:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """INSERT INTO users(ow_user_id, first_name, last_name, email)
-                    VALUES ($1, $2, $3, $4)
-                    RETURNING user_id"""
             try:
                 user_id = await conn.fetchval(
-                    query,
+                    INSERT_USER,
                     user.ow_user_id,
                     user.first_name,
                     user.last_name,
@@ -453,6 +497,7 @@ class Database:
 
         return {"id": user_id, "action": "CREATE"}
 
+    @writes
     async def update_user(
         self,
         user_id: UserId,
@@ -460,28 +505,23 @@ class Database:
         conn: Pool | None = None,
     ) -> None:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """UPDATE users
-                    SET first_name = $1, last_name = $2, email = $3
-                    WHERE user_id = $4"""
             await conn.execute(
-                query,
+                UPDATE_USER,
                 user.first_name,
                 user.last_name,
                 user.email,
                 user_id,
             )
 
+    @writes
     async def update_users(
         self,
         users: list[UserUpdate],
         conn: Pool | None = None,
     ) -> None:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """UPDATE users
-                    SET first_name = $1, last_name = $2, email = $3
-                    WHERE user_id = $4"""
             await conn.executemany(
-                query,
+                UPDATE_USER,
                 [
                     (
                         user.first_name,
@@ -493,18 +533,15 @@ class Database:
                 ],
             )
 
+    @writes
     async def update_user_by_ow_user_id(
         self,
         user: UserCreate,
         conn: Pool | None = None,
     ) -> InsertOrUpdateUser:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """UPDATE users
-                    SET first_name = $1, last_name = $2, email = $3
-                    WHERE ow_user_id = $4
-                    RETURNING user_id"""
             user_id = await conn.fetchval(
-                query,
+                UPDATE_USER_BY_OW_USER_ID,
                 user.first_name,
                 user.last_name,
                 user.email,
@@ -523,6 +560,7 @@ class Database:
         )
         return is_the_same is True  # mypy, smh
 
+    @writes
     async def insert_or_update_user(
         self,
         user: UserCreate,
@@ -544,23 +582,16 @@ class Database:
 
             return {"id": db_user.user_id, "action": "NO_CHANGE"}
 
+    @writes
     async def insert_many_users(
         self,
         users: list[UserCreate],
         conn: Pool | None = None,
     ) -> dict[OWUserId, UserId]:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """INSERT INTO users(ow_user_id, first_name, last_name, email)
-                    (SELECT
-                        u.ow_user_id, u.first_name, u.last_name, u.email
-                    FROM
-                        unnest($1::users[]) as u
-                    )
-                    RETURNING user_id, ow_user_id
-                    """
 
             res = await conn.fetch(
-                query,
+                INSERT_USERS,
                 [
                     (None, x.ow_user_id, x.first_name, x.last_name, x.email)
                     for x in users
@@ -568,27 +599,24 @@ class Database:
             )
             return {x["ow_user_id"]: x["user_id"] for x in res}
 
+    @writes
     async def update_many_users_by_ow_id(
         self,
         users: list[UserCreate],
         conn: Pool | None = None,
     ) -> dict[OWUserId, UserId]:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """UPDATE users
-                    SET first_name = u.first_name, last_name = u.last_name, email = u.email
-                    FROM
-                        unnest($1::users[]) as u
-                    WHERE
-                        users.ow_user_id = u.ow_user_id
-                    RETURNING user_id, ow_user_id
-                    """
 
             res = await conn.fetch(
-                query,
-                [(x.ow_user_id, x.first_name, x.last_name, x.email) for x in users],
+                UPDATE_USERS_BY_OW_USER_ID,
+                [
+                    (None, x.ow_user_id, x.first_name, x.last_name, x.email)
+                    for x in users
+                ],
             )
             return {x["ow_user_id"]: x["user_id"] for x in res}
 
+    @writes
     async def insert_or_update_users(
         self,
         users: list[UserCreate],
@@ -628,18 +656,16 @@ class Database:
 
             return created | updated | not_updated
 
+    @writes
     async def insert_group(
         self,
         group: GroupCreate,
         conn: Pool | None = None,
     ) -> InsertOrUpdateGroup:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """INSERT INTO groups(ow_group_id, name, name_short, rules, image)
-                    VALUES ($1, $2, $3, $4, $5)
-                    RETURNING group_id;"""
             try:
                 group_id = await conn.fetchval(
-                    query,
+                    INSERT_GROUP,
                     group.ow_group_id,
                     group.name,
                     group.name_short,
@@ -655,6 +681,7 @@ class Database:
 
         return {"id": gid, "action": "CREATE"}
 
+    @writes
     async def update_group(
         self,
         group: GroupCreate,
@@ -664,12 +691,8 @@ class Database:
             raise ValueError("ow_group_id must be set")
 
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """UPDATE groups
-                    SET name = $1, name_short = $2, rules = $3, image = $4
-                    WHERE ow_group_id = $5
-                    RETURNING group_id;"""
             group_id = await conn.fetchval(
-                query,
+                UPDATE_GROUP,
                 group.name,
                 group.name_short,
                 group.rules,
@@ -678,6 +701,7 @@ class Database:
             )
             return {"id": group_id, "action": "UPDATE"}
 
+    @writes
     async def insert_or_update_group(
         self,
         group: GroupCreate,
@@ -689,19 +713,16 @@ class Database:
             except DatabaseIntegrityException:
                 return await self.update_group(group, conn=conn)
 
+    @writes
     async def insert_user_in_group(
         self,
         member: GroupMemberCreate,
         conn: Pool | None = None,
     ) -> dict[str, GroupId | UserId]:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """INSERT INTO group_members(group_id, user_id, ow_group_user_id)
-                    VALUES ($1, $2, $3)
-                    RETURNING group_id, user_id
-                    """
             try:
                 res = await conn.fetchrow(
-                    query,
+                    INSERT_GROUP_MEMBER,
                     member.group_id,
                     member.user_id,
                     member.ow_group_user_id,
@@ -716,44 +737,30 @@ class Database:
             "user_id": res["user_id"],
         }
 
+    @writes
     async def insert_users_in_group(
         self,
         members: list[GroupMemberCreate],
         conn: Pool | None = None,
     ) -> list[dict[str, GroupId | UserId]]:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """INSERT INTO group_members(group_id, user_id, ow_group_user_id)
-                    (SELECT
-                        m.group_id, m.user_id, m.ow_group_user_id
-                    FROM
-                        unnest($1::group_members[]) as m
-                    )
-                    RETURNING group_id, user_id
-                    """
 
             res = await conn.fetch(
-                query,
+                INSERT_GROUP_MEMBERS,
                 [(x.group_id, x.user_id, x.ow_group_user_id, True) for x in members],
             )
             return [dict(r) for r in res]
 
+    @writes
     async def update_group_members(
         self,
         members: list[GroupMemberUpdate],
         conn: Pool | None = None,
     ) -> list[dict[str, GroupId | UserId]]:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """UPDATE group_members
-                    SET active = m.active
-                    FROM
-                        unnest($1::group_members[]) as m
-                    WHERE
-                        group_members.ow_group_user_id = m.ow_group_user_id
-                    RETURNING m.group_id, m.user_id;
-                    """
 
             res = await conn.fetch(
-                query,
+                UPDATE_GROUP_MEMBERS,
                 [
                     (x.group_id, x.user_id, x.ow_group_user_id, x.active)
                     for x in members
@@ -761,6 +768,7 @@ class Database:
             )
             return [dict(r) for r in res]
 
+    @writes
     async def insert_punishment_type(
         self,
         group_id: GroupId,
@@ -768,13 +776,9 @@ class Database:
         conn: Pool | None = None,
     ) -> dict[str, int]:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """INSERT INTO punishment_types(group_id, name, value, logo_url)
-                    VALUES ($1, $2, $3, $4)
-                    RETURNING punishment_type_id
-                    """
             try:
                 punishment_type_id = await conn.fetchval(
-                    query,
+                    INSERT_PUNISHMENT_TYPE,
                     group_id,
                     punishment_type.name,
                     punishment_type.value,
@@ -787,6 +791,7 @@ class Database:
 
         return {"id": punishment_type_id}
 
+    @writes
     async def delete_punishment_type(
         self,
         group_id: GroupId,
@@ -804,6 +809,7 @@ class Database:
             if val is None:  # None = Nothing was deleted as it wasnt found
                 raise PunishmentTypeNotExists
 
+    @writes
     async def insert_punishments(
         self,
         group_id: GroupId,
@@ -813,37 +819,13 @@ class Database:
         conn: Pool | None = None,
     ) -> dict[str, list[int]]:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """SELECT 1 FROM punishment_types
-                WHERE group_id = $1 AND punishment_type_id = ANY($2::int[])
-                """
-            res = await conn.fetch(
-                query,
-                group_id,
-                [x.punishment_type_id for x in punishments],
-            )
-            if len(res) != len(punishments):
-                raise PunishmentTypeNotExists
+            punishment_type_ids = {p.punishment_type_id for p in punishments}
 
-            query = """INSERT INTO group_punishments(group_id,
-                                                     user_id,
-                                                     punishment_type_id,
-                                                     reason,
-                                                     amount,
-                                                     created_by)
-                    (SELECT
-                        p.group_id,
-                        p.user_id,
-                        p.punishment_type_id,
-                        p.reason,
-                        p.amount,
-                        p.created_by
-                    FROM
-                        unnest($1::group_punishments[]) as p
-                    )
-                    RETURNING punishment_id
-                    """
-            res = await conn.fetch(
-                query,
+            # Validates and inserts in a single round-trip. The validity is
+            # returned on its own, as nothing is inserted for an empty list
+            # either, and the reason for a failure is only looked up then.
+            res = await conn.fetchrow(
+                INSERT_PUNISHMENTS,
                 [
                     (
                         None,
@@ -859,8 +841,18 @@ class Database:
                     )
                     for p in punishments
                 ],
+                group_id,
+                user_id,
+                list(punishment_type_ids),
+                len(punishment_type_ids),
             )
-            return {"ids": [r["punishment_id"] for r in res]}
+
+            if not res["ok"]:
+                if not await self.is_in_group(user_id, group_id, conn=conn):
+                    raise NotInGroup
+                raise PunishmentTypeNotExists
+
+            return {"ids": list(res["ids"])}
 
     async def get_punishment(
         self,
@@ -876,6 +868,7 @@ class Database:
 
         return PunishmentRead(**res)
 
+    @writes
     async def delete_punishment(
         self,
         punishment_id: PunishmentId,
@@ -888,6 +881,7 @@ class Database:
             if res is None:
                 raise NotFound
 
+    @writes
     async def verify_punishment(
         self,
         punishment_id: PunishmentId,
@@ -895,13 +889,8 @@ class Database:
         conn: Pool | None = None,
     ) -> PunishmentRead:
         async with MaybeAcquire(conn, self.pool) as conn:
-            query = """UPDATE group_punishments
-                SET verified_by = $1, verified_time = $2
-                WHERE punishment_id = $3
-                RETURNING punishment_id
-                """
             res = await conn.fetchval(
-                query,
+                VERIFY_PUNISHMENT,
                 verified_by,
                 datetime.datetime.utcnow(),
                 punishment_id,
@@ -29,6 +29,18 @@ class NotFound(VineyardException):
     pass
 
 
+class NotInGroup(VineyardException):
+    pass
+
+
+class InvalidCursor(VineyardException):
+    pass
+
+
+class PoolTraceViolation(VineyardException):
+    pass
+
+
 class PunishmentTypeNotExists(VineyardException):
     def __init__(self, **kwargs: Any) -> None:
         self.kwargs = kwargs
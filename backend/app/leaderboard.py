@@ -0,0 +1,71 @@
+"""Refreshes the leaderboard snapshot in the background."""
+
+import asyncio
+import logging
+from time import monotonic
+from typing import Any
+
+from .config import settings
+from .db import Database
+from .utils.tasks import cancel_task
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderboardRefresher:
+    """Refreshes the leaderboard snapshot every `interval` seconds, starting
+    one interval after `start()`.
+
+    Every worker runs a refresher. A refresh is skipped while another worker
+    is refreshing, or when the snapshot is less than half an interval old,
+    so the workers together refresh it about once per interval.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        *,
+        interval: float = settings.leaderboard_refresh_interval,
+    ) -> None:
+        self.db = db
+        self.interval = interval
+
+        self.refreshes = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_duration_ms: float | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    async def refresh(self) -> bool:
+        started = monotonic()
+        if not await self.db.refresh_leaderboard(self.interval / 2):
+            self.skipped += 1
+            return False
+
+        self.refreshes += 1
+        self.last_duration_ms = round((monotonic() - started) * 1000, 2)
+        return True
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception:  # pylint: disable=broad-except
+                self.failures += 1
+                logger.exception("Refreshing the leaderboard failed.")
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        await cancel_task(self._task)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "refreshes": self.refreshes,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "last_duration_ms": self.last_duration_ms,
+        }
@@ -0,0 +1,4 @@
+CREATE TABLE IF NOT EXISTS group_syncs (
+	group_id INTEGER PRIMARY KEY references groups(group_id),
+	last_synced_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+);
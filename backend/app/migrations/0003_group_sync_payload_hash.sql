@@ -0,0 +1 @@
+ALTER TABLE group_syncs ADD COLUMN IF NOT EXISTS payload_hash TEXT;
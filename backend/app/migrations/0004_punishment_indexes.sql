@@ -0,0 +1,6 @@
+-- migrate: online
+-- Listing a member's punishments, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS group_punishments_group_user_created_idx ON group_punishments (group_id, user_id, created_time, punishment_id);
+
+-- Unpaid fines, the most common filtered read
+CREATE INDEX CONCURRENTLY IF NOT EXISTS group_punishments_unverified_idx ON group_punishments (group_id, user_id, created_time, punishment_id) WHERE verified_time IS NULL;
@@ -0,0 +1,8 @@
+-- migrate: online
+-- Groups of a user. Lookups by group use the primary key (group_id, user_id).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS group_members_user_id_idx ON group_members (user_id);
+
+-- Checking that a punishment type is unused before deleting it.
+-- punishment_types(group_id) is covered by UNIQUE (group_id, name), and
+-- group_punishments(group_id, user_id) by the indexes from 0004.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS group_punishments_punishment_type_id_idx ON group_punishments (punishment_type_id);
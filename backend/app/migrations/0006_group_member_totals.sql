@@ -0,0 +1,68 @@
+-- Running totals of the punishments of every member, per punishment type.
+-- Kept current by a trigger on group_punishments. Values are amounts times
+-- the value of the punishment type, and are computed when read.
+CREATE TABLE IF NOT EXISTS group_member_totals (
+	group_id INTEGER NOT NULL references groups(group_id),
+	user_id INTEGER NOT NULL references users(user_id),
+	punishment_type_id INTEGER NOT NULL references punishment_types(punishment_type_id) ON DELETE CASCADE,
+	count INTEGER NOT NULL,
+	unpaid_count INTEGER NOT NULL,
+	amount BIGINT NOT NULL,
+	unpaid_amount BIGINT NOT NULL,
+	PRIMARY KEY (group_id, user_id, punishment_type_id)
+);
+
+CREATE INDEX IF NOT EXISTS group_member_totals_punishment_type_id_idx ON group_member_totals (punishment_type_id);
+
+CREATE OR REPLACE FUNCTION update_group_member_totals() RETURNS trigger AS $$
+BEGIN
+	IF TG_OP IN ('UPDATE', 'DELETE') THEN
+		UPDATE group_member_totals SET
+			count = count - 1,
+			unpaid_count = unpaid_count - (OLD.verified_time IS NULL)::int,
+			amount = amount - OLD.amount,
+			unpaid_amount = unpaid_amount - CASE WHEN OLD.verified_time IS NULL THEN OLD.amount ELSE 0 END
+		WHERE group_id = OLD.group_id
+		AND user_id = OLD.user_id
+		AND punishment_type_id = OLD.punishment_type_id;
+	END IF;
+
+	IF TG_OP IN ('INSERT', 'UPDATE') THEN
+		INSERT INTO group_member_totals AS t (group_id, user_id, punishment_type_id, count, unpaid_count, amount, unpaid_amount)
+		VALUES (
+			NEW.group_id,
+			NEW.user_id,
+			NEW.punishment_type_id,
+			1,
+			(NEW.verified_time IS NULL)::int,
+			NEW.amount,
+			CASE WHEN NEW.verified_time IS NULL THEN NEW.amount ELSE 0 END
+		)
+		ON CONFLICT (group_id, user_id, punishment_type_id) DO UPDATE SET
+			count = t.count + EXCLUDED.count,
+			unpaid_count = t.unpaid_count + EXCLUDED.unpaid_count,
+			amount = t.amount + EXCLUDED.amount,
+			unpaid_amount = t.unpaid_amount + EXCLUDED.unpaid_amount;
+	END IF;
+
+	RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS group_punishments_totals ON group_punishments;
+CREATE TRIGGER group_punishments_totals
+AFTER INSERT OR UPDATE OR DELETE ON group_punishments
+FOR EACH ROW EXECUTE PROCEDURE update_group_member_totals();
+
+INSERT INTO group_member_totals (group_id, user_id, punishment_type_id, count, unpaid_count, amount, unpaid_amount)
+SELECT
+	group_id,
+	user_id,
+	punishment_type_id,
+	count(*),
+	count(*) FILTER (WHERE verified_time IS NULL),
+	sum(amount),
+	COALESCE(sum(amount) FILTER (WHERE verified_time IS NULL), 0)
+FROM group_punishments
+GROUP BY group_id, user_id, punishment_type_id
+ON CONFLICT DO NOTHING;
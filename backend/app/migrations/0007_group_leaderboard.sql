@@ -0,0 +1,31 @@
+-- Snapshot of every member's punishment value per time window, refreshed in
+-- the background so leaderboards never scan group_punishments. The windows
+-- end at refreshed_at.
+CREATE MATERIALIZED VIEW IF NOT EXISTS group_leaderboard AS
+SELECT
+	p.group_id,
+	p.user_id,
+	w.period,
+	count(*) as count,
+	sum(p.amount * pt.value) as total_value,
+	COALESCE(sum(p.amount * pt.value) FILTER (WHERE p.verified_time IS NULL), 0) as unpaid_value,
+	now() as refreshed_at
+FROM group_punishments as p
+INNER JOIN punishment_types as pt
+ON pt.punishment_type_id = p.punishment_type_id
+INNER JOIN group_members as m
+ON m.group_id = p.group_id AND m.user_id = p.user_id
+CROSS JOIN (
+	VALUES ('week', interval '7 days'), ('month', interval '1 month'), ('all', NULL::interval)
+) as w(period, since)
+WHERE w.since IS NULL OR p.created_time >= (now() at time zone 'utc') - w.since
+GROUP BY p.group_id, p.user_id, w.period;
+
+-- Required to refresh the view concurrently
+CREATE UNIQUE INDEX IF NOT EXISTS group_leaderboard_pkey ON group_leaderboard (group_id, user_id, period);
+
+-- Top members of a group, and across groups
+CREATE INDEX IF NOT EXISTS group_leaderboard_group_total_idx ON group_leaderboard (group_id, period, total_value DESC, user_id);
+CREATE INDEX IF NOT EXISTS group_leaderboard_group_unpaid_idx ON group_leaderboard (group_id, period, unpaid_value DESC, user_id);
+CREATE INDEX IF NOT EXISTS group_leaderboard_total_idx ON group_leaderboard (period, total_value DESC, group_id, user_id);
+CREATE INDEX IF NOT EXISTS group_leaderboard_unpaid_idx ON group_leaderboard (period, unpaid_value DESC, group_id, user_id);
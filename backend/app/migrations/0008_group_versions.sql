@@ -0,0 +1,71 @@
+-- A counter per group, bumped by triggers on every change to the group's
+-- data, to tell if anything derived from a group is still current.
+CREATE TABLE IF NOT EXISTS group_versions (
+	group_id INTEGER PRIMARY KEY references groups(group_id) ON DELETE CASCADE,
+	version BIGINT NOT NULL
+);
+
+INSERT INTO group_versions (group_id, version)
+SELECT group_id, 1 FROM groups
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_group_version(changed_group_id INTEGER) RETURNS void AS $$
+	INSERT INTO group_versions AS v (group_id, version)
+	VALUES (changed_group_id, 1)
+	ON CONFLICT (group_id) DO UPDATE SET version = v.version + 1;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION bump_group_versions() RETURNS trigger AS $$
+BEGIN
+	IF TG_OP = 'UPDATE' AND OLD IS NOT DISTINCT FROM NEW THEN
+		RETURN NULL;
+	END IF;
+
+	IF TG_OP IN ('UPDATE', 'DELETE') THEN
+		PERFORM bump_group_version(OLD.group_id);
+	END IF;
+
+	IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.group_id <> OLD.group_id) THEN
+		PERFORM bump_group_version(NEW.group_id);
+	END IF;
+
+	RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- A user's name is part of every group they are a member of
+CREATE OR REPLACE FUNCTION bump_user_group_versions() RETURNS trigger AS $$
+BEGIN
+	PERFORM bump_group_version(m.group_id)
+	FROM group_members as m
+	WHERE m.user_id = NEW.user_id;
+
+	RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS groups_version ON groups;
+CREATE TRIGGER groups_version
+AFTER INSERT OR UPDATE ON groups
+FOR EACH ROW EXECUTE PROCEDURE bump_group_versions();
+
+DROP TRIGGER IF EXISTS group_members_version ON group_members;
+CREATE TRIGGER group_members_version
+AFTER INSERT OR UPDATE OR DELETE ON group_members
+FOR EACH ROW EXECUTE PROCEDURE bump_group_versions();
+
+DROP TRIGGER IF EXISTS punishment_types_version ON punishment_types;
+CREATE TRIGGER punishment_types_version
+AFTER INSERT OR UPDATE OR DELETE ON punishment_types
+FOR EACH ROW EXECUTE PROCEDURE bump_group_versions();
+
+DROP TRIGGER IF EXISTS group_punishments_version ON group_punishments;
+CREATE TRIGGER group_punishments_version
+AFTER INSERT OR UPDATE OR DELETE ON group_punishments
+FOR EACH ROW EXECUTE PROCEDURE bump_group_versions();
+
+DROP TRIGGER IF EXISTS users_version ON users;
+CREATE TRIGGER users_version
+AFTER UPDATE ON users
+FOR EACH ROW WHEN (OLD IS DISTINCT FROM NEW)
+EXECUTE PROCEDURE bump_user_group_versions();
@@ -0,0 +1,310 @@
+"""
+Applies the SQL migrations in app/migrations.
+
+A migration whose first line is `-- migrate: online` is run without a
+transaction, one statement at a time, so it can use CREATE INDEX
+CONCURRENTLY. Each statement must end with a `;` at the end of a line.
+Completed statements are recorded, and an interrupted migration resumes
+at the first statement that did not complete. A statement preceded by
+`-- migrate: batch` is a backfill that changes a bounded number of rows.
+It is repeated, each time in its own transaction, until it changes no rows,
+and must be an UPDATE, DELETE or INSERT.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+from pathlib import Path
+from time import monotonic
+from typing import NamedTuple
+
+from asyncpg import Pool
+from asyncpg.exceptions import UndefinedObjectError
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Key of the postgres advisory lock held while migrating
+MIGRATION_LOCK_ID = 7_626_697_110
+
+ONLINE_DIRECTIVE = "-- migrate: online"
+BATCH_DIRECTIVE = "-- migrate: batch"
+# Commands whose status tag ends with the number of rows they changed
+BATCH_COMMANDS = ("UPDATE", "DELETE", "INSERT")
+
+CREATE_INDEX_CONCURRENTLY = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)",
+    re.IGNORECASE,
+)
+
+
+def read_sql_file(filepath: Path) -> str:
+    """Reads an SQL file and ignores comments"""
+    with open(filepath, "r", encoding="utf-8") as file:
+        result = []
+
+        for line in file.readlines():
+            if line.startswith("--"):
+                continue
+
+            if "--" in line:
+                line = line.split("--")[0]
+
+            result.append(line.rstrip())
+
+        return "\n".join(result)
+
+
+class Step(NamedTuple):
+    sql: str
+    batch: bool
+
+
+class Migration:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.name = path.name
+        self.version = int(path.name.split("_", 1)[0])
+        self.checksum = hashlib.sha256(path.read_bytes()).hexdigest()
+
+        with open(path, "r", encoding="utf-8") as file:
+            self.online = file.readline().strip() == ONLINE_DIRECTIVE
+
+    def read(self) -> str:
+        return read_sql_file(self.path)
+
+    def steps(self) -> list[Step]:
+        """Splits the migration into its statements.
+
+        Raises ValueError for batch statements that do not report the rows
+        they changed.
+        """
+        steps = []
+        batch = False
+        lines: list[str] = []
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file.readlines():
+                if line.strip() == BATCH_DIRECTIVE:
+                    batch = True
+                    continue
+
+                line = line.split("--")[0].rstrip()
+                if not line:
+                    continue
+
+                lines.append(line)
+                if line.endswith(";"):
+                    steps.append(Step("\n".join(lines), batch))
+                    batch = False
+                    lines = []
+
+        if lines:
+            steps.append(Step("\n".join(lines), batch))
+
+        for step in steps:
+            if step.batch and step.sql.split()[0].upper() not in BATCH_COMMANDS:
+                raise ValueError(
+                    f"{self.name}: a batch statement must be one of "
+                    f"{', '.join(BATCH_COMMANDS)}, got:\n{step.sql}"
+                )
+        return steps
+
+
+class Migrator:
+    """Applies every pending migration in version order, each in its own
+    transaction, and records them in the schema_migrations table.
+
+    Only one process migrates at a time, under a postgres advisory lock.
+    Other processes wait up to `lock_timeout` seconds for it and then skip
+    migrating, so starting many workers at once does not stall on it.
+    """
+
+    def __init__(
+        self,
+        directory: Path = settings.migrations_directory,
+        *,
+        lock_timeout: float = settings.migration_lock_timeout,
+        batch_pause: float = settings.migration_batch_pause,
+    ) -> None:
+        self.directory = directory
+        self.lock_timeout = lock_timeout
+        self.batch_pause = batch_pause
+
+    def load(self) -> list[Migration]:
+        return sorted(
+            (Migration(f) for f in self.directory.iterdir() if f.suffix == ".sql"),
+            key=lambda m: m.version,
+        )
+
+    async def run(self, conn: Pool) -> list[int]:
+        """Returns the versions applied by this call."""
+        if not await self._lock(conn):
+            logger.warning("Migrations are being applied by another process, skipping.")
+            return []
+
+        try:
+            await self._create_table(conn)
+            applied = await self._applied(conn)
+            if not applied:
+                applied = await self._baseline(conn)
+
+            versions = []
+            for migration in self.load():
+                checksum = applied.get(migration.version)
+                if checksum is None:
+                    if migration.online:
+                        await self._apply_online(migration, conn)
+                    else:
+                        await self._apply(migration, conn)
+                    versions.append(migration.version)
+                elif checksum != migration.checksum:
+                    logger.warning(
+                        "Migration %s was changed after it was applied.",
+                        migration.name,
+                    )
+            return versions
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+    async def _lock(self, conn: Pool) -> bool:
+        deadline = monotonic() + self.lock_timeout
+        while True:
+            query = "SELECT pg_try_advisory_lock($1)"
+            if await conn.fetchval(query, MIGRATION_LOCK_ID):
+                return True
+            if monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.1)
+
+    async def _create_table(self, conn: Pool) -> None:
+        query = """CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    checksum TEXT NOT NULL,
+                    applied_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+                        DEFAULT (now() at time zone 'utc')
+                );
+                CREATE TABLE IF NOT EXISTS schema_migration_steps (
+                    version INTEGER NOT NULL,
+                    step INTEGER NOT NULL,
+                    completed_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+                        DEFAULT (now() at time zone 'utc'),
+                    PRIMARY KEY (version, step)
+                )"""
+        await conn.execute(query)
+
+    async def _applied(self, conn: Pool) -> dict[int, str]:
+        res = await conn.fetch("SELECT version, checksum FROM schema_migrations")
+        return {r["version"]: r["checksum"] for r in res}
+
+    async def _baseline(self, conn: Pool) -> dict[int, str]:
+        """Records the migrations applied before schema_migrations existed,
+        when only the latest version was kept in the mg.version setting.
+        """
+        try:
+            version = int(await conn.fetchval("SELECT current_setting('mg.version')"))
+        except UndefinedObjectError:
+            return {}
+
+        baseline = [m for m in self.load() if m.version <= version]
+        logger.info("Recording migrations up to version %d as applied.", version)
+        query = """INSERT INTO schema_migrations(version, name, checksum)
+                VALUES ($1, $2, $3)
+                ON CONFLICT DO NOTHING"""
+        await conn.executemany(
+            query,
+            [(m.version, m.name, m.checksum) for m in baseline],
+        )
+        return {m.version: m.checksum for m in baseline}
+
+    async def _apply(self, migration: Migration, conn: Pool) -> None:
+        logger.info("Applying migration: %s", migration.name)
+        async with conn.transaction():
+            await conn.execute(migration.read())
+            await self._record(migration, conn)
+
+    async def _record(self, migration: Migration, conn: Pool) -> None:
+        query = """INSERT INTO schema_migrations(version, name, checksum)
+                VALUES ($1, $2, $3)"""
+        await conn.execute(
+            query,
+            migration.version,
+            migration.name,
+            migration.checksum,
+        )
+
+    async def _apply_online(self, migration: Migration, conn: Pool) -> None:
+        query = "SELECT step FROM schema_migration_steps WHERE version = $1"
+        completed = {r["step"] for r in await conn.fetch(query, migration.version)}
+
+        steps = migration.steps()
+        logger.info(
+            "Applying online migration: %s (%d of %d steps done)",
+            migration.name,
+            len(completed),
+            len(steps),
+        )
+
+        for i, step in enumerate(steps):
+            if i in completed:
+                continue
+
+            logger.info("%s: step %d/%d", migration.name, i + 1, len(steps))
+            if step.batch:
+                await self._backfill(migration, i, step, conn)
+            else:
+                await self._drop_invalid_index(step, conn)
+                await conn.execute(step.sql)
+
+            query = "INSERT INTO schema_migration_steps(version, step) VALUES ($1, $2)"
+            await conn.execute(query, migration.version, i)
+
+        async with conn.transaction():
+            await self._record(migration, conn)
+            query = "DELETE FROM schema_migration_steps WHERE version = $1"
+            await conn.execute(query, migration.version)
+
+    async def _backfill(
+        self,
+        migration: Migration,
+        i: int,
+        step: Step,
+        conn: Pool,
+    ) -> None:
+        total = 0
+        while True:
+            status = await conn.execute(step.sql)
+            command, *_, count = status.split()
+            if command not in BATCH_COMMANDS or not count.isdigit():
+                raise ValueError(
+                    f"{migration.name}: step {i + 1} is not a batch statement, "
+                    f"it returned {status!r}"
+                )
+
+            rows = int(count)
+            if rows == 0:
+                break
+
+            total += rows
+            logger.info(
+                "%s: step %d backfilled %d rows so far",
+                migration.name,
+                i + 1,
+                total,
+            )
+            await asyncio.sleep(self.batch_pause)
+
+    async def _drop_invalid_index(self, step: Step, conn: Pool) -> None:
+        """A failed CREATE INDEX CONCURRENTLY leaves an invalid index behind,
+        which would make IF NOT EXISTS skip it when the step is retried.
+        """
+        match = CREATE_INDEX_CONCURRENTLY.match(step.sql)
+        if match is None:
+            return
+
+        query = """SELECT NOT indisvalid FROM pg_index
+                WHERE indexrelid = to_regclass($1)"""
+        if await conn.fetchval(query, match.group(1)):
+            logger.info("Dropping invalid index %s", match.group(1))
+            await conn.execute(f"DROP INDEX CONCURRENTLY {match.group(1)}")
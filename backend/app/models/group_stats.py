@@ -0,0 +1,38 @@
+"""
+Models for group statistics data structures
+"""
+
+from datetime import datetime
+from enum import Enum
+
+from app.types import GroupId, PunishmentTypeId
+from pydantic import BaseModel  # pylint: disable=no-name-in-module
+
+
+class StatsBucket(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class PunishmentTypeStats(BaseModel):
+    punishment_type_id: PunishmentTypeId
+    created: int
+    issued_value: int
+    verified_value: int
+
+
+class GroupStatsBucket(BaseModel):
+    # Punishments are counted in the bucket they were created in, and their
+    # value as verified in the bucket they were verified in.
+    start: datetime
+    created: int
+    issued_value: int
+    verified_value: int
+    punishment_types: list[PunishmentTypeStats]
+
+
+class GroupStats(BaseModel):
+    group_id: GroupId
+    bucket: StatsBucket
+    buckets: list[GroupStatsBucket]
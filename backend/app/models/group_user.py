@@ -3,17 +3,34 @@ Models for group user data structures. Group users contains field from both
 the table 'group_members' and 'users'.
 """
 
-from app.types import OWGroupUserId
+from app.types import OWGroupUserId, PunishmentTypeId
+from pydantic import BaseModel  # pylint: disable=no-name-in-module
 
 from .punishment import PunishmentOut
 from .user import User
 
 
+class PunishmentTypeTotals(BaseModel):
+    punishment_type_id: PunishmentTypeId
+    count: int
+    unpaid_count: int
+    value: int
+    unpaid_value: int
+
+
 class BaseGroupUser(User):
     ow_group_user_id: OWGroupUserId | None = None
     punishments: list[PunishmentOut] = []
     active: bool = True
 
+    # Totals of all the member's punishments, and of those not yet verified.
+    # Values are amounts times the value of the punishment type.
+    total_count: int = 0
+    unpaid_count: int = 0
+    total_value: int = 0
+    unpaid_value: int = 0
+    punishment_type_totals: list[PunishmentTypeTotals] = []
+
 
 class GroupUser(BaseGroupUser):
     pass
@@ -0,0 +1,37 @@
+"""
+Models for leaderboard data structures
+"""
+
+from datetime import datetime
+from enum import Enum
+
+from app.types import GroupId, UserId
+from pydantic import BaseModel  # pylint: disable=no-name-in-module
+
+
+class LeaderboardPeriod(str, Enum):
+    WEEK = "week"
+    MONTH = "month"
+    ALL_TIME = "all"
+
+
+class LeaderboardOrder(str, Enum):
+    TOTAL = "total"
+    UNPAID = "unpaid"
+
+
+class LeaderboardEntry(BaseModel):
+    group_id: GroupId
+    user_id: UserId
+    first_name: str
+    last_name: str
+    count: int
+    total_value: int
+    unpaid_value: int
+
+
+class Leaderboard(BaseModel):
+    period: LeaderboardPeriod
+    order: LeaderboardOrder
+    refreshed_at: datetime | None  # None while the snapshot is empty
+    entries: list[LeaderboardEntry]
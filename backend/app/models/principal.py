@@ -0,0 +1,12 @@
+"""
+Models for the authenticated user behind an access token.
+"""
+
+from app.types import GroupId, OWUserId, UserId
+from pydantic import BaseModel  # pylint: disable=no-name-in-module
+
+
+class Principal(BaseModel):
+    user_id: UserId
+    ow_user_id: OWUserId
+    group_ids: frozenset[GroupId]
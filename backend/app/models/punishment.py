@@ -2,10 +2,10 @@
 Models for punishment data structures
 """
 
-from datetime import datetime
+from datetime import datetime, timezone
 
 from app.types import GroupId, PunishmentId, PunishmentTypeId, UserId
-from pydantic import BaseModel  # pylint: disable=no-name-in-module
+from pydantic import BaseModel, validator  # pylint: disable=no-name-in-module
 
 
 class PunishmentBase(BaseModel):
@@ -29,3 +29,26 @@ class PunishmentOut(PunishmentCreate):
 class PunishmentRead(PunishmentOut):
     group_id: GroupId
     user_id: UserId
+
+
+class PunishmentPage(BaseModel):
+    punishments: list[PunishmentOut]
+    next_cursor: str | None
+
+
+class PunishmentFilters(BaseModel):
+    verified: bool | None = None
+    punishment_type_id: PunishmentTypeId | None = None
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+    created_by: UserId | None = None
+
+    @validator("created_after", "created_before")
+    def to_naive_utc(  # pylint: disable=no-self-argument
+        cls,
+        value: datetime | None,
+    ) -> datetime | None:
+        """Timestamps are stored as naive UTC"""
+        if value is not None and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
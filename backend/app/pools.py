@@ -0,0 +1,169 @@
+"""
+The connection pools of the database.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, cast
+
+from app.config import settings
+from app.utils.pool_monitor import MonitoredPool
+from app.utils.pool_tracer import TracedPool
+from app.utils.replica import ReplicaPool
+from asyncpg import Connection, Pool, create_pool
+from asyncpg.exceptions import CannotConnectNowError
+
+logger = logging.getLogger(__name__)
+
+
+class DatabasePools:
+    """The primary pool, wrapped for monitoring and, with POOL_TRACE, for
+    tracing, and the read pool routing pure reads to a read replica if one
+    is configured.
+
+    `init` is run on every new connection of the pools.
+    """
+
+    def __init__(
+        self,
+        init: Callable[[Connection], Awaitable[None]] | None = None,
+    ) -> None:
+        self.init = init
+        self.primary: Pool | None = None
+        self.monitor: MonitoredPool | None = None
+        self.replica: ReplicaPool | None = None
+        self.replica_monitor: MonitoredPool | None = None
+        self._db_name = ""
+
+    async def connect(self, db_settings: dict[str, Any]) -> None:
+        self._db_name = db_settings.get("database", settings.postgres_db)
+        for _ in range(10):  # Try for 10*0.5 seconds
+            try:
+                logger.info("Connecting to postgres database.")
+
+                pool = await self._create_pool(
+                    db_settings.get("host", settings.postgres_host),
+                    db_settings.get("port", settings.postgres_port),
+                    settings.postgres_pool_min_size,
+                    db_settings,
+                )
+            except (ConnectionError, CannotConnectNowError):
+                logger.info(
+                    "Connection to postgres database could not be established. Retrying in 0.5s"
+                )
+                await asyncio.sleep(0.5)
+            else:
+                self.monitor, self.primary = self._wrap_pool(pool)
+                break
+
+        if self.primary is None:
+            raise RuntimeError("Couldn't connect to postgres database.")
+
+        replica_host = db_settings.get("replica_host", settings.postgres_replica_host)
+        if replica_host is not None:
+            await self._connect_replica(self.primary, replica_host, db_settings)
+
+    async def _connect_replica(
+        self,
+        primary: Pool,
+        host: str,
+        db_settings: dict[str, Any],
+    ) -> None:
+        port = db_settings.get("replica_port", settings.postgres_replica_port)
+        try:
+            pool = await self._create_pool(
+                host,
+                port,
+                settings.postgres_pool_min_size,
+                db_settings,
+            )
+        except (ConnectionError, CannotConnectNowError):
+            # Connects once the replica is up, reads go to the primary until then
+            logger.warning("Read replica could not be reached.")
+            pool = await self._create_pool(host, port, 0, db_settings)
+
+        self.replica_monitor, replica = self._wrap_pool(pool)
+        self.replica = ReplicaPool(
+            primary,
+            replica,
+            max_lag=settings.replica_max_lag,
+            check_interval=settings.replica_check_interval,
+        )
+        self.replica.start()
+
+    async def _create_pool(
+        self,
+        host: str,
+        port: int | str,
+        min_size: int,
+        db_settings: dict[str, Any],
+    ) -> Pool:
+        return await create_pool(
+            host=host,
+            port=port,
+            user=db_settings.get("user", settings.postgres_user),
+            password=db_settings.get("password", settings.postgres_password),
+            database=self._db_name,
+            min_size=min_size,
+            max_size=self._max_limit(),
+            max_queries=settings.postgres_pool_max_queries,
+            max_inactive_connection_lifetime=settings.postgres_pool_max_inactive_lifetime,
+            command_timeout=settings.postgres_command_timeout,
+            init=self.init,
+        )
+
+    def _max_limit(self) -> int:
+        max_size = max(settings.postgres_pool_max_size, settings.postgres_pool_min_size)
+        if settings.postgres_pool_adaptive:
+            return max(settings.postgres_pool_adaptive_max_size, max_size)
+        return max_size
+
+    def _wrap_pool(self, pool: Pool) -> tuple[MonitoredPool, Pool]:
+        # Quacks like a pool, everything not monitored is passed through
+        monitor = MonitoredPool(
+            pool,
+            limit=max(settings.postgres_pool_max_size, settings.postgres_pool_min_size),
+            max_limit=self._max_limit(),
+            grow_threshold=settings.postgres_pool_grow_threshold,
+            shrink_after=settings.postgres_pool_shrink_after,
+        )
+
+        if not settings.pool_trace:
+            return monitor, cast(Pool, monitor)
+
+        # Quacks like a pool, everything not traced is passed through
+        return monitor, cast(
+            Pool,
+            TracedPool(
+                cast(Pool, monitor),
+                hold_threshold=settings.pool_trace_hold_threshold,
+                raise_on_violation=settings.pool_trace_raise,
+            ),
+        )
+
+    async def close(self) -> None:
+        if self.replica is not None:
+            await self.replica.close()
+        if self.primary is not None:
+            await self.primary.close()
+
+    def stats(self) -> dict[str, Any]:
+        assert self.primary is not None
+        stats: dict[str, Any] = {
+            "size": self.primary.get_size(),
+            "idle": self.primary.get_idle_size(),
+            "max_size": self.primary.get_max_size(),
+        }
+        if self.monitor is not None:
+            stats |= self.monitor.stats()
+        if isinstance(self.primary, TracedPool):
+            stats["trace"] = self.primary.stats()
+        if self.replica is not None and self.replica_monitor is not None:
+            replica = self.replica.replica
+            stats["replica"] = {
+                "size": replica.get_size(),
+                "idle": replica.get_idle_size(),
+                "max_size": replica.get_max_size(),
+                **self.replica_monitor.stats(),
+                **self.replica.stats(),
+            }
+        return stats
@@ -0,0 +1,514 @@
+"""
+SQL queries of the database, and builders for their filtered variants.
+"""
+from typing import Any
+
+from app.models.leaderboard import LeaderboardOrder
+from app.models.punishment import PunishmentFilters
+from app.utils.query_registry import QueryRegistry
+
+# The JSON queries build objects with the same keys, in the same order, as
+# the pydantic models they stand in for. Timestamps are formatted like
+# datetime.isoformat(). $1 is the group id, $2 whether to include punishments
+# and the values of punishment filters follow.
+PUNISHMENTS_JSON_AGG = """json_agg(json_build_object(
+    'punishment_type_id', p.punishment_type_id,
+    'reason', p.reason,
+    'amount', p.amount,
+    'punishment_id', p.punishment_id,
+    'created_time', to_char(p.created_time, 'YYYY-MM-DD"T"HH24:MI:SS.US'),
+    'created_by', p.created_by,
+    'verified_time', to_char(p.verified_time, 'YYYY-MM-DD"T"HH24:MI:SS.US'),
+    'verified_by', p.verified_by
+) ORDER BY p.punishment_id)"""
+
+GROUP_USER_JSON = """json_build_object(
+    'ow_user_id', u.ow_user_id,
+    'first_name', u.first_name,
+    'last_name', u.last_name,
+    'email', u.email,
+    'user_id', u.user_id,
+    'ow_group_user_id', m.ow_group_user_id,
+    'punishments', COALESCE(p.punishments, '[]'),
+    'active', m.active,
+    'total_count', totals.total_count,
+    'unpaid_count', totals.unpaid_count,
+    'total_value', totals.total_value,
+    'unpaid_value', totals.unpaid_value,
+    'punishment_type_totals', totals.punishment_type_totals
+)"""
+
+# The totals of the group member `m`, kept by triggers in group_member_totals
+MEMBER_TOTALS_JOIN = """LEFT JOIN LATERAL (
+    SELECT
+        COALESCE(sum(t.count), 0) as total_count,
+        COALESCE(sum(t.unpaid_count), 0) as unpaid_count,
+        COALESCE(sum(t.amount * pt.value), 0) as total_value,
+        COALESCE(sum(t.unpaid_amount * pt.value), 0) as unpaid_value,
+        COALESCE(json_agg(json_build_object(
+            'punishment_type_id', t.punishment_type_id,
+            'count', t.count,
+            'unpaid_count', t.unpaid_count,
+            'value', t.amount * pt.value,
+            'unpaid_value', t.unpaid_amount * pt.value
+        ) ORDER BY t.punishment_type_id), '[]') as punishment_type_totals
+    FROM group_member_totals as t
+    INNER JOIN punishment_types as pt
+    ON pt.punishment_type_id = t.punishment_type_id
+    WHERE t.group_id = m.group_id AND t.user_id = m.user_id AND t.count > 0
+) as totals
+ON true"""
+
+
+def group_users_json_query(conditions: str = "") -> str:
+    return f"""
+        SELECT json_agg({GROUP_USER_JSON} ORDER BY u.user_id)
+        FROM group_members as m
+        INNER JOIN users as u
+        ON u.user_id = m.user_id
+        {MEMBER_TOTALS_JOIN}
+        LEFT JOIN (
+            SELECT p.user_id, {PUNISHMENTS_JSON_AGG} as punishments
+            FROM group_punishments as p
+            WHERE p.group_id = $1 AND $2::boolean{conditions}
+            GROUP BY p.user_id
+        ) as p
+        ON p.user_id = m.user_id
+        WHERE m.group_id = $1
+    """
+
+
+def group_user_rows_json_query(conditions: str = "") -> str:
+    """One row per member, punishments are aggregated for one member at a
+    time.
+    """
+    return f"""
+        SELECT {GROUP_USER_JSON}::text
+        FROM group_members as m
+        INNER JOIN users as u
+        ON u.user_id = m.user_id
+        {MEMBER_TOTALS_JOIN}
+        LEFT JOIN LATERAL (
+            SELECT {PUNISHMENTS_JSON_AGG} as punishments
+            FROM group_punishments as p
+            WHERE p.group_id = m.group_id
+            AND p.user_id = m.user_id
+            AND $2::boolean{conditions}
+        ) as p
+        ON true
+        WHERE m.group_id = $1
+        ORDER BY u.user_id
+    """
+
+
+def punishment_conditions(filters: PunishmentFilters | None, args: list[Any]) -> str:
+    """Returns the filters as SQL conditions on group_punishments aliased as
+    `p`, and appends their values to the query arguments.
+
+    Only the filters that are set end up in the query, so the planner can use
+    the partial index on unverified punishments.
+    """
+    if filters is None:
+        return ""
+
+    def param(value: Any) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    conditions = []
+    if filters.verified is not None:
+        conditions.append(
+            "p.verified_time IS NOT NULL"
+            if filters.verified
+            else "p.verified_time IS NULL"
+        )
+    if filters.punishment_type_id is not None:
+        conditions.append(f"p.punishment_type_id = {param(filters.punishment_type_id)}")
+    if filters.created_after is not None:
+        conditions.append(f"p.created_time >= {param(filters.created_after)}")
+    if filters.created_before is not None:
+        conditions.append(f"p.created_time < {param(filters.created_before)}")
+    if filters.created_by is not None:
+        conditions.append(f"p.created_by = {param(filters.created_by)}")
+
+    return "".join(f" AND {condition}" for condition in conditions)
+
+
+def group_json_query(conditions: str = "") -> str:
+    members_query = group_users_json_query(conditions)
+    return f"""
+        SELECT json_build_object(
+            'name', g.name,
+            'name_short', g.name_short,
+            'rules', g.rules,
+            'ow_group_id', g.ow_group_id,
+            'image', g.image,
+            'group_id', g.group_id,
+            'punishment_types', COALESCE((
+                SELECT json_agg(json_build_object(
+                    'name', t.name,
+                    'value', t.value,
+                    'logo_url', t.logo_url,
+                    'punishment_type_id', t.punishment_type_id
+                ) ORDER BY t.punishment_type_id)
+                FROM punishment_types as t
+                WHERE t.group_id = g.group_id
+            ), '[]'),
+            'members', COALESCE(({members_query}), '[]')
+        )
+        FROM groups as g
+        WHERE g.group_id = $1
+    """
+
+
+def group_users_json_array_query(conditions: str = "") -> str:
+    return f"SELECT COALESCE(({group_users_json_query(conditions)}), '[]')"
+
+
+def punishments_page_query(conditions: str = "") -> str:
+    """$1 is the group id, $2 the user id and $3 the page size."""
+    return f"""
+        SELECT * FROM group_punishments as p
+        WHERE p.group_id = $1
+        AND p.user_id = $2{conditions}
+        ORDER BY p.created_time DESC, p.punishment_id DESC
+        LIMIT $3
+    """
+
+
+LEADERBOARD_COLUMNS = {
+    LeaderboardOrder.TOTAL: "total_value",
+    LeaderboardOrder.UNPAID: "unpaid_value",
+}
+
+
+def leaderboard_query(order: LeaderboardOrder, group: bool) -> str:
+    """$1 is the period and $2 the number of entries. With `group`, $3 is
+    the group id.
+    """
+    column = LEADERBOARD_COLUMNS[order]
+    group_condition = "AND l.group_id = $3" if group else ""
+    return f"""
+        SELECT
+            l.group_id,
+            l.user_id,
+            u.first_name,
+            u.last_name,
+            l.count,
+            l.total_value,
+            l.unpaid_value
+        FROM group_leaderboard as l
+        INNER JOIN users as u
+        ON u.user_id = l.user_id
+        WHERE l.period = $1 {group_condition}
+        AND l.{column} > 0
+        ORDER BY l.{column} DESC, l.group_id, l.user_id
+        LIMIT $2
+    """
+
+
+# Key of the postgres advisory lock held while refreshing the leaderboard
+LEADERBOARD_LOCK_ID = 7_626_697_111
+
+# Every row of the snapshot has the same refreshed_at
+GET_LEADERBOARD_REFRESHED_AT = "SELECT refreshed_at FROM group_leaderboard LIMIT 1"
+IS_LEADERBOARD_FRESH = """SELECT refreshed_at > now() - make_interval(secs => $1)
+    FROM group_leaderboard LIMIT 1"""
+REFRESH_LEADERBOARD = "REFRESH MATERIALIZED VIEW CONCURRENTLY group_leaderboard"
+
+# The queries run by most requests, prepared on every pool connection. The
+# variants with punishment filters are prepared on their first call.
+queries = QueryRegistry()
+
+GET_USER = queries.register("get_user", "SELECT * FROM users WHERE user_id = $1")
+GET_USER_BY_OW_USER_ID = queries.register(
+    "get_user_by_ow_user_id",
+    "SELECT * FROM users WHERE ow_user_id = $1",
+)
+GET_PRINCIPAL = queries.register(
+    "get_principal",
+    """SELECT
+        users.user_id,
+        users.ow_user_id,
+        array_remove(array_agg(m.group_id), NULL) as group_ids
+    FROM users
+    LEFT JOIN group_members as m
+    ON users.user_id = m.user_id
+    WHERE users.ow_user_id = $1
+    GROUP BY users.user_id
+    """,
+)
+IS_IN_GROUP = queries.register(
+    "is_in_group",
+    """SELECT 1 FROM group_members
+    WHERE group_id = $1 AND user_id = $2""",
+)
+IS_IN_GROUP_BY_OW_USER_ID = queries.register(
+    "is_in_group_by_ow_user_id",
+    """SELECT 1 FROM group_members
+    INNER JOIN users ON users.user_id = group_members.user_id
+    WHERE group_id = $1 AND users.ow_user_id = $2""",
+)
+GET_FRESH_OW_GROUP_IDS = queries.register(
+    "get_fresh_ow_group_ids",
+    """SELECT groups.ow_group_id FROM groups
+    INNER JOIN group_syncs as s ON groups.group_id = s.group_id
+    INNER JOIN group_members as m ON groups.group_id = m.group_id
+    WHERE m.user_id = $1
+    AND groups.ow_group_id = ANY($2::int[])
+    AND s.last_synced_at > (now() at time zone 'utc') - $3::interval
+    """,
+)
+TOUCH_GROUP_SYNC = queries.register(
+    "touch_group_sync_if_unchanged",
+    """UPDATE group_syncs as s
+    SET last_synced_at = now() at time zone 'utc'
+    FROM groups
+    WHERE groups.group_id = s.group_id
+    AND groups.ow_group_id = $1
+    AND s.payload_hash = $2
+    RETURNING s.group_id
+    """,
+)
+GET_GROUP_JSON = queries.register("get_group_json", group_json_query())
+GET_GROUP_USERS_JSON = queries.register(
+    "get_group_users_json",
+    group_users_json_array_query(),
+)
+GET_PUNISHMENTS_PAGE = queries.register(
+    "get_punishments_page",
+    punishments_page_query(),
+)
+GET_GROUP_VERSION = queries.register(
+    "get_group_version",
+    """SELECT COALESCE(v.version, 0) FROM groups
+    LEFT JOIN group_versions as v ON v.group_id = groups.group_id
+    WHERE groups.group_id = $1""",
+)
+# xmin changes with every update of the row
+GET_USER_VERSION = queries.register(
+    "get_user_version",
+    "SELECT xmin FROM users WHERE user_id = $1",
+)
+GET_USER_GROUP_VERSIONS = queries.register(
+    "get_user_group_versions",
+    """SELECT m.group_id, COALESCE(v.version, 0) as version
+    FROM users as u
+    LEFT JOIN group_members as m ON m.user_id = u.user_id
+    LEFT JOIN group_versions as v ON v.group_id = m.group_id
+    WHERE u.user_id = $1
+    ORDER BY m.group_id""",
+)
+# Punishments are counted in the bucket of their created_time, and their
+# value as verified in the bucket of their verified_time.
+GET_GROUP_STATS = queries.register(
+    "get_group_stats",
+    """WITH issued as (
+        SELECT
+            date_trunc($2, p.created_time) as start,
+            p.punishment_type_id,
+            count(*) as created,
+            sum(p.amount * pt.value) as issued_value
+        FROM group_punishments as p
+        INNER JOIN punishment_types as pt
+        ON pt.punishment_type_id = p.punishment_type_id
+        WHERE p.group_id = $1 AND pt.group_id = $1
+        GROUP BY 1, 2
+    ), verified as (
+        SELECT
+            date_trunc($2, p.verified_time) as start,
+            p.punishment_type_id,
+            sum(p.amount * pt.value) as verified_value
+        FROM group_punishments as p
+        INNER JOIN punishment_types as pt
+        ON pt.punishment_type_id = p.punishment_type_id
+        WHERE p.group_id = $1 AND pt.group_id = $1
+        AND p.verified_time IS NOT NULL
+        GROUP BY 1, 2
+    )
+    SELECT
+        start,
+        punishment_type_id,
+        COALESCE(i.created, 0) as created,
+        COALESCE(i.issued_value, 0) as issued_value,
+        COALESCE(v.verified_value, 0) as verified_value
+    FROM issued as i
+    FULL JOIN verified as v USING (start, punishment_type_id)
+    ORDER BY start, punishment_type_id
+    """,
+)
+GET_LEADERBOARD = {
+    (order, group): queries.register(
+        f"get_{'group_' if group else ''}leaderboard_{order.value}",
+        leaderboard_query(order, group),
+    )
+    for order in LeaderboardOrder
+    for group in (False, True)
+}
+
+SET_GROUP_SYNCED = """INSERT INTO group_syncs(group_id, last_synced_at, payload_hash)
+    VALUES ($1, now() at time zone 'utc', $2)
+    ON CONFLICT (group_id) DO UPDATE
+    SET last_synced_at = EXCLUDED.last_synced_at,
+        payload_hash = EXCLUDED.payload_hash
+    """
+
+GET_USER_GROUPS = """SELECT groups.* FROM groups
+    INNER JOIN group_members ON groups.group_id = group_members.group_id
+    WHERE group_members.user_id = $1"""
+
+GET_USER_GROUPS_BY_OW_USER_ID = """SELECT groups.* FROM groups
+    INNER JOIN group_members ON groups.group_id = group_members.group_id
+    INNER JOIN users ON users.user_id = group_members.user_id
+    WHERE users.ow_user_id = $1"""
+
+GET_USER_PUNISHMENTS = """SELECT * FROM group_punishments
+    WHERE group_id = $1
+    AND user_id = $2
+    """
+
+GET_USERS_PUNISHMENTS = """SELECT * FROM group_punishments
+    WHERE group_id = $1
+    AND user_id = ANY($2)
+    """
+
+GET_GROUP_USER = f"""SELECT m.active, m.ow_group_user_id, users.*, totals.*
+    FROM users
+    INNER JOIN group_members as m
+    ON users.user_id = m.user_id
+    {MEMBER_TOTALS_JOIN}
+    WHERE users.user_id = $1 AND m.group_id = $2
+    """
+
+GET_RAW_GROUP_USERS = """SELECT m.active, m.ow_group_user_id, users.*
+    FROM users
+    INNER JOIN group_members as m
+    ON users.user_id = m.user_id
+    WHERE m.group_id = $1
+    """
+
+GET_GROUP_USERS = f"""SELECT m.active, m.ow_group_user_id, users.*, totals.*
+    FROM users
+    INNER JOIN group_members as m
+    ON users.user_id = m.user_id
+    {MEMBER_TOTALS_JOIN}
+    WHERE m.group_id = $1
+    """
+
+DELETE_USERS_FROM_GROUP = """DELETE FROM group_members
+    WHERE group_id = $1 AND user_id = ANY($2::bigint[])
+    RETURNING user_id;
+    """
+
+INSERT_USER = """INSERT INTO users(ow_user_id, first_name, last_name, email)
+    VALUES ($1, $2, $3, $4)
+    RETURNING user_id"""
+
+UPDATE_USER = """UPDATE users
+    SET first_name = $1, last_name = $2, email = $3
+    WHERE user_id = $4"""
+
+UPDATE_USER_BY_OW_USER_ID = """UPDATE users
+    SET first_name = $1, last_name = $2, email = $3
+    WHERE ow_user_id = $4
+    RETURNING user_id"""
+
+INSERT_USERS = """INSERT INTO users(ow_user_id, first_name, last_name, email)
+    (SELECT
+        u.ow_user_id, u.first_name, u.last_name, u.email
+    FROM
+        unnest($1::users[]) as u
+    )
+    RETURNING user_id, ow_user_id
+    """
+
+UPDATE_USERS_BY_OW_USER_ID = """UPDATE users
+    SET first_name = u.first_name, last_name = u.last_name, email = u.email
+    FROM
+        unnest($1::users[]) as u
+    WHERE
+        users.ow_user_id = u.ow_user_id
+    RETURNING users.user_id, users.ow_user_id
+    """
+
+INSERT_GROUP = """INSERT INTO groups(ow_group_id, name, name_short, rules, image)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING group_id;"""
+
+UPDATE_GROUP = """UPDATE groups
+    SET name = $1, name_short = $2, rules = $3, image = $4
+    WHERE ow_group_id = $5
+    RETURNING group_id;"""
+
+INSERT_GROUP_MEMBER = """INSERT INTO group_members(group_id, user_id, ow_group_user_id)
+    VALUES ($1, $2, $3)
+    RETURNING group_id, user_id
+    """
+
+INSERT_GROUP_MEMBERS = """INSERT INTO group_members(group_id, user_id, ow_group_user_id)
+    (SELECT
+        m.group_id, m.user_id, m.ow_group_user_id
+    FROM
+        unnest($1::group_members[]) as m
+    )
+    RETURNING group_id, user_id
+    """
+
+UPDATE_GROUP_MEMBERS = """UPDATE group_members
+    SET active = m.active
+    FROM
+        unnest($1::group_members[]) as m
+    WHERE
+        group_members.ow_group_user_id = m.ow_group_user_id
+    RETURNING m.group_id, m.user_id;
+    """
+
+INSERT_PUNISHMENT_TYPE = """INSERT INTO punishment_types(group_id, name, value, logo_url)
+    VALUES ($1, $2, $3, $4)
+    RETURNING punishment_type_id
+    """
+
+INSERT_PUNISHMENTS = """WITH valid AS (
+        SELECT
+            EXISTS(
+                SELECT 1 FROM group_members
+                WHERE group_id = $2 AND user_id = $3
+            )
+            AND (
+                SELECT count(*) FROM punishment_types
+                WHERE group_id = $2
+                AND punishment_type_id = ANY($4::int[])
+            ) = $5 as ok
+    ), inserted AS (
+        INSERT INTO group_punishments(group_id,
+                                      user_id,
+                                      punishment_type_id,
+                                      reason,
+                                      amount,
+                                      created_by)
+        (SELECT
+            p.group_id,
+            p.user_id,
+            p.punishment_type_id,
+            p.reason,
+            p.amount,
+            p.created_by
+        FROM
+            unnest($1::group_punishments[]) as p
+        WHERE (SELECT ok FROM valid)
+        )
+        RETURNING punishment_id
+    )
+    SELECT
+        (SELECT ok FROM valid) as ok,
+        ARRAY(
+            SELECT punishment_id FROM inserted
+            ORDER BY punishment_id
+        ) as ids
+    """
+
+VERIFY_PUNISHMENT = """UPDATE group_punishments
+    SET verified_by = $1, verified_time = $2
+    WHERE punishment_id = $3
+    RETURNING punishment_id
+    """
@@ -0,0 +1,288 @@
+"""
+Queries of the views served from the read pool: the JSON documents of the
+groups, the pages of punishments, the versions and the statistics.
+"""
+import datetime
+from typing import Any, AsyncIterator, cast
+
+from app.exceptions import NotFound
+from app.models.group_stats import (
+    GroupStats,
+    GroupStatsBucket,
+    PunishmentTypeStats,
+    StatsBucket,
+)
+from app.models.leaderboard import (
+    Leaderboard,
+    LeaderboardEntry,
+    LeaderboardOrder,
+    LeaderboardPeriod,
+)
+from app.models.punishment import PunishmentFilters, PunishmentOut
+from app.queries import (
+    GET_GROUP_JSON,
+    GET_GROUP_STATS,
+    GET_GROUP_USERS_JSON,
+    GET_GROUP_VERSION,
+    GET_LEADERBOARD,
+    GET_LEADERBOARD_REFRESHED_AT,
+    GET_PUNISHMENTS_PAGE,
+    GET_USER_GROUP_VERSIONS,
+    GET_USER_VERSION,
+    group_json_query,
+    group_user_rows_json_query,
+    group_users_json_array_query,
+    punishment_conditions,
+    punishments_page_query,
+)
+from app.types import GroupId, PunishmentId, UserId
+from app.utils.db import MaybeAcquire
+from app.utils.query_registry import QueryRunner
+from asyncpg import Pool
+
+STREAM_BATCH_SIZE = 100  # Members per chunk when streaming
+
+
+class ReadQueries:
+    """The queries of `Database` that are only ever routed through the read
+    pool.
+    """
+
+    _queries: QueryRunner
+
+    @property
+    def read_pool(self) -> Pool:
+        raise NotImplementedError
+
+    async def get_group_json(
+        self,
+        group_id: GroupId,
+        punishments: bool = True,
+        filters: PunishmentFilters | None = None,
+        conn: Pool | None = None,
+    ) -> str:
+        """Fetches the group with its punishment types, members and their
+        punishments as a single JSON document, in the shape of `Group`.
+        """
+        args: list[Any] = [group_id, punishments]
+        conditions = punishment_conditions(filters, args)
+
+        async with MaybeAcquire(conn, self.read_pool) as conn:
+            if conditions:
+                db_group = await conn.fetchval(group_json_query(conditions), *args)
+            else:
+                db_group = await self._queries.fetchval(conn, GET_GROUP_JSON, *args)
+
+            if db_group is None:
+                raise NotFound
+
+            return cast(str, db_group)
+
+    async def get_group_users_json(
+        self,
+        group_id: GroupId,
+        punishments: bool = True,
+        filters: PunishmentFilters | None = None,
+        conn: Pool | None = None,
+    ) -> str:
+        """Fetches the members of a group as a JSON array, in the shape of
+        `list[GroupUser]`.
+        """
+        args: list[Any] = [group_id, punishments]
+        conditions = punishment_conditions(filters, args)
+
+        async with MaybeAcquire(conn, self.read_pool) as conn:
+            if conditions:
+                query = group_users_json_array_query(conditions)
+                db_users = await conn.fetchval(query, *args)
+            else:
+                db_users = await self._queries.fetchval(
+                    conn, GET_GROUP_USERS_JSON, *args
+                )
+
+        return cast(str, db_users)
+
+    async def stream_group_users_json(
+        self,
+        group_id: GroupId,
+        punishments: bool = True,
+        filters: PunishmentFilters | None = None,
+        batch_size: int = STREAM_BATCH_SIZE,
+    ) -> AsyncIterator[str]:
+        """Yields the members of a group as chunks of a JSON array, in the
+        shape of `list[GroupUser]`.
+
+        Members are read through a server-side cursor, so only `batch_size`
+        of them are held in memory at a time. A connection is held until the
+        iterator is exhausted or closed.
+        """
+        args: list[Any] = [group_id, punishments]
+        query = group_user_rows_json_query(punishment_conditions(filters, args))
+
+        async with self.read_pool.acquire() as conn:
+            async with conn.transaction():
+                separator = "["
+                batch = []
+                async for record in conn.cursor(query, *args, prefetch=batch_size):
+                    batch.append(record[0])
+                    if len(batch) >= batch_size:
+                        yield separator + ",".join(batch)
+                        separator = ","
+                        batch = []
+
+                if batch:
+                    yield separator + ",".join(batch)
+                    separator = ","
+
+                yield "[]" if separator == "[" else "]"
+
+    async def get_punishments_page(
+        self,
+        group_id: GroupId,
+        user_id: UserId,
+        limit: int,
+        after: tuple[datetime.datetime, PunishmentId] | None = None,
+        filters: PunishmentFilters | None = None,
+        conn: Pool | None = None,
+    ) -> list[PunishmentOut]:
+        """Fetches a user's punishments in a group, newest first, starting
+        after the (created_time, punishment_id) key `after`.
+        """
+        args: list[Any] = [group_id, user_id, limit]
+        conditions = punishment_conditions(filters, args)
+        if after is not None:
+            args.extend(after)
+            conditions += f" AND (p.created_time, p.punishment_id) < (${len(args) - 1}, ${len(args)})"
+
+        async with MaybeAcquire(conn, self.read_pool) as conn:
+            if conditions:
+                query = punishments_page_query(conditions)
+                punishments = await conn.fetch(query, *args)
+            else:
+                punishments = await self._queries.fetch(
+                    conn, GET_PUNISHMENTS_PAGE, *args
+                )
+
+        return [PunishmentOut(**dict(x)) for x in punishments]
+
+    async def get_group_version(
+        self,
+        group_id: GroupId,
+        conn: Pool | None = None,
+    ) -> int:
+        """Fetches the version of the group, which changes with every change
+        to the group, its members, their punishments or the punishment types.
+        """
+        async with MaybeAcquire(conn, self.read_pool) as conn:
+            version = await self._queries.fetchval(conn, GET_GROUP_VERSION, group_id)
+
+        if version is None:
+            raise NotFound
+        return int(version)
+
+    async def get_user_version(
+        self,
+        user_id: UserId,
+        conn: Pool | None = None,
+    ) -> int:
+        """Fetches a version stamp of the user, which changes with every
+        change to the user.
+        """
+        async with MaybeAcquire(conn, self.read_pool) as conn:
+            version = await self._queries.fetchval(conn, GET_USER_VERSION, user_id)
+
+        if version is None:
+            raise NotFound
+        return int(version)
+
+    async def get_user_group_versions(
+        self,
+        user_id: UserId,
+        conn: Pool | None = None,
+    ) -> dict[GroupId, int]:
+        """Fetches the versions of the groups the user is a member of. Raises
+        NotFound if the user does not exist.
+        """
+        async with MaybeAcquire(conn, self.read_pool) as conn:
+            rows = await self._queries.fetch(conn, GET_USER_GROUP_VERSIONS, user_id)
+
+        if not rows:
+            raise NotFound
+
+        # A user without groups has a single row without a group
+        return {
+            row["group_id"]: row["version"]
+            for row in rows
+            if row["group_id"] is not None
+        }
+
+    async def get_group_stats(
+        self,
+        group_id: GroupId,
+        bucket: StatsBucket,
+        conn: Pool | None = None,
+    ) -> GroupStats:
+        """Aggregates the punishments of the group per time bucket and
+        punishment type.
+        """
+        async with MaybeAcquire(conn, self.read_pool) as conn:
+            rows = await self._queries.fetch(
+                conn, GET_GROUP_STATS, group_id, bucket.value
+            )
+
+        buckets: dict[datetime.datetime, GroupStatsBucket] = {}
+        for row in rows:
+            stats = buckets.setdefault(
+                row["start"],
+                GroupStatsBucket(
+                    start=row["start"],
+                    created=0,
+                    issued_value=0,
+                    verified_value=0,
+                    punishment_types=[],
+                ),
+            )
+            stats.created += row["created"]
+            stats.issued_value += row["issued_value"]
+            stats.verified_value += row["verified_value"]
+            stats.punishment_types.append(
+                PunishmentTypeStats(
+                    punishment_type_id=row["punishment_type_id"],
+                    created=row["created"],
+                    issued_value=row["issued_value"],
+                    verified_value=row["verified_value"],
+                )
+            )
+
+        return GroupStats(
+            group_id=group_id,
+            bucket=bucket,
+            buckets=list(buckets.values()),
+        )
+
+    async def get_leaderboard(
+        self,
+        period: LeaderboardPeriod,
+        order: LeaderboardOrder,
+        limit: int,
+        group_id: GroupId | None = None,
+        conn: Pool | None = None,
+    ) -> Leaderboard:
+        """Fetches the members with the highest punishment value in the
+        period from the leaderboard snapshot, of one group or of all groups.
+        """
+        args: list[Any] = [period.value, limit]
+        if group_id is not None:
+            args.append(group_id)
+
+        async with MaybeAcquire(conn, self.read_pool) as conn:
+            query = GET_LEADERBOARD[order, group_id is not None]
+            entries = await self._queries.fetch(conn, query, *args)
+            refreshed_at = await conn.fetchval(GET_LEADERBOARD_REFRESHED_AT)
+
+        return Leaderboard(
+            period=period,
+            order=order,
+            refreshed_at=refreshed_at,
+            entries=[LeaderboardEntry(**dict(x)) for x in entries],
+        )
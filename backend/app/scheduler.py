@@ -0,0 +1,210 @@
+"""Runs OW group syncs in the background."""
+
+import asyncio
+import itertools
+import logging
+from typing import TYPE_CHECKING, Any
+
+from .config import settings
+from .exceptions import NotFound
+from .types import OWUserId
+
+if TYPE_CHECKING:
+    from .sync import OWSync
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0  # A user is waiting for the sync to finish
+BACKGROUND = 1
+
+
+class SyncJob:
+    def __init__(
+        self,
+        ow_user_id: OWUserId,
+        group_data: dict[str, Any],
+        priority: int,
+        force: bool,
+    ) -> None:
+        self.ow_user_id = ow_user_id
+        self.group_data = group_data
+        self.priority = priority
+        self.force = force
+        self.attempts = 0
+        self.waiters: list[asyncio.Future[None]] = []
+
+    @property
+    def ow_group_id(self) -> int:
+        return int(self.group_data["id"])
+
+    def merge(self, other: "SyncJob", *, newer: bool = True) -> None:
+        """Merges a job for the same group into this one, keeping the most
+        urgent priority, and the data of `other` if it is `newer`.
+        """
+        if newer:
+            self.ow_user_id = other.ow_user_id
+            self.group_data = other.group_data
+        self.priority = min(self.priority, other.priority)
+        self.force = self.force or other.force
+        self.waiters.extend(other.waiters)
+
+    def resolve(self, exc: BaseException | None = None) -> None:
+        for waiter in self.waiters:
+            if waiter.done():
+                continue
+            if exc is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(exc)
+
+
+class SyncScheduler:  # pylint: disable=too-many-instance-attributes
+    """A work queue of group syncs, keyed by OW group.
+
+    Jobs for a group that is already queued are merged into the queued job.
+    A bounded number of workers run the jobs, interactive jobs first, and
+    failed jobs are retried with exponential backoff, unless they failed
+    with NotFound. `stop()` lets queued jobs finish before the workers are
+    cancelled.
+    """
+
+    def __init__(
+        self,
+        ow_sync: "OWSync",
+        *,
+        workers: int = settings.sync_workers,
+        max_retries: int = settings.sync_max_retries,
+        retry_delay: float = settings.sync_retry_delay,
+    ) -> None:
+        self.ow_sync = ow_sync
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self._queue: asyncio.PriorityQueue[
+            tuple[int, int, int]
+        ] = asyncio.PriorityQueue()
+        self._counter = itertools.count()
+        self._pending: dict[int, SyncJob] = {}
+        self._retrying: dict[SyncJob, asyncio.TimerHandle] = {}
+        self._tasks: list[asyncio.Task[None]] = []
+        self._closing = False
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = settings.sync_drain_timeout) -> None:
+        self._closing = True
+
+        for job, handle in self._retrying.items():
+            handle.cancel()
+            job.resolve(RuntimeError("Sync scheduler stopped"))
+        self._retrying.clear()
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Sync queue not drained after %ss, cancelling.", timeout)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        for job in self._pending.values():
+            job.resolve(RuntimeError("Sync scheduler stopped"))
+        self._pending.clear()
+
+    def enqueue(
+        self,
+        ow_user_id: OWUserId,
+        group_data: dict[str, Any],
+        *,
+        priority: int = BACKGROUND,
+        force: bool = False,
+    ) -> "asyncio.Future[None]":
+        """Schedules a sync of the group. The returned future is resolved
+        when the sync finishes or has failed all its retries.
+        """
+        if self._closing:
+            raise RuntimeError("Sync scheduler is stopped")
+
+        job = SyncJob(ow_user_id, group_data, priority, force)
+        waiter = asyncio.get_running_loop().create_future()
+        job.waiters.append(waiter)
+        self._submit(job)
+        return waiter
+
+    def _submit(self, job: SyncJob, *, retry: bool = False) -> None:
+        pending = self._pending.get(job.ow_group_id)
+        if pending is not None:
+            # A retried job is older than any job queued since it failed
+            previous_priority = pending.priority
+            pending.merge(job, newer=not retry)
+            if pending.priority == previous_priority:
+                return
+            job = pending
+        else:
+            self._pending[job.ow_group_id] = job
+
+        # An upgraded job gets a second queue entry. Whichever entry is
+        # popped first runs the job, the other one is skipped.
+        self._queue.put_nowait((job.priority, next(self._counter), job.ow_group_id))
+
+    def _retry(self, job: SyncJob) -> None:
+        del self._retrying[job]
+        self._submit(job, retry=True)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, ow_group_id = await self._queue.get()
+            try:
+                job = self._pending.pop(ow_group_id, None)
+                if job is not None:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: SyncJob) -> None:
+        try:
+            await self.ow_sync.sync_group_for_user(
+                job.ow_user_id,
+                job.group_data,
+                force=job.force,
+            )
+        except asyncio.CancelledError:
+            # The job is no longer pending, so stop() cannot resolve it
+            job.resolve(RuntimeError("Sync scheduler stopped"))
+            raise
+        except NotFound as exc:
+            # Retrying does not help if the user is not in the group
+            logger.warning(
+                "Sync of OW group %d skipped, user %d is not a member.",
+                job.ow_group_id,
+                job.ow_user_id,
+            )
+            job.resolve(exc)
+        except Exception as exc:  # pylint: disable=broad-except
+            job.attempts += 1
+            if job.attempts > self.max_retries or self._closing:
+                logger.exception("Sync of OW group %d failed.", job.ow_group_id)
+                job.resolve(exc)
+                return
+
+            delay = self.retry_delay * 2 ** (job.attempts - 1)
+            logger.warning(
+                "Sync of OW group %d failed, retrying in %.1fs.",
+                job.ow_group_id,
+                delay,
+            )
+            self._retrying[job] = asyncio.get_running_loop().call_later(
+                delay, self._retry, job
+            )
+        else:
+            job.resolve()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "queued": len(self._pending),
+            "retrying": len(self._retrying),
+            "workers": self.workers,
+        }
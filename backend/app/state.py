@@ -1,24 +1,105 @@
 """Handles state and cache related operations."""
 
-from .types import OWUserId
+from typing import Any, Iterable
+
+from .config import settings
+from .models.group_stats import GroupStats, StatsBucket
+from .models.principal import Principal
+from .types import GroupId, OWUserId, UserId
+from .utils.cache import TTLCache
+from .utils.response_cache import ResponseCache
+
+OW_GROUP_USERS_CACHE_SIZE = 1024
+GROUP_STATS_CACHE_SIZE = 1024
 
 
 class State:
     def __init__(self) -> None:
-        self.access_tokens_to_ow_user_ids: dict[str, OWUserId] = {}
+        self.access_tokens_to_ow_user_ids: TTLCache[str, OWUserId] = TTLCache(
+            maxsize=settings.access_token_cache_size,
+            ttl=settings.access_token_cache_ttl,
+            on_evict=self._on_access_token_evicted,
+        )
+        # Kept in sync with the cache above through the eviction callback, so
+        # it is bounded by the same max size.
         self.ow_user_ids_to_access_tokens: dict[OWUserId, str] = {}
 
+        self.principals: TTLCache[OWUserId, Principal] = TTLCache(
+            maxsize=settings.access_token_cache_size,
+            ttl=settings.principal_cache_ttl,
+            on_evict=self._on_principal_evicted,
+        )
+        self.user_ids_to_ow_user_ids: dict[UserId, OWUserId] = {}
+
+        # Raw OW group user responses, keyed by OW group id.
+        self.ow_group_users: TTLCache[int, Any] = TTLCache(
+            maxsize=OW_GROUP_USERS_CACHE_SIZE,
+            ttl=settings.ow_group_users_cache_ttl,
+        )
+
+        # Group statistics, keyed by group id, bucket and the version of the
+        # group they were computed at. Entries of older versions are never
+        # hit again and age out.
+        self.group_stats: TTLCache[
+            tuple[GroupId, StatsBucket, int], GroupStats
+        ] = TTLCache(
+            maxsize=GROUP_STATS_CACHE_SIZE,
+            ttl=settings.group_stats_cache_ttl,
+        )
+
+        # Encoded group and group users responses, keyed like the
+        # statistics above.
+        self.group_responses = ResponseCache(settings.group_response_cache_size)
+
+    def _on_access_token_evicted(self, access_token: str, user_id: OWUserId) -> None:
+        if self.ow_user_ids_to_access_tokens.get(user_id) == access_token:
+            del self.ow_user_ids_to_access_tokens[user_id]
+
+    def _on_principal_evicted(self, _user_id: OWUserId, principal: Principal) -> None:
+        self.user_ids_to_ow_user_ids.pop(principal.user_id, None)
+
     def add_access_token(self, access_token: str, user_id: OWUserId) -> None:
         to_remove = self.ow_user_ids_to_access_tokens.get(user_id)
 
-        self.access_tokens_to_ow_user_ids[access_token] = user_id
+        self.access_tokens_to_ow_user_ids.set(access_token, user_id)
         self.ow_user_ids_to_access_tokens[user_id] = access_token
 
-        if to_remove is not None:
-            del self.access_tokens_to_ow_user_ids[to_remove]
+        if to_remove is not None and to_remove != access_token:
+            self.access_tokens_to_ow_user_ids.pop(to_remove)
 
     def get_ow_user_id_by_access_token(self, access_token: str) -> OWUserId | None:
         return self.access_tokens_to_ow_user_ids.get(access_token)
 
     def get_access_token_by_ow_user_id(self, user_id: OWUserId) -> str | None:
-        return self.ow_user_ids_to_access_tokens.get(user_id)
+        access_token = self.ow_user_ids_to_access_tokens.get(user_id)
+        if (
+            access_token is None
+            or access_token not in self.access_tokens_to_ow_user_ids
+        ):
+            return None
+        return access_token
+
+    def add_principal(self, principal: Principal) -> None:
+        self.principals.set(principal.ow_user_id, principal)
+        self.user_ids_to_ow_user_ids[principal.user_id] = principal.ow_user_id
+
+    def get_principal(self, ow_user_id: OWUserId) -> Principal | None:
+        return self.principals.get(ow_user_id)
+
+    def get_group_stats(
+        self,
+        group_id: GroupId,
+        bucket: StatsBucket,
+        version: int,
+    ) -> GroupStats | None:
+        return self.group_stats.get((group_id, bucket, version))
+
+    def add_group_stats(self, version: int, stats: GroupStats) -> None:
+        self.group_stats.set((stats.group_id, stats.bucket, version), stats)
+
+    def invalidate_principals(self, user_ids: Iterable[UserId]) -> None:
+        """Drops the cached principals of users whose memberships changed."""
+        for user_id in user_ids:
+            ow_user_id = self.user_ids_to_ow_user_ids.pop(user_id, None)
+            if ow_user_id is not None:
+                self.principals.pop(ow_user_id)
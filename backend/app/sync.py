@@ -1,16 +1,25 @@
 """Contains methods for syncing users from OW."""
 
 import asyncio
+import datetime
+import hashlib
+import json
+from collections import Counter
 from typing import TYPE_CHECKING, Any, cast
 
 from asyncpg import Pool
 
+from .config import settings
 from .exceptions import DatabaseIntegrityException, NotFound
 from .models.group import GroupCreate
 from .models.group_member import GroupMemberCreate, GroupMemberUpdate
+from .models.principal import Principal
 from .models.user import UserCreate, UserUpdate
+from .scheduler import BACKGROUND, INTERACTIVE
 from .types import GroupId, OWUserId, UserId
-from .utils.db import MaybeAcquire
+from .utils.db import LimitedPool, MaybeAcquire
+from .utils.replica import pin_primary
+from .utils.singleflight import SingleFlight
 
 if TYPE_CHECKING:
     from .api import FastAPI
@@ -19,9 +28,97 @@ if TYPE_CHECKING:
 IGNORE_OW_GROUPS = (12,)  # "Komiteer"
 
 
+def hash_group_payload(
+    group_data: dict[str, Any],
+    group_users: list[dict[str, Any]],
+) -> str:
+    """Creates a stable hash of the OW data a group sync depends on."""
+    image_data = group_data["image"]
+    normalized = {
+        "id": group_data["id"],
+        "name_long": group_data["name_long"],
+        "name_short": group_data["name_short"],
+        "image": image_data["sm"] if image_data else None,
+        "members": sorted(group_data["members"]),
+        "users": sorted(
+            (
+                u["id"],
+                u["user"]["id"],
+                u["user"]["first_name"],
+                u["user"]["last_name"],
+                u["user"]["email"],
+                u["is_retired"],
+            )
+            for u in group_users
+        ),
+    }
+    encoded = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def is_group_user(group_users: list[dict[str, Any]], ow_user_id: OWUserId) -> bool:
+    return any(u["user"]["id"] == ow_user_id for u in group_users)
+
+
+async def wait_for_group_syncs(waiters: list["asyncio.Future[None]"]) -> None:
+    """Waits for the group syncs of a user, and raises the first failure.
+
+    Groups the user is not found in the OW users of are left as they are,
+    the next sync picks them up once OW agrees.
+    """
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, NotFound):
+            raise result
+
+
 class OWSync:
     def __init__(self, app: "FastAPI"):
         self.app = app
+        self._access_token_flight: SingleFlight[
+            str, tuple[UserId, OWUserId]
+        ] = SingleFlight()
+        self._group_users_flight: SingleFlight[int, Any] = SingleFlight()
+        self._group_sync_flight: SingleFlight[int, None] = SingleFlight()
+        # "applied", "unchanged" (skipped by payload hash) and "fresh" (skipped
+        # by the freshness window).
+        self.group_sync_counts: Counter[str] = Counter()
+        self._pool: LimitedPool | None = None
+
+    @property
+    def pool(self) -> LimitedPool:
+        """The database pool, limited to the connection budget of syncing.
+
+        Always leaves at least one connection of the pool to requests.
+        """
+        if self._pool is None:
+            limit = min(
+                settings.sync_max_connections,
+                settings.postgres_pool_max_size - 1,
+            )
+            self._pool = LimitedPool(self.app.db.pool, max(limit, 1))
+        return self._pool
+
+    async def _sync_new_access_token(
+        self,
+        access_token: str,
+    ) -> tuple[UserId, OWUserId]:
+        ow_profile = await self.app.http.get_ow_profile_by_access_token(access_token)
+        if ow_profile is None:
+            raise NotFound
+
+        ow_user_id = cast(OWUserId, ow_profile["id"])
+        user_id = await self.create_user_if_not_exists(
+            ow_user_id=ow_user_id,
+            first_name=ow_profile["first_name"],
+            last_name=ow_profile["last_name"],
+            email=ow_profile["email"],
+        )
+
+        # Only cache the token once the user exists, so callers hitting the
+        # cache can rely on finding the user.
+        self.app.app_state.add_access_token(access_token, ow_user_id)
+        return user_id, ow_user_id
 
     async def sync_for_access_token(
         self,
@@ -31,23 +128,17 @@ class OWSync:
     ) -> tuple[UserId, OWUserId]:
         ow_user_id = self.app.app_state.get_ow_user_id_by_access_token(access_token)
         if ow_user_id is None:
-            ow_profile = await self.app.http.get_ow_profile_by_access_token(
-                access_token
+            # Concurrent requests with the same new token share a single OW
+            # lookup and user upsert. The shared call runs in its own task, so
+            # it acquires its own connection instead of using `conn`.
+            return await self._access_token_flight.do(
+                access_token,
+                lambda: self._sync_new_access_token(access_token),
             )
-            if ow_profile is None:
-                raise NotFound
 
-            ow_user_id = cast(OWUserId, ow_profile["id"])
-            self.app.app_state.add_access_token(access_token, ow_user_id)
-
-            user_id = await self.create_user_if_not_exists(
-                ow_user_id=ow_user_id,
-                first_name=ow_profile["first_name"],
-                last_name=ow_profile["last_name"],
-                email=ow_profile["email"],
-                conn=conn,
-            )
-            return user_id, ow_user_id
+        principal = self.app.app_state.get_principal(ow_user_id)
+        if principal is not None:
+            return principal.user_id, ow_user_id
 
         user = await self.app.db.get_user(
             user_id=ow_user_id,
@@ -56,26 +147,55 @@ class OWSync:
         )
         return user.user_id, ow_user_id
 
+    async def resolve_principal(
+        self,
+        access_token: str,
+        *,
+        conn: Pool | None = None,
+    ) -> Principal:
+        """Resolves the user and group memberships behind an access token.
+
+        The result is cached until it expires or the user's memberships are
+        changed by a sync, so authenticated requests can skip the user and
+        membership lookups entirely.
+        """
+        ow_user_id = self.app.app_state.get_ow_user_id_by_access_token(access_token)
+        if ow_user_id is None:
+            _, ow_user_id = await self.sync_for_access_token(access_token, conn=conn)
+
+        principal = self.app.app_state.get_principal(ow_user_id)
+        if principal is None:
+            principal = await self.app.db.get_principal(ow_user_id, conn=conn)
+            self.app.app_state.add_principal(principal)
+
+        return principal
+
     async def sync_for_user(
         self,
         ow_user_id: OWUserId,
         user_id: UserId,
         wait_for_updates: bool = True,
+        force: bool = False,
     ) -> None:
         groups_data = await self.app.http.get_ow_groups_by_user_id(ow_user_id)
         filtered_groups_data = [
             g for g in groups_data["results"] if g["id"] not in IGNORE_OW_GROUPS
         ]
 
-        tasks = [
-            asyncio.create_task(self.sync_group_for_user(ow_user_id, g))
-            for g in filtered_groups_data
-        ]
+        # Groups that were synced recently are skipped, as long as the user is
+        # already a member of them. Otherwise a user that was just added to a
+        # group in OW would have to wait for the window to pass.
+        fresh_ow_group_ids: set[int] = set()
+        if not force and settings.group_sync_freshness > 0:
+            fresh_ow_group_ids = await self.app.db.get_fresh_ow_group_ids(
+                user_id,
+                [g["id"] for g in filtered_groups_data],
+                datetime.timedelta(seconds=settings.group_sync_freshness),
+            )
+            self.group_sync_counts["fresh"] += len(fresh_ow_group_ids)
 
-        if wait_for_updates:
-            await asyncio.gather(*tasks)
-        else:
-            # Only wait for the tasks if the user needs to me added or removed from
+        if not wait_for_updates:
+            # Only wait for the syncs if the user needs to me added or removed from
             # one or more groups.
             db_groups_res = await self.app.db.get_user_groups(user_id)
             db_groups = {g["ow_group_id"]: g for g in db_groups_res if g is not None}
@@ -85,9 +205,29 @@ class OWSync:
                 if group["id"] in db_groups:
                     sum_ow_groups += 1
 
-            # Only wait for the tasks if we need to add or remove the user from one or more groups
-            if sum_ow_groups != len(filtered_groups_data):
-                await asyncio.gather(*tasks)
+            wait_for_updates = sum_ow_groups != len(filtered_groups_data)
+
+        scheduler = self.app.sync_scheduler
+        waiters = [
+            scheduler.enqueue(
+                ow_user_id,
+                g,
+                priority=INTERACTIVE if wait_for_updates else BACKGROUND,
+                force=force,
+            )
+            for g in filtered_groups_data
+            if g["id"] not in fresh_ow_group_ids
+        ]
+
+        if wait_for_updates:
+            await wait_for_group_syncs(waiters)
+            # Written by the scheduler's tasks, the reads that follow in this
+            # request should see it
+            pin_primary()
+        else:
+            # Failures are logged by the scheduler
+            for waiter in waiters:
+                waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
 
     async def create_user_if_not_exists(
         self,
@@ -98,7 +238,7 @@ class OWSync:
         *,
         conn: Pool | None = None,
     ) -> UserId:
-        async with MaybeAcquire(conn, self.app.db.pool) as conn:
+        async with MaybeAcquire(conn, self.pool) as conn:
             user_create = UserCreate(
                 ow_user_id=ow_user_id,
                 first_name=first_name,
@@ -135,6 +275,8 @@ class OWSync:
             )
         except DatabaseIntegrityException:
             pass
+        else:
+            self.app.app_state.invalidate_principals([user_id])
 
     async def add_users_to_group(
         self,
@@ -167,6 +309,9 @@ class OWSync:
             )
 
         await self.app.db.insert_users_in_group(group_member_creates, conn=conn)
+        self.app.app_state.invalidate_principals(
+            [m.user_id for m in group_member_creates]
+        )
 
     async def handle_group_update(
         self,
@@ -175,16 +320,20 @@ class OWSync:
         member_ids: list[int],
         conn: Pool | None = None,
     ) -> None:
-        group_members = await self.app.db.get_group_members_raw(group_id)
-        ids = [m["ow_group_user_id"] for m in group_members]
-
-        to_add = [u for u in group_users if u["id"] not in ids]
-        to_remove = [
-            m["user_id"]
-            for m in group_members
-            if m["ow_group_user_id"] not in member_ids
-        ]
-        async with MaybeAcquire(conn, self.app.db.pool) as conn:
+        async with MaybeAcquire(conn, self.pool) as conn:
+            group_members = await self.app.db.get_group_members_raw(
+                group_id,
+                conn=conn,
+            )
+            ids = [m["ow_group_user_id"] for m in group_members]
+
+            to_add = [u for u in group_users if u["id"] not in ids]
+            to_remove = [
+                m["user_id"]
+                for m in group_members
+                if m["ow_group_user_id"] not in member_ids
+            ]
+
             if to_add:
                 await self.add_users_to_group(
                     group_id,
@@ -193,19 +342,63 @@ class OWSync:
                 )
 
             if to_remove:
-                await self.app.db.delete_users_from_group(
+                removed = await self.app.db.delete_users_from_group(
                     group_id,
                     to_remove,
                     conn=conn,
                 )
+                self.app.app_state.invalidate_principals(removed)
+
+    async def _fetch_ow_group_users(self, group_id: int) -> Any:
+        group_users = await self.app.http.get_ow_group_users(group_id)
+        self.app.app_state.ow_group_users.set(group_id, group_users)
+        return group_users
+
+    async def get_ow_group_users(self, group_id: int, *, force: bool = False) -> Any:
+        """Gets the users of an OW group.
+
+        Concurrent syncs of the same group share a single fetch, and unless
+        `force` is set the result is reused for a short while after it returns.
+        """
+        group_users = None
+        if not force:
+            group_users = self.app.app_state.ow_group_users.get(group_id)
+
+        if group_users is None:
+            group_users = await self._group_users_flight.do(
+                group_id,
+                lambda: self._fetch_ow_group_users(group_id),
+            )
+        return group_users
 
     async def sync_group_for_user(
         self,
         ow_user_id: OWUserId,
         group_data: dict[str, Any],
+        *,
+        force: bool = False,
     ) -> None:
-        group_users = await self.app.http.get_ow_group_users(group_data["id"])
+        group_users = await self.get_ow_group_users(group_data["id"], force=force)
+        if not force and not is_group_user(group_users, ow_user_id):
+            # The cached users may predate the user joining the group
+            group_users = await self.get_ow_group_users(group_data["id"], force=True)
+
+        if not is_group_user(group_users, ow_user_id):
+            raise NotFound
+
+        # The reconciliation only depends on the group, so concurrent syncs
+        # for different members of the same group share one.
+        await self._group_sync_flight.do(
+            group_data["id"],
+            lambda: self.sync_group(group_data, group_users),
+        )
 
+    async def sync_group(
+        self,
+        group_data: dict[str, Any],
+        group_users: list[dict[str, Any]],
+    ) -> None:
+        payload_hash = hash_group_payload(group_data, group_users)
         image_data = group_data["image"]
         group_create = GroupCreate(
             ow_group_id=group_data["id"],
@@ -217,15 +410,17 @@ class OWSync:
             else "NoImage",  # TODO?: Maybe change to something default??
         )
 
-        ow_group_user_id = None
-        for group_user in group_users:
-            if group_user["user"]["id"] == ow_user_id:
-                ow_group_user_id = group_user["id"]
-                break
-
-        assert ow_group_user_id is not None
+        # Everything below must use this connection. Acquiring a second one
+        # while holding it can deadlock the pool under load.
+        async with MaybeAcquire(None, self.pool) as conn:
+            if await self.app.db.touch_group_sync_if_unchanged(
+                group_data["id"],
+                payload_hash,
+                conn=conn,
+            ):
+                self.group_sync_counts["unchanged"] += 1
+                return
 
-        async with self.app.db.pool.acquire() as conn:
             group_res = await self.app.db.insert_or_update_group(
                 group_create,
                 conn=conn,
@@ -236,7 +431,7 @@ class OWSync:
             if action == "CREATE":
                 await self.add_users_to_group(
                     group_id,
-                    [u for u in group_users if u["user"]["id"] != ow_group_user_id],
+                    group_users,
                     conn=conn,
                 )
 
@@ -254,13 +449,17 @@ class OWSync:
                     conn=conn,
                 )
 
+            await self.app.db.set_group_synced(group_id, payload_hash, conn=conn)
+
+        self.group_sync_counts["applied"] += 1
+
     async def update_user(
         self,
         user_id: UserId,
         user_data: dict[str, Any],
         conn: Pool | None = None,
     ) -> None:
-        async with MaybeAcquire(conn, self.app.db.pool) as conn:
+        async with MaybeAcquire(conn, self.pool) as conn:
             user_update = UserUpdate(
                 user_id=user_id,
                 ow_user_id=user_data["user"]["id"],
@@ -280,7 +479,7 @@ class OWSync:
         group_users: list[dict[str, Any]],
         conn: Pool | None = None,
     ) -> None:
-        async with MaybeAcquire(conn, self.app.db.pool) as conn:
+        async with MaybeAcquire(conn, self.pool) as conn:
             db_group_users = await self.app.db.get_raw_group_users(
                 group_id=group_id,
                 conn=conn,
@@ -0,0 +1,176 @@
+"""In-process caches."""
+
+from collections import OrderedDict
+from time import monotonic
+from typing import Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class CacheCounters:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+class TTLCache(Generic[K, V]):
+    """A bounded mapping where every entry expires after `ttl` seconds.
+
+    When the cache is full the least recently used entry is evicted. Expired
+    entries are dropped lazily, either when they are looked up or when they
+    reach the LRU end, so memory never grows beyond `maxsize` entries.
+
+    `on_evict` is called for every entry that leaves the cache, whether it
+    is evicted, expires, or is removed with `pop` or `clear`.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        *,
+        on_evict: Callable[[K, V], None] | None = None,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self.counters = CacheCounters()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[0] > monotonic()
+
+    def _discard(self, key: K, value: V) -> None:
+        del self._data[key]
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def get(self, key: K) -> V | None:
+        item = self._data.get(key)
+        if item is None:
+            self.counters.misses += 1
+            return None
+
+        expires_at, value = item
+        if expires_at <= monotonic():
+            self._discard(key, value)
+            self.counters.expirations += 1
+            self.counters.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.counters.hits += 1
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        if key in self._data:
+            self._data.move_to_end(key)
+        self._data[key] = (monotonic() + self.ttl, value)
+
+        while len(self._data) > self.maxsize:
+            old_key, (expires_at, old_value) = next(iter(self._data.items()))
+            self._discard(old_key, old_value)
+            if expires_at <= monotonic():
+                self.counters.expirations += 1
+            else:
+                self.counters.evictions += 1
+
+    def pop(self, key: K) -> V | None:
+        """Removes an entry without counting it as an eviction."""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        self._discard(key, item[1])
+        return item[1]
+
+    def clear(self) -> None:
+        while self._data:
+            key, (_, value) = next(iter(self._data.items()))
+            self._discard(key, value)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.counters.hits,
+            "misses": self.counters.misses,
+            "evictions": self.counters.evictions,
+            "expirations": self.counters.expirations,
+        }
+
+
+class SizedLRUCache(Generic[K, V]):
+    """A mapping bounded by the total size of its values, as measured by
+    `sizeof`, rather than by their number.
+
+    When the values exceed `maxbytes` the least recently used entries are
+    evicted. A value larger than `maxbytes` on its own is not stored.
+    """
+
+    def __init__(self, maxbytes: int, sizeof: Callable[[V], int]) -> None:
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self._data: OrderedDict[K, tuple[int, V]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: K, value: V) -> None:
+        self.pop(key)
+
+        size = self.sizeof(value)
+        if size > self.maxbytes:
+            return
+
+        self._data[key] = (size, value)
+        self.nbytes += size
+        while self.nbytes > self.maxbytes:
+            _, (old_size, _) = self._data.popitem(last=False)
+            self.nbytes -= old_size
+            self.evictions += 1
+
+    def pop(self, key: K) -> V | None:
+        """Removes an entry without counting it as an eviction."""
+        cached = self._data.pop(key, None)
+        if cached is None:
+            return None
+        self.nbytes -= cached[0]
+        return cached[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.nbytes = 0
+
+    def stats(self) -> dict[str, int | float | None]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "bytes": self.nbytes,
+            "maxbytes": self.maxbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+        }
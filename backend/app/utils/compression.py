@@ -0,0 +1,59 @@
+"""Compression of responses that are not compressed already."""
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware as OriginalGZipMiddleware
+from starlette.middleware.gzip import GZipResponder as OriginalGZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+from .etag import gzip_etag
+
+# Responses without a body, which must not get a gzipped empty body either
+BODILESS_STATUSES = (204, 304)
+
+
+class GZipResponder(OriginalGZipResponder):
+    passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        async def send_with_etag(message: Message) -> None:
+            # The response start is only sent once the responder has decided
+            # whether to compress the body
+            if message["type"] == "http.response.start" and not self.passthrough:
+                headers = MutableHeaders(raw=message["headers"])
+                if headers.get("Content-Encoding") == "gzip" and "ETag" in headers:
+                    headers["ETag"] = gzip_etag(headers["ETag"])
+            await send(message)
+
+        await super().__call__(scope, receive, send_with_etag)
+
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.passthrough = message[
+                "status"
+            ] in BODILESS_STATUSES or "content-encoding" in Headers(
+                raw=message["headers"]
+            )
+
+        if self.passthrough:
+            await self.send(message)
+        else:
+            await super().send_with_gzip(message)
+
+
+class GZipMiddleware(OriginalGZipMiddleware):
+    """Compresses responses like starlette's GZipMiddleware, but passes
+    responses that already have a Content-Encoding, such as cached gzip
+    bodies, and responses without a body through as they are. The ETag of a compressed response gets a
+    `-gzip` suffix, so it differs from the ETag of the identity body.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            headers = Headers(scope=scope)
+            if "gzip" in headers.get("Accept-Encoding", ""):
+                responder = GZipResponder(
+                    self.app, self.minimum_size, compresslevel=self.compresslevel
+                )
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
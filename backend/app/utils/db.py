@@ -1,6 +1,69 @@
-from typing import Any
+import asyncio
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Generator
 
-from asyncpg.pool import Pool, PoolAcquireContext
+from asyncpg.pool import Pool, PoolAcquireContext, PoolConnectionProxy
+
+if TYPE_CHECKING:
+    from .pool_monitor import MonitoredPool
+    from .pool_tracer import TracedPool
+
+
+class AcquireContext:
+    """Supports both `await pool.acquire()` and `async with pool.acquire()`,
+    like the context returned by asyncpg, for pools wrapping one.
+    """
+
+    def __init__(
+        self,
+        acquire: Callable[[], Awaitable[PoolConnectionProxy]],
+        release: Callable[[PoolConnectionProxy], Awaitable[None]],
+    ) -> None:
+        self.acquire = acquire
+        self.release = release
+        self.connection: PoolConnectionProxy | None = None
+
+    def __await__(self) -> Generator[Any, None, PoolConnectionProxy]:
+        return self.acquire().__await__()
+
+    async def __aenter__(self) -> PoolConnectionProxy:
+        self.connection = await self.acquire()
+        return self.connection
+
+    async def __aexit__(self, *args: Any) -> None:
+        assert self.connection is not None
+        connection, self.connection = self.connection, None
+        await self.release(connection)
+
+
+class LimitedPool:
+    """Limits how many connections of a pool a subsystem may hold at once.
+
+    Waiting for the limit happens before waiting for the pool, so a burst of
+    work behind the limit leaves the rest of the pool to other users.
+    """
+
+    def __init__(self, pool: Pool, limit: int) -> None:
+        self.pool = pool
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @property
+    def in_use(self) -> int:
+        return self.limit - self._semaphore._value  # pylint: disable=protected-access
+
+    async def acquire(self) -> PoolConnectionProxy:
+        await self._semaphore.acquire()
+        try:
+            return await self.pool.acquire()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def release(self, connection: PoolConnectionProxy) -> None:
+        try:
+            await self.pool.release(connection)
+        finally:
+            self._semaphore.release()
 
 
 class MaybeAcquire:
@@ -9,7 +72,11 @@ class MaybeAcquire:
     a new connection multiple times during a single function.
     """
 
-    def __init__(self, connection: PoolAcquireContext | None, pool: Pool) -> None:
+    def __init__(
+        self,
+        connection: PoolAcquireContext | None,
+        pool: "Pool | LimitedPool | MonitoredPool | TracedPool",
+    ) -> None:
         self.connection = connection
         self.pool = pool
         self._cleanup = False
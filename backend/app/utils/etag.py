@@ -0,0 +1,52 @@
+"""ETags derived from version stamps, and conditional requests."""
+
+import hashlib
+from typing import Any
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+def make_etag(request: Request, *stamps: Any) -> str:
+    """A strong ETag of the request's path and query, and the version stamps
+    of the data its response is built from.
+    """
+    key = repr((request.url.path, request.url.query, stamps)).encode()
+    return f'"{hashlib.blake2b(key, digest_size=16).hexdigest()}"'
+
+
+def gzip_etag(etag: str) -> str:
+    """The ETag of the gzipped variant of the representation with `etag`.
+    Strong ETags must differ between content codings.
+    """
+    return f'{etag[:-1]}-gzip"'
+
+
+def match_etag(request: Request, etag: str) -> str | None:
+    """The ETag in the If-None-Match header of the request that matches
+    `etag`, or its gzip variant if the client accepts gzip, if any. The
+    comparison is weak, as required for If-None-Match.
+
+    `*` matches any current representation, so callers must only check it
+    once they know the resource exists.
+    """
+    if_none_match: str | None = request.headers.get("If-None-Match")
+    if if_none_match is None:
+        return None
+
+    candidates = {etag}
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        candidates.add(gzip_etag(etag))
+
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return etag
+        tag = tag.removeprefix("W/")
+        if tag in candidates:
+            return tag
+    return None
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
@@ -0,0 +1,22 @@
+"""Opaque cursors for keyset pagination."""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from ..exceptions import InvalidCursor
+from ..types import PunishmentId
+
+
+def encode_cursor(created_time: datetime, punishment_id: PunishmentId) -> str:
+    data = json.dumps([created_time.isoformat(), punishment_id])
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, PunishmentId]:
+    try:
+        created_time, punishment_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(created_time), PunishmentId(int(punishment_id))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise InvalidCursor from exc
@@ -0,0 +1,160 @@
+"""Pool statistics and adaptive sizing.
+
+Every checkout goes through MonitoredPool, which counts the connections in
+use, the tasks waiting for one and how long they waited.
+"""
+
+import asyncio
+import logging
+from time import monotonic
+from typing import Any
+
+from asyncpg.pool import Pool, PoolConnectionProxy
+
+from .db import AcquireContext
+from .pool_tracer import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimit:
+    """A connection limit between `min_limit` and `max_limit`.
+
+    It is raised by one when an acquire waits longer than `grow_threshold`
+    seconds, at most once per `grow_threshold`. It is lowered by one once per
+    `shrink_after` seconds without such waits.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        max_limit: int | None,
+        grow_threshold: float,
+        shrink_after: float,
+    ) -> None:
+        self.min_limit = self.limit = limit
+        self.max_limit = max(max_limit or limit, limit)
+        self.grow_threshold = grow_threshold
+        self.shrink_after = shrink_after
+        self._resized_at = self._slow_acquire_at = monotonic()
+
+    @property
+    def adaptive(self) -> bool:
+        return self.max_limit > self.min_limit
+
+    def grow(self, waited: float, now: float) -> bool:
+        """Called after an acquire that waited `waited` seconds. Returns
+        whether the limit was raised.
+        """
+        if waited <= self.grow_threshold:
+            return False
+
+        self._slow_acquire_at = now
+        if (
+            self.limit < self.max_limit
+            and now - self._resized_at >= self.grow_threshold
+        ):
+            self._resize(1, now)
+            return True
+        return False
+
+    def shrink(self, now: float) -> bool:
+        """Called after a release. Returns whether the limit was lowered."""
+        if (
+            self.limit > self.min_limit
+            and now - self._slow_acquire_at >= self.shrink_after
+            and now - self._resized_at >= self.shrink_after
+        ):
+            self._resize(-1, now)
+            return True
+        return False
+
+    def _resize(self, step: int, now: float) -> None:
+        self.limit += step
+        self._resized_at = now
+        logger.info("Pool limit changed to %d connections", self.limit)
+
+
+class PoolCounters:
+    def __init__(self) -> None:
+        self.in_use = 0
+        self.waiters = 0
+        self.wait_times = Histogram()
+        self.grows = 0
+        self.shrinks = 0
+
+
+class MonitoredPool:
+    """Wraps a pool, limiting checkouts to `limit` connections.
+
+    With a `max_limit` above `limit`, the limit is adaptive, as described in
+    AdaptiveLimit. The wrapped pool must allow `max_limit` connections, and
+    it closes the idle ones after its max_inactive_connection_lifetime.
+    Anything not monitored is passed through to the wrapped pool.
+    """
+
+    def __init__(
+        self,
+        pool: Pool,
+        *,
+        limit: int,
+        max_limit: int | None = None,
+        grow_threshold: float = 0.05,
+        shrink_after: float = 60,
+    ) -> None:
+        self.pool = pool
+        self.sizing = AdaptiveLimit(limit, max_limit, grow_threshold, shrink_after)
+        self.counters = PoolCounters()
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.pool, name)
+
+    def acquire(self, *, timeout: float | None = None) -> AcquireContext:
+        return AcquireContext(lambda: self._acquire(timeout), self.release)
+
+    async def _acquire(self, timeout: float | None) -> PoolConnectionProxy:
+        started = monotonic()
+        self.counters.waiters += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+            try:
+                connection = await self.pool.acquire(timeout=timeout)
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self.counters.waiters -= 1
+
+        acquired_at = monotonic()
+        self.counters.wait_times.observe((acquired_at - started) * 1000)
+        self.counters.in_use += 1
+
+        if self.sizing.grow(acquired_at - started, acquired_at):
+            self.counters.grows += 1
+            self._semaphore.release()
+
+        return connection
+
+    async def release(self, connection: PoolConnectionProxy) -> None:
+        try:
+            await self.pool.release(connection)
+        finally:
+            self.counters.in_use -= 1
+
+            if self.sizing.shrink(monotonic()):
+                # Keeping the released slot lowers the limit
+                self.counters.shrinks += 1
+            else:
+                self._semaphore.release()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_use": self.counters.in_use,
+            "waiters": self.counters.waiters,
+            "limit": self.sizing.limit,
+            "max_limit": self.sizing.max_limit,
+            "grows": self.counters.grows,
+            "shrinks": self.counters.shrinks,
+            "acquire_ms": self.counters.wait_times.stats(),
+        }
@@ -0,0 +1,194 @@
+"""Opt-in instrumentation of pool checkouts.
+
+Enabled with POOL_TRACE=1. Every checkout is attributed to the task and the
+call site acquiring it, so a task acquiring a second connection while it
+already holds one, or holding a connection for too long, can be reported.
+"""
+
+import asyncio
+import bisect
+import logging
+import sys
+import weakref
+from pathlib import Path
+from time import monotonic
+from typing import Any, NamedTuple
+
+from asyncpg.pool import Pool, PoolConnectionProxy
+
+from ..exceptions import PoolTraceViolation
+from .db import AcquireContext
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in milliseconds
+HISTOGRAM_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+# Frames from these files are skipped when looking for the call site
+_SKIPPED_FILES = (
+    str(Path(__file__).resolve()),
+    str(Path(__file__).resolve().with_name("db.py")),
+)
+
+
+def _call_site() -> str:
+    frame = sys._getframe(1)  # pylint: disable=protected-access
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not (
+            filename in _SKIPPED_FILES
+            or "asyncpg" in filename
+            or filename.endswith("contextlib.py")
+        ):
+            return f"{filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back  # type: ignore[assignment]
+    return "<unknown>"
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[int, ...] = HISTOGRAM_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, milliseconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, milliseconds)] += 1
+        self.total += milliseconds
+
+    def stats(self) -> dict[str, Any]:
+        labels = [f"le_{bucket}" for bucket in self.buckets] + ["inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": sum(self.counts),
+            "total_ms": round(self.total, 3),
+        }
+
+
+class Checkout(NamedTuple):
+    connection: PoolConnectionProxy
+    call_site: str
+    acquired_at: float
+
+
+class TraceCounters:
+    def __init__(self) -> None:
+        self.wait_times = Histogram()
+        self.hold_times = Histogram()
+        self.acquires = 0
+        self.nested_acquires = 0
+        self.long_holds = 0
+
+
+class TracedPool:
+    """Wraps a pool, recording checkout depth, hold time and the call site
+    of every checkout per task.
+
+    Nested checkouts and holds longer than `hold_threshold` seconds are
+    logged, or raised as PoolTraceViolation when `raise_on_violation` is set.
+    Anything not traced is passed through to the wrapped pool.
+    """
+
+    def __init__(
+        self,
+        pool: Pool,
+        *,
+        hold_threshold: float,
+        raise_on_violation: bool = False,
+    ) -> None:
+        self.pool = pool
+        self.hold_threshold = hold_threshold
+        self.raise_on_violation = raise_on_violation
+
+        self._checkouts: weakref.WeakKeyDictionary[
+            asyncio.Task[Any], list[Checkout]
+        ] = weakref.WeakKeyDictionary()
+        self.counters = TraceCounters()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.pool, name)
+
+    def _violation(self, message: str) -> None:
+        if self.raise_on_violation:
+            raise PoolTraceViolation(message)
+        logger.warning(message)
+
+    def acquire(self, *, timeout: float | None = None) -> AcquireContext:
+        call_site = _call_site()
+        return AcquireContext(lambda: self._acquire(call_site, timeout), self.release)
+
+    async def _acquire(
+        self,
+        call_site: str,
+        timeout: float | None,
+    ) -> PoolConnectionProxy:
+        task = asyncio.current_task()
+        held = self._checkouts.get(task, []) if task is not None else []
+        if held:
+            self.counters.nested_acquires += 1
+            self._violation(
+                f"Nested pool acquire at {call_site} while holding "
+                f"{len(held)} connection(s), first acquired at {held[0].call_site}"
+            )
+
+        started = monotonic()
+        connection = await self.pool.acquire(timeout=timeout)
+        acquired_at = monotonic()
+        self.counters.wait_times.observe((acquired_at - started) * 1000)
+        self.counters.acquires += 1
+
+        if task is not None:
+            self._checkouts.setdefault(task, []).append(
+                Checkout(connection, call_site, acquired_at)
+            )
+        return connection
+
+    async def release(self, connection: PoolConnectionProxy) -> None:
+        checkout = None
+        task = asyncio.current_task()
+        held = self._checkouts.get(task, []) if task is not None else []
+        for i, c in enumerate(held):
+            if c.connection is connection:
+                checkout = held.pop(i)
+                break
+        if not held and task is not None:
+            self._checkouts.pop(task, None)
+
+        await self.pool.release(connection)
+
+        if checkout is None:
+            return
+
+        hold_time = monotonic() - checkout.acquired_at
+        self.counters.hold_times.observe(hold_time * 1000)
+        if hold_time > self.hold_threshold:
+            self.counters.long_holds += 1
+            self._violation(
+                f"Pool connection acquired at {checkout.call_site} "
+                f"was held for {hold_time:.3f}s"
+            )
+
+    async def execute(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        async with self.acquire() as conn:
+            return await conn.execute(query, *args, **kwargs)
+
+    async def fetch(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        async with self.acquire() as conn:
+            return await conn.fetch(query, *args, **kwargs)
+
+    async def fetchrow(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        async with self.acquire() as conn:
+            return await conn.fetchrow(query, *args, **kwargs)
+
+    async def fetchval(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, *args, **kwargs)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "acquires": self.counters.acquires,
+            "nested_acquires": self.counters.nested_acquires,
+            "long_holds": self.counters.long_holds,
+            "held": sum(len(held) for held in self._checkouts.values()),
+            "wait_ms": self.counters.wait_times.stats(),
+            "hold_ms": self.counters.hold_times.stats(),
+        }
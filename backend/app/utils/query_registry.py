@@ -0,0 +1,122 @@
+"""A registry of the hot queries, prepared on every pool connection.
+
+The statements are prepared when the pool opens a connection, through its
+`init` hook, so the first request served by a new connection does not pay
+for parsing and planning them. Every Database runs them through a
+QueryRunner of its own, which records calls and latency per statement.
+
+They are prepared into the statement cache asyncpg keeps for every
+connection, which is what `conn.fetch()` and friends look queries up in.
+Statements prepared with `conn.prepare()` are not cached, and stop working
+once the connection is released back to the pool. `conn.executemany()` with
+no arguments looks the statement up in the cache, preparing it if needed,
+and then has nothing to run.
+"""
+
+import asyncio
+import logging
+from time import monotonic
+from typing import Any, NamedTuple
+
+from asyncpg import Pool
+from asyncpg.exceptions import PostgresError
+
+from .pool_tracer import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class Query(NamedTuple):
+    name: str
+    sql: str
+
+
+class QueryRegistry:
+    def __init__(self) -> None:
+        self.queries: dict[str, Query] = {}
+
+    def register(self, name: str, sql: str) -> Query:
+        if name in self.queries:
+            raise ValueError(f"A query named {name} is already registered")
+
+        query = self.queries[name] = Query(name, sql)
+        return query
+
+
+class QueryRunner:
+    """Runs the queries of a registry and prepares them on pool connections,
+    recording the calls and latency of every statement.
+    """
+
+    def __init__(self, registry: QueryRegistry) -> None:
+        self.registry = registry
+        self.warmed = 0  # Statements prepared by prepare_all, or already cached
+        self.latency: dict[str, Histogram] = {}
+
+    async def fetch(self, conn: Any, query: Query, *args: Any) -> list[Any]:
+        return await self._run(conn, query, "fetch", args)  # type: ignore[no-any-return]
+
+    async def fetchrow(self, conn: Any, query: Query, *args: Any) -> Any:
+        return await self._run(conn, query, "fetchrow", args)
+
+    async def fetchval(self, conn: Any, query: Query, *args: Any) -> Any:
+        return await self._run(conn, query, "fetchval", args)
+
+    async def _run(
+        self,
+        conn: Any,
+        query: Query,
+        method: str,
+        args: tuple[Any, ...],
+    ) -> Any:
+        started = monotonic()
+        try:
+            return await getattr(conn, method)(query.sql, *args)
+        finally:
+            latency = self.latency.setdefault(query.name, Histogram())
+            latency.observe((monotonic() - started) * 1000)
+
+    async def prepare_all(self, conn: Any) -> None:
+        """Prepares every registered query on the connection. Passed to the
+        pool as its `init` hook.
+
+        Queries on tables that do not exist yet, before the migrations are
+        applied, are skipped and prepared on their first call instead.
+        """
+        for query in self.registry.queries.values():
+            try:
+                await conn.executemany(query.sql, [])
+            except PostgresError as e:
+                logger.debug("Could not prepare %s: %s", query.name, e)
+            else:
+                self.warmed += 1
+
+    async def warm(self, pool: Pool) -> None:
+        """Prepares every registered query on every open connection.
+
+        Used after migrations, as the statements could not be prepared
+        before the tables existed.
+        """
+        size = pool.get_size()
+        prepared = 0
+        all_prepared = asyncio.Event()
+
+        async def prepare() -> None:
+            nonlocal prepared
+            async with pool.acquire() as conn:
+                await self.prepare_all(conn)
+                prepared += 1
+                if prepared == size:
+                    all_prepared.set()
+                # Hold on to the connection so every task gets its own
+                await all_prepared.wait()
+
+        await asyncio.gather(*(prepare() for _ in range(size)))
+
+    def stats(self) -> dict[str, Any]:
+        statements = {}
+        for name in self.registry.queries:
+            latency = self.latency.get(name, Histogram()).stats()
+            statements[name] = {"calls": latency["count"], "latency_ms": latency}
+
+        return {"warmed": self.warmed, "statements": statements}
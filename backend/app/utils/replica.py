@@ -0,0 +1,176 @@
+"""Routing of reads to a read replica.
+
+Reads that follow a write in the same context, usually the same request,
+are pinned to the primary so they see the write. Reads fall back to the
+primary while the replica is down or lags behind.
+"""
+
+import asyncio
+import functools
+import logging
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, ParamSpec, TypeVar
+
+from asyncpg.exceptions import (
+    CannotConnectNowError,
+    InterfaceError,
+    PostgresConnectionError,
+    PostgresError,
+)
+from asyncpg.pool import Pool, PoolConnectionProxy
+
+from .db import AcquireContext
+from .tasks import cancel_task
+
+logger = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+# Errors meaning the replica can not be reached
+CONNECTION_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    CannotConnectNowError,
+    InterfaceError,
+    PostgresConnectionError,
+)
+
+# Seconds the replica is behind the primary. A replica that has replayed
+# everything it received is not behind, even if the primary has not been
+# written to for a while.
+REPLICATION_LAG_QUERY = """SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+    END::float"""
+
+primary_pinned: ContextVar[bool] = ContextVar("primary_pinned", default=False)
+
+
+def pin_primary() -> None:
+    """Pins the reads that follow in this context to the primary."""
+    primary_pinned.set(True)
+
+
+def writes(func: Callable[P, Awaitable[T]]) -> Callable[P, Awaitable[T]]:
+    """Marks a method writing to the primary. Reads that follow it in the
+    same context are pinned to the primary.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+        pin_primary()
+        return await func(*args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaHealth:
+    """Whether a replica may serve reads. It is unhealthy while it can not
+    be reached or lags more than `max_lag` seconds behind.
+    """
+
+    def __init__(self, *, max_lag: float, check_interval: float) -> None:
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.healthy = True
+        self.lag: float | None = None
+
+    def set(self, healthy: bool, reason: str = "") -> None:
+        if healthy == self.healthy:
+            return
+
+        self.healthy = healthy
+        if healthy:
+            logger.info("Routing reads to the replica again.")
+        else:
+            logger.warning("Routing reads to the primary, as %s", reason)
+
+    async def check(self, replica: Pool) -> None:
+        try:
+            async with replica.acquire() as conn:
+                self.lag = await conn.fetchval(REPLICATION_LAG_QUERY)
+        except (*CONNECTION_ERRORS, PostgresError) as e:
+            self.lag = None
+            self.set(False, f"it can not be reached: {e!r}")
+            return
+
+        assert self.lag is not None
+        if self.lag > self.max_lag:
+            self.set(False, f"it lags {self.lag:.1f}s behind")
+        else:
+            self.set(True)
+
+
+class ReplicaPool:
+    """Hands out replica connections, or primary connections when the
+    context is pinned to the primary or the replica is unhealthy.
+
+    The replica's health is checked every `check_interval` seconds. A failed
+    acquire marks it unhealthy right away.
+    """
+
+    def __init__(
+        self,
+        primary: Pool,
+        replica: Pool,
+        *,
+        max_lag: float,
+        check_interval: float,
+    ) -> None:
+        self.primary = primary
+        self.replica = replica
+        self.health = ReplicaHealth(max_lag=max_lag, check_interval=check_interval)
+
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self._replica_connections: set[PoolConnectionProxy] = set()
+        self._task: asyncio.Task[None] | None = None
+
+    def acquire(self, *, timeout: float | None = None) -> AcquireContext:
+        return AcquireContext(lambda: self._acquire(timeout), self.release)
+
+    async def _acquire(self, timeout: float | None) -> PoolConnectionProxy:
+        if self.health.healthy and not primary_pinned.get():
+            try:
+                connection = await self.replica.acquire(timeout=timeout)
+            except CONNECTION_ERRORS as e:
+                self.health.set(False, f"it can not be reached: {e!r}")
+            else:
+                self.replica_reads += 1
+                self._replica_connections.add(connection)
+                return connection
+
+        self.primary_reads += 1
+        return await self.primary.acquire(timeout=timeout)
+
+    async def release(self, connection: PoolConnectionProxy) -> None:
+        if connection in self._replica_connections:
+            self._replica_connections.remove(connection)
+            await self.replica.release(connection)
+        else:
+            await self.primary.release(connection)
+
+    async def check(self) -> None:
+        await self.health.check(self.replica)
+
+    async def _check_periodically(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.health.check_interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._check_periodically())
+
+    async def close(self) -> None:
+        await cancel_task(self._task)
+        await self.replica.close()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "healthy": self.health.healthy,
+            "lag": self.health.lag,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+        }
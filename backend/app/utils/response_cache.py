@@ -0,0 +1,60 @@
+"""In-process cache of encoded response bodies."""
+
+import gzip
+from typing import Hashable, NamedTuple
+
+from starlette.responses import Response
+
+from .cache import SizedLRUCache
+
+# As for GZipMiddleware, smaller bodies are not worth compressing
+GZIP_MINIMUM_SIZE = 500
+GZIP_COMPRESSLEVEL = 9
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    gzipped: bytes | None  # None for bodies too small to compress
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.body) + len(self.gzipped or b"")
+
+    def to_response(self, accept_encoding: str, media_type: str) -> Response:
+        if self.gzipped is None:
+            return Response(content=self.body, media_type=media_type)
+
+        headers = {"Vary": "Accept-Encoding"}
+        if "gzip" not in accept_encoding:
+            return Response(content=self.body, media_type=media_type, headers=headers)
+
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=self.gzipped, media_type=media_type, headers=headers)
+
+
+class ResponseCache:
+    """Response bodies with their gzip compressed variant, compressed once
+    when cached, bounded by `maxbytes` of bodies with LRU eviction.
+
+    Keys must change whenever the body would, e.g. by including a version.
+    """
+
+    def __init__(self, maxbytes: int) -> None:
+        self._cache: SizedLRUCache[Hashable, CachedResponse] = SizedLRUCache(
+            maxbytes, sizeof=lambda cached: cached.nbytes
+        )
+
+    def get(self, key: Hashable) -> CachedResponse | None:
+        return self._cache.get(key)
+
+    def set(self, key: Hashable, body: bytes) -> CachedResponse:
+        gzipped = None
+        if len(body) >= GZIP_MINIMUM_SIZE:
+            gzipped = gzip.compress(body, compresslevel=GZIP_COMPRESSLEVEL)
+
+        cached = CachedResponse(body, gzipped)
+        self._cache.set(key, cached)
+        return cached
+
+    def stats(self) -> dict[str, int | float | None]:
+        return self._cache.stats()
@@ -0,0 +1,43 @@
+"""Deduplication of concurrent calls."""
+
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[K, T]):
+    """Coalesces concurrent calls sharing a key into a single call.
+
+    The first caller for a key starts the call in its own task and every
+    caller that arrives before it finishes awaits the same result. The task is
+    shielded, so a cancelled caller does not cancel the call for the others.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: dict[K, asyncio.Task[T]] = {}
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    def _on_done(self, key: K, task: "asyncio.Task[T]") -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+        # Mark the exception as retrieved in case every caller was cancelled.
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: K, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._in_flight.get(key)
+        if task is None:
+
+            async def run() -> T:
+                return await func()
+
+            task = asyncio.create_task(run())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+
+        return await asyncio.shield(task)
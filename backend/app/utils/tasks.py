@@ -0,0 +1,16 @@
+"""Helpers for background tasks."""
+
+import asyncio
+from typing import Any
+
+
+async def cancel_task(task: asyncio.Task[Any] | None) -> None:
+    """Cancels the task, if any, and waits for it to finish."""
+    if task is None:
+        return
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
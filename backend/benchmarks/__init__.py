@@ -0,0 +1,3 @@
+"""
+Benchmarks against a local postgres database
+"""
@@ -0,0 +1,122 @@
+"""
+Compares the latency of fetching a group with a single JSON aggregating query
+against fetching it piece by piece, at the configured group limits. The
+"single json" timings leave out building the pydantic models, which
+"parsed json" includes.
+
+Usage: python -m benchmarks.get_group [--database bench] [--iterations 200]
+"""
+import argparse
+import asyncio
+import statistics
+from time import perf_counter
+from typing import Any, Awaitable, Callable
+
+from app.config import settings
+from app.db import Database
+from app.models.group import Group
+from app.types import GroupId
+
+
+async def seed(db: Database, members: int, punishments: int) -> GroupId:
+    async with db.pool.acquire() as conn:
+        await conn.execute(
+            """TRUNCATE group_punishments, punishment_types, group_members,
+            groups, users RESTART IDENTITY CASCADE"""
+        )
+        group_id = await conn.fetchval(
+            """INSERT INTO groups(ow_group_id, name, name_short, rules, image)
+            VALUES (1, 'Benchmark', 'Bench', 'No rules', 'NoImage')
+            RETURNING group_id"""
+        )
+        type_ids = [
+            await conn.fetchval(
+                """INSERT INTO punishment_types(group_id, name, value, logo_url)
+                VALUES ($1, $2, 33, 'logo.svg') RETURNING punishment_type_id""",
+                group_id,
+                f"Type {i}",
+            )
+            for i in range(3)
+        ]
+        await conn.executemany(
+            """INSERT INTO users(ow_user_id, first_name, last_name, email)
+            VALUES ($1, $2, $3, $4)""",
+            [(i, f"First{i}", f"Last{i}", f"user{i}@bench") for i in range(members)],
+        )
+        await conn.execute(
+            """INSERT INTO group_members(group_id, user_id, ow_group_user_id)
+            SELECT $1, user_id, user_id FROM users""",
+            group_id,
+        )
+        await conn.executemany(
+            """INSERT INTO group_punishments(group_id, user_id, punishment_type_id,
+                reason, amount, created_by)
+            VALUES ($1, $2, $3, 'Benchmark', 1, 1)""",
+            [
+                (group_id, i % members + 1, type_ids[i % len(type_ids)])
+                for i in range(punishments)
+            ],
+        )
+    return GroupId(group_id)
+
+
+async def measure(
+    func: Callable[[], Awaitable[Any]],
+    iterations: int,
+) -> list[float]:
+    await func()  # Warm up
+    timings = []
+    for _ in range(iterations):
+        start = perf_counter()
+        await func()
+        timings.append((perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{name:<12} mean {statistics.mean(timings):7.2f}ms  "
+        f"median {statistics.median(timings):7.2f}ms  p95 {p95:7.2f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database", default="bench")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--members", type=int, default=settings.max_group_members)
+    parser.add_argument(
+        "--punishments",
+        type=int,
+        default=settings.max_active_punishments_per_group,
+    )
+    args = parser.parse_args()
+
+    db = Database()
+    await db.async_init(database=args.database)
+    try:
+        group_id = await seed(db, args.members, args.punishments)
+        print(
+            f"Group with {args.members} members and {args.punishments} "
+            f"punishments, {args.iterations} iterations"
+        )
+
+        async def get_group_parsed() -> Group:
+            return Group.parse_raw(await db.get_group_json(group_id))
+
+        piecewise = await measure(lambda: db.get_group(group_id), args.iterations)
+        parsed_json = await measure(get_group_parsed, args.iterations)
+        single_json = await measure(
+            lambda: db.get_group_json(group_id), args.iterations
+        )
+        report("piecewise", piecewise)
+        report("parsed json", parsed_json)
+        report("single json", single_json)
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,9 +1,21 @@
 import asyncio
+import os
 from asyncio import AbstractEventLoop
 from typing import Generator
 
 import pytest_asyncio
 
+# The OW mocks in tests.fixtures return a new response for every request, so
+# fetched OW data must not be reused and groups must be synced on every
+# request unless a test opts in.
+os.environ.setdefault("OW_GROUP_USERS_CACHE_TTL", "0")
+os.environ.setdefault("GROUP_SYNC_FRESHNESS", "0")
+
+# Fail on nested pool acquires anywhere in the suite.
+os.environ.setdefault("POOL_TRACE", "1")
+os.environ.setdefault("POOL_TRACE_RAISE", "1")
+os.environ.setdefault("POOL_TRACE_HOLD_THRESHOLD", "10")
+
 
 @pytest_asyncio.fixture(scope="session")
 def event_loop() -> Generator[AbstractEventLoop, None, None]:
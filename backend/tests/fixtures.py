@@ -4,10 +4,16 @@ import os
 import re
 from typing import Any, AsyncGenerator
 
+import pytest
 import pytest_asyncio
 from aioresponses import aioresponses
 from app.api.init_api import init_api
+from app.config import settings
 from app.http import BASE_OLD_ONLINE
+from app.models.group import GroupCreate
+from app.models.group_member import GroupMemberCreate
+from app.models.user import UserCreate
+from app.types import GroupId, OWUserId, UserId
 from asgi_lifespan import LifespanManager
 from httpx import AsyncClient
 
@@ -44,6 +50,38 @@ async def client() -> AsyncGenerator[AsyncClient, None]:
             yield ac
 
 
+@pytest_asyncio.fixture(scope="class")
+async def small_pool_client() -> AsyncGenerator[AsyncClient, None]:
+    # A pool with less connections than the sync budget, to catch code paths
+    # that hold more than one connection at a time.
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(settings, "postgres_pool_min_size", 1)
+        mp.setattr(settings, "postgres_pool_max_size", 3)
+        app = init_api(database=f"db{counter() + 1}")
+
+        async with LifespanManager(app):
+            async with AsyncClient(app=app, base_url="http://test") as ac:
+                setattr(ac, "app", app)
+                yield ac
+
+
+@pytest_asyncio.fixture(scope="class")
+async def replica_client() -> AsyncGenerator[AsyncClient, None]:
+    # Reads are routed to POSTGRES_REPLICA_HOST, a second local instance
+    # replicating the first, or else to the primary itself through a pool of
+    # its own.
+    with pytest.MonkeyPatch.context() as mp:
+        if settings.postgres_replica_host is None:
+            mp.setattr(settings, "postgres_replica_host", settings.postgres_host)
+            mp.setattr(settings, "postgres_replica_port", settings.postgres_port)
+        app = init_api(database=f"db{counter() + 1}")
+
+        async with LifespanManager(app):
+            async with AsyncClient(app=app, base_url="http://test") as ac:
+                setattr(ac, "app", app)
+                yield ac
+
+
 @pytest_asyncio.fixture(scope="class")
 async def mock() -> AsyncGenerator[aioresponses, None]:
     with aioresponses() as m:  # type: ignore
@@ -128,3 +166,35 @@ async def mock() -> AsyncGenerator[aioresponses, None]:
         )
 
         yield m
+
+
+async def create_group(db: Any, name: str, users: int) -> tuple[GroupId, list[UserId]]:
+    res = await db.insert_group(
+        GroupCreate(
+            name=name,
+            name_short=name,
+            rules="No rules",
+            ow_group_id=None,
+            image="NoImage",
+        )
+    )
+    group_id = GroupId(res["id"])
+
+    user_ids = await db.insert_or_update_users(
+        [
+            UserCreate(
+                ow_user_id=OWUserId(i),
+                first_name=f"First{i}",
+                last_name=f"Last{i}",
+                email=f"user{i}@test.com",
+            )
+            for i in range(group_id * 100, group_id * 100 + users)
+        ]
+    )
+    await db.insert_users_in_group(
+        [
+            GroupMemberCreate(group_id=group_id, user_id=user_id)
+            for user_id in user_ids.values()
+        ]
+    )
+    return group_id, list(user_ids.values())
@@ -0,0 +1,378 @@
+import json
+from typing import Any
+
+import pytest
+from app.exceptions import NotFound, NotInGroup, PunishmentTypeNotExists
+from app.models.group import Group, GroupCreate
+from app.models.group_member import GroupMemberCreate
+from app.models.group_user import GroupUser
+from app.models.punishment import PunishmentCreate
+from app.models.user import UserCreate
+from app.types import GroupId, OWUserId, PunishmentTypeId
+from tests.fixtures import client, create_group
+
+
+class TestDatabase:
+    @pytest.mark.asyncio
+    async def test_get_group_matches_separate_queries(self, client: Any) -> None:
+        db = client.app.db
+        res = await db.insert_group(
+            GroupCreate(
+                name="Test group",
+                name_short="Test",
+                rules="No rules",
+                ow_group_id=None,
+                image="NoImage",
+            )
+        )
+        group_id = res["id"]
+
+        user_ids = await db.insert_or_update_users(
+            [
+                UserCreate(
+                    ow_user_id=OWUserId(i),
+                    first_name=f"First{i}",
+                    last_name=f"Last{i}",
+                    email=f"user{i}@test.com",
+                )
+                for i in range(1, 6)
+            ]
+        )
+        await db.insert_users_in_group(
+            [
+                GroupMemberCreate(group_id=group_id, user_id=user_id)
+                for user_id in user_ids.values()
+            ]
+        )
+
+        punishment_types = await db.get_punishment_types(group_id)
+        created_by = user_ids[OWUserId(1)]
+        for i, user_id in enumerate(list(user_ids.values())[:3]):
+            await db.insert_punishments(
+                group_id,
+                user_id,
+                created_by,
+                [
+                    PunishmentCreate(
+                        punishment_type_id=punishment_types[i].punishment_type_id,
+                        reason=f"Reason {i}",
+                        amount=i + 1,
+                    )
+                ],
+            )
+        punishment = (await db.get_punishments(user_ids[OWUserId(1)], group_id))[0]
+        await db.verify_punishment(punishment.punishment_id, created_by)
+
+        group = await db.get_group(group_id)
+
+        members = await db.get_group_users(group_id)
+        expected = Group(
+            group_id=group_id,
+            name="Test group",
+            name_short="Test",
+            rules="No rules",
+            ow_group_id=None,
+            image="NoImage",
+            punishment_types=punishment_types,
+            members=sorted(members, key=lambda m: m.user_id),
+        )
+        assert group == expected
+        assert Group.parse_raw(await db.get_group_json(group_id)) == group
+        assert group.members[0].punishments[0].verified_by == created_by
+        assert not group.members[-1].punishments
+
+    @pytest.mark.asyncio
+    async def test_group_json_matches_models(self, client: Any) -> None:
+        db = client.app.db
+        group_id = GroupId(1)
+
+        query = "SELECT * FROM groups WHERE group_id = $1"
+        group = Group(
+            **(await db.pool.fetchrow(query, group_id)),
+            punishment_types=await db.get_punishment_types(group_id),
+            members=await db.get_group_users(group_id),
+        )
+
+        response = await client.get(f"/group/{group_id}")
+        assert response.status_code == 200
+        assert Group.parse_raw(response.content) == group
+        assert list(response.json()) == list(group.dict())
+
+        response = await client.get(f"/group/{group_id}/users")
+        assert response.status_code == 200
+        users = response.json()
+        assert [GroupUser(**user) for user in users] == group.members
+        assert list(users[0]) == list(group.members[0].dict())
+        assert list(users[0]["punishments"][0]) == list(
+            group.members[0].punishments[0].dict()
+        )
+
+    @pytest.mark.asyncio
+    async def test_stream_group_users(self, client: Any) -> None:
+        db = client.app.db
+        group_id, _ = await create_group(db, "Stream", 5)
+
+        chunks = [
+            chunk async for chunk in db.stream_group_users_json(group_id, batch_size=2)
+        ]
+        assert len(chunks) == 4  # 5 members in batches of 2, and the closing "]"
+        assert json.loads("".join(chunks)) == json.loads(
+            await db.get_group_users_json(group_id)
+        )
+
+        chunks = [chunk async for chunk in db.stream_group_users_json(GroupId(1000))]
+        assert json.loads("".join(chunks)) == []
+
+        response = await client.get(f"/group/{group_id}/users")
+        stream_response = await client.get(f"/group/{group_id}/users?stream=true")
+        assert stream_response.status_code == 200
+        assert stream_response.headers["content-type"] == "application/json"
+        assert stream_response.json() == response.json()
+
+    @pytest.mark.asyncio
+    async def test_punishments_pagination(self, client: Any) -> None:
+        db = client.app.db
+        group_id = GroupId(1)
+        user_id = (await db.get_user(OWUserId(5), is_ow_user_id=True)).user_id
+
+        # Punishments inserted together share created_time, which tests the
+        # punishment_id tie-breaker.
+        punishment_types = await db.get_punishment_types(group_id)
+        await db.insert_punishments(
+            group_id,
+            user_id,
+            user_id,
+            [
+                PunishmentCreate(
+                    punishment_type_id=punishment_types[0].punishment_type_id,
+                    reason=f"Reason {i}",
+                    amount=1,
+                )
+                for i in range(5)
+            ],
+        )
+        expected = sorted(
+            (p.punishment_id for p in await db.get_punishments(user_id, group_id)),
+            reverse=True,
+        )
+
+        url = f"/group/{group_id}/user/{user_id}/punishments"
+        punishment_ids = []
+        cursor = None
+        pages = 0
+        while True:
+            params: dict[str, Any] = {"limit": 2}
+            if cursor is not None:
+                params["cursor"] = cursor
+            response = await client.get(url, params=params)
+            assert response.status_code == 200
+
+            page = response.json()
+            punishment_ids += [p["punishment_id"] for p in page["punishments"]]
+            pages += 1
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert punishment_ids == expected
+        assert "group_id" not in page["punishments"][0]
+        assert pages == 3
+
+        response = await client.get(url, params={"cursor": "not a cursor"})
+        assert response.status_code == 400
+
+        response = await client.get(url, params={"limit": 0})
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_group_without_punishments(self, client: Any) -> None:
+        group_id = GroupId(1)
+
+        response = await client.get(f"/group/{group_id}", params={"punishments": False})
+        assert response.status_code == 200
+        assert all(not m["punishments"] for m in response.json()["members"])
+
+        for params in ({"punishments": False}, {"punishments": False, "stream": True}):
+            response = await client.get(f"/group/{group_id}/users", params=params)
+            assert response.status_code == 200
+            assert response.json()
+            assert all(not m["punishments"] for m in response.json())
+
+        user_id = response.json()[0]["user_id"]
+        response = await client.get(
+            f"/group/{group_id}/user/{user_id}", params={"punishments": False}
+        )
+        assert response.status_code == 200
+        assert response.json()["punishments"] == []
+
+    @pytest.mark.asyncio
+    async def test_punishment_filters(self, client: Any) -> None:
+        db = client.app.db
+        group_id = GroupId(1)
+        user_id = (await db.get_user(OWUserId(5), is_ow_user_id=True)).user_id
+        url = f"/group/{group_id}/user/{user_id}/punishments"
+
+        punishments = await db.get_punishments(user_id, group_id)
+        await db.verify_punishment(punishments[0].punishment_id, user_id)
+        all_punishments = await db.get_punishments(user_id, group_id)
+
+        async def get_ids(params: dict[str, Any]) -> set[int]:
+            response = await client.get(url, params=params)
+            assert response.status_code == 200
+            return {p["punishment_id"] for p in response.json()["punishments"]}
+
+        assert await get_ids({"verified": False}) == {
+            p.punishment_id for p in all_punishments if p.verified_time is None
+        }
+        assert await get_ids({"verified": True}) == {
+            p.punishment_id for p in all_punishments if p.verified_time is not None
+        }
+
+        punishment_type_id = all_punishments[0].punishment_type_id
+        assert await get_ids({"punishment_type_id": punishment_type_id}) == {
+            p.punishment_id
+            for p in all_punishments
+            if p.punishment_type_id == punishment_type_id
+        }
+
+        created_time = min(p.created_time for p in all_punishments)
+        assert await get_ids({"created_before": created_time.isoformat()}) == set()
+        assert await get_ids(
+            {"created_after": created_time.isoformat() + "+00:00"}
+        ) == {p.punishment_id for p in all_punishments}
+        assert await get_ids({"created_by": 1000}) == set()
+
+        # The filters apply to the punishments embedded in the group as well
+        response = await client.get(f"/group/{group_id}", params={"verified": False})
+        members = response.json()["members"]
+        assert all(
+            p["verified_time"] is None for m in members for p in m["punishments"]
+        )
+        assert any(m["punishments"] for m in members)
+
+    @pytest.mark.asyncio
+    async def test_member_totals(self, client: Any) -> None:
+        db = client.app.db
+        group_id = GroupId(1)
+        values = {
+            t.punishment_type_id: t.value
+            for t in await db.get_punishment_types(group_id)
+        }
+
+        def expected_totals(member: GroupUser) -> dict[str, Any]:
+            totals: dict[int, dict[str, Any]] = {}
+            for p in sorted(member.punishments, key=lambda p: p.punishment_type_id):
+                unpaid = p.verified_time is None
+                value = p.amount * values[p.punishment_type_id]
+                t = totals.setdefault(
+                    p.punishment_type_id,
+                    {
+                        "punishment_type_id": p.punishment_type_id,
+                        "count": 0,
+                        "unpaid_count": 0,
+                        "value": 0,
+                        "unpaid_value": 0,
+                    },
+                )
+                t["count"] += 1
+                t["unpaid_count"] += unpaid
+                t["value"] += value
+                t["unpaid_value"] += value if unpaid else 0
+
+            return {
+                "total_count": sum(t["count"] for t in totals.values()),
+                "unpaid_count": sum(t["unpaid_count"] for t in totals.values()),
+                "total_value": sum(t["value"] for t in totals.values()),
+                "unpaid_value": sum(t["unpaid_value"] for t in totals.values()),
+                "punishment_type_totals": list(totals.values()),
+            }
+
+        async def check() -> None:
+            members = await db.get_group_users(group_id)
+            assert any(m.punishments for m in members)
+            expected = {m.user_id: expected_totals(m) for m in members}
+            for member in members:
+                assert member.dict(include=set(expected[member.user_id])) == (
+                    expected[member.user_id]
+                )
+
+            # Rendered without the punishments themselves
+            response = await client.get(
+                f"/group/{group_id}", params={"punishments": False}
+            )
+            assert response.status_code == 200
+            for member in response.json()["members"]:
+                assert member["punishments"] == []
+                assert {k: member[k] for k in expected[member["user_id"]]} == (
+                    expected[member["user_id"]]
+                )
+
+            member = await db.get_group_user(
+                group_id, members[0].user_id, punishments=False
+            )
+            assert member.dict(include=set(expected[member.user_id])) == (
+                expected[member.user_id]
+            )
+
+        await check()
+
+        user_id = (await db.get_user(OWUserId(5), is_ow_user_id=True)).user_id
+        punishments = await db.get_punishments(user_id, group_id)
+        unverified = [p for p in punishments if p.verified_time is None]
+        await db.verify_punishment(unverified[0].punishment_id, user_id)
+        await db.delete_punishment(unverified[1].punishment_id)
+        await check()
+
+    @pytest.mark.asyncio
+    async def test_get_group_not_found(self, client: Any) -> None:
+        with pytest.raises(NotFound):
+            await client.app.db.get_group(GroupId(1000))
+
+    @pytest.mark.asyncio
+    async def test_insert_punishments_validation(self, client: Any) -> None:
+        db = client.app.db
+        group_id, user_ids = await create_group(db, "Validation", 1)
+        other_group_id, other_user_ids = await create_group(db, "Other", 1)
+        punishment_type_id = (await db.get_punishment_types(group_id))[
+            0
+        ].punishment_type_id
+        other_punishment_type_id = (await db.get_punishment_types(other_group_id))[
+            0
+        ].punishment_type_id
+
+        def punishments(
+            *punishment_type_ids: PunishmentTypeId,
+        ) -> list[PunishmentCreate]:
+            return [
+                PunishmentCreate(punishment_type_id=i, reason="Reason", amount=1)
+                for i in punishment_type_ids
+            ]
+
+        for user_id, to_insert in (
+            (other_user_ids[0], punishments(punishment_type_id)),
+            (other_user_ids[0], punishments()),
+        ):
+            with pytest.raises(NotInGroup):
+                await db.insert_punishments(group_id, user_id, user_ids[0], to_insert)
+
+        with pytest.raises(PunishmentTypeNotExists):
+            await db.insert_punishments(
+                group_id,
+                user_ids[0],
+                user_ids[0],
+                punishments(punishment_type_id, other_punishment_type_id),
+            )
+        assert not await db.get_punishments(user_ids[0], group_id)
+
+        assert await db.insert_punishments(
+            group_id, user_ids[0], user_ids[0], punishments()
+        ) == {"ids": []}
+        res = await db.insert_punishments(
+            group_id,
+            user_ids[0],
+            user_ids[0],
+            punishments(punishment_type_id, punishment_type_id),
+        )
+        assert res["ids"] == sorted(
+            p.punishment_id for p in await db.get_punishments(user_ids[0], group_id)
+        )
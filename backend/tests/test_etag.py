@@ -0,0 +1,165 @@
+from typing import Any
+
+import pytest
+from app.models.punishment import PunishmentCreate
+from app.models.user import UserUpdate
+from tests.fixtures import client, create_group
+
+
+async def assert_revalidates(client: Any, url: str, params: Any = None) -> str:
+    """Checks that the ETag of `url` revalidates, and returns it."""
+    response = await client.get(url, params=params)
+    assert response.status_code == 200
+    etag = str(response.headers["etag"])
+    assert etag.startswith('"') and etag.endswith('"')
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}'):
+        response = await client.get(
+            url, params=params, headers={"If-None-Match": if_none_match}
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+
+    response = await client.get(url, params=params, headers={"If-None-Match": "*"})
+    assert response.status_code == 304
+
+    return etag
+
+
+class TestETag:
+    @pytest.mark.asyncio
+    async def test_group_etags(
+        self,
+        client: Any,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        db = client.app.db
+        group_id, user_ids = await create_group(db, "Group", 3)
+        urls = [
+            f"/group/{group_id}",
+            f"/group/{group_id}/users",
+            f"/group/{group_id}/user/{user_ids[0]}",
+        ]
+        etags = [await assert_revalidates(client, url) for url in urls]
+
+        # Revalidating does not load the group
+        async def not_loaded(*args: Any, **kwargs: Any) -> Any:
+            raise AssertionError("Group loaded")
+
+        with monkeypatch.context() as m:
+            m.setattr(db, "get_group_json", not_loaded)
+            m.setattr(db, "get_group_users_json", not_loaded)
+            m.setattr(db, "get_group_user", not_loaded)
+            for url, etag in zip(urls, etags):
+                response = await client.get(url, headers={"If-None-Match": etag})
+                assert response.status_code == 304
+
+        # Every representation has its own ETag
+        for url, etag in zip(urls, etags):
+            filtered = await assert_revalidates(client, url, {"punishments": False})
+            assert filtered != etag
+        assert len(set(etags)) == len(etags)
+
+        # A write to the group changes them
+        punishment_type = (await db.get_punishment_types(group_id))[0]
+        await db.insert_punishments(
+            group_id,
+            user_ids[1],
+            user_ids[1],
+            [
+                PunishmentCreate(
+                    punishment_type_id=punishment_type.punishment_type_id,
+                    reason="Reason",
+                    amount=1,
+                )
+            ],
+        )
+        for url, etag in zip(urls, etags):
+            response = await client.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.headers["etag"] != etag
+
+        response = await client.get("/group/1000", headers={"If-None-Match": etags[0]})
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_user_etags(self, client: Any) -> None:
+        db = client.app.db
+        group_id, user_ids = await create_group(db, "Other group", 1)
+        user_id = user_ids[0]
+
+        user_etag = await assert_revalidates(client, f"/user/{user_id}")
+        groups_etag = await assert_revalidates(client, f"/user/{user_id}/group")
+
+        # Renaming the user changes it
+        user = await db.get_user(user_id)
+        user_update = UserUpdate(**(user.dict() | {"first_name": "New"}))
+        await db.update_user(user_id, user_update)
+        response = await client.get(
+            f"/user/{user_id}", headers={"If-None-Match": user_etag}
+        )
+        assert response.status_code == 200
+        assert response.json()["first_name"] == "New"
+        groups_etag = await assert_revalidates(client, f"/user/{user_id}/group")
+
+        # Leaving a group changes its groups
+        await db.delete_user_from_group(group_id, user_id)
+        response = await client.get(
+            f"/user/{user_id}/group", headers={"If-None-Match": groups_etag}
+        )
+        assert response.status_code == 200
+        assert response.json() == []
+
+        response = await client.get("/user/1000", headers={"If-None-Match": "*"})
+        assert response.status_code == 404
+
+        # `*` only matches groups of users that exist
+        response = await client.get("/user/1000/group", headers={"If-None-Match": "*"})
+        assert response.status_code == 200
+        assert response.json() == []
+        assert "etag" not in response.headers
+
+        response = await client.get(
+            f"/group/{group_id}/user/{user_id}", headers={"If-None-Match": "*"}
+        )
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_etags_per_content_coding(self, client: Any) -> None:
+        db = client.app.db
+        group_id, _ = await create_group(db, "Coded", 10)
+        urls = [
+            # Served from the cache, with its cached gzip body
+            f"/group/{group_id}",
+            # Compressed by the middleware
+            f"/group/{group_id}/users?verified=false",
+        ]
+        identity = {"Accept-Encoding": "identity"}
+        gzip = {"Accept-Encoding": "gzip"}
+
+        for url in urls:
+            response = await client.get(url, headers=identity)
+            assert "content-encoding" not in response.headers
+            etag = response.headers["etag"]
+            body = response.content
+
+            response = await client.get(url, headers=gzip)
+            assert response.headers["content-encoding"] == "gzip"
+            assert response.content == body
+            gzip_etag = response.headers["etag"]
+            assert gzip_etag == f'{etag[:-1]}-gzip"'
+
+            for headers, if_none_match in ((identity, etag), (gzip, gzip_etag)):
+                response = await client.get(
+                    url, headers=headers | {"If-None-Match": if_none_match}
+                )
+                assert response.status_code == 304
+                assert response.headers["etag"] == if_none_match
+
+            # The gzipped body is not a current representation without gzip
+            response = await client.get(
+                url, headers=identity | {"If-None-Match": gzip_etag}
+            )
+            assert response.status_code == 200
+            assert response.headers["etag"] == etag
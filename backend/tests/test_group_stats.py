@@ -0,0 +1,183 @@
+import datetime
+from typing import Any
+
+import pytest
+from app.exceptions import NotFound
+from app.models.group_member import GroupMemberCreate
+from app.models.group_stats import StatsBucket
+from app.models.punishment import PunishmentCreate
+from app.models.punishment_type import PunishmentTypeCreate
+from app.models.user import UserCreate, UserUpdate
+from app.types import GroupId, OWUserId, PunishmentTypeId
+from tests.fixtures import client, create_group
+
+
+class TestGroupStats:
+    @pytest.mark.asyncio
+    async def test_group_version(self, client: Any) -> None:
+        db = client.app.db
+        group_id, user_ids = await create_group(db, "Group", 2)
+        user_id = user_ids[0]
+        versions: list[int] = [int(await db.get_group_version(group_id))]
+
+        async def changes() -> bool:
+            versions.append(int(await db.get_group_version(group_id)))
+            return versions[-1] != versions[-2]
+
+        res = await db.insert_punishment_type(
+            group_id, PunishmentTypeCreate(name="New", value=1, logo_url="logo.svg")
+        )
+        assert await changes()
+        await db.delete_punishment_type(group_id, PunishmentTypeId(res["id"]))
+        assert await changes()
+
+        punishment_type = (await db.get_punishment_types(group_id))[0]
+        await db.insert_punishments(
+            group_id,
+            user_id,
+            user_id,
+            [
+                PunishmentCreate(
+                    punishment_type_id=punishment_type.punishment_type_id,
+                    reason="Reason",
+                    amount=1,
+                )
+            ],
+        )
+        assert await changes()
+        punishment = (await db.get_punishments(user_id, group_id))[0]
+        await db.verify_punishment(punishment.punishment_id, user_id)
+        assert await changes()
+        await db.delete_punishment(punishment.punishment_id)
+        assert await changes()
+
+        user = await db.get_user(user_id)
+        update = UserUpdate(**user.dict())
+        await db.update_user(user_id, update)
+        assert not await changes()
+        update.first_name = "Renamed"
+        await db.update_user(user_id, update)
+        assert await changes()
+
+        await db.delete_user_from_group(group_id, user_id)
+        assert await changes()
+        await db.insert_users_in_group(
+            [GroupMemberCreate(group_id=group_id, user_id=user_id)]
+        )
+        assert await changes()
+
+        with pytest.raises(NotFound):
+            await db.get_group_version(GroupId(1000))
+
+    @pytest.mark.asyncio
+    async def test_group_stats(self, client: Any) -> None:
+        db = client.app.db
+        group_id, user_ids = await create_group(db, "Stats group", 1)
+        user_id = user_ids[0]
+        punishment_types = await db.get_punishment_types(group_id)
+        await db.insert_punishments(
+            group_id,
+            user_id,
+            user_id,
+            [
+                PunishmentCreate(
+                    punishment_type_id=punishment_types[i % 2].punishment_type_id,
+                    reason=f"Reason {i}",
+                    amount=i + 1,
+                )
+                for i in range(3)
+            ],
+        )
+
+        # Created on 2022-01-03, 2022-01-04 and 2022-02-01. The first one is
+        # verified on 2022-02-02.
+        punishments = sorted(
+            await db.get_punishments(user_id, group_id),
+            key=lambda p: int(p.punishment_id),
+        )
+        days = [datetime.datetime(2022, 1, 3), datetime.datetime(2022, 1, 4)]
+        days.append(datetime.datetime(2022, 2, 1))
+        for punishment, day in zip(punishments, days):
+            await db.pool.execute(
+                "UPDATE group_punishments SET created_time = $2 WHERE punishment_id = $1",
+                punishment.punishment_id,
+                day,
+            )
+        await db.pool.execute(
+            """UPDATE group_punishments
+            SET verified_time = $2, verified_by = created_by
+            WHERE punishment_id = $1""",
+            punishments[0].punishment_id,
+            datetime.datetime(2022, 2, 2),
+        )
+        values = [
+            p.amount * punishment_types[i % 2].value for i, p in enumerate(punishments)
+        ]
+
+        url = f"/group/{group_id}/stats"
+        response = await client.get(url, params={"bucket": "month"})
+        assert response.status_code == 200
+        stats = response.json()
+        assert stats["bucket"] == "month"
+        assert [
+            (b["start"], b["created"], b["issued_value"], b["verified_value"])
+            for b in stats["buckets"]
+        ] == [
+            ("2022-01-01T00:00:00", 2, values[0] + values[1], 0),
+            ("2022-02-01T00:00:00", 1, values[2], values[0]),
+        ]
+        assert stats["buckets"][1]["punishment_types"] == [
+            {
+                "punishment_type_id": punishment_types[0].punishment_type_id,
+                "created": 1,
+                "issued_value": values[2],
+                "verified_value": values[0],
+            }
+        ]
+
+        response = await client.get(url, params={"bucket": "week"})
+        assert [b["start"] for b in response.json()["buckets"]] == [
+            "2022-01-03T00:00:00",
+            "2022-01-31T00:00:00",
+        ]
+        response = await client.get(url, params={"bucket": "day"})
+        assert len(response.json()["buckets"]) == 4
+
+        response = await client.get(url, params={"bucket": "year"})
+        assert response.status_code == 422
+        response = await client.get("/group/1000/stats")
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_group_stats_cache(self, client: Any) -> None:
+        cache = client.app.app_state.group_stats
+        group_id = GroupId(2)
+        url = f"/group/{group_id}/stats"
+
+        response = await client.get(url)
+        hits = cache.counters.hits
+        assert (await client.get(url)).json() == response.json()
+        assert cache.counters.hits == hits + 1
+
+        # A write to the group invalidates it
+        db = client.app.db
+        user_id = (await db.get_group_users(group_id))[0].user_id
+        punishment_type = (await db.get_punishment_types(group_id))[0]
+        await db.insert_punishments(
+            group_id,
+            user_id,
+            user_id,
+            [
+                PunishmentCreate(
+                    punishment_type_id=punishment_type.punishment_type_id,
+                    reason="Reason",
+                    amount=1,
+                )
+            ],
+        )
+        stats = (await client.get(url)).json()
+        assert cache.counters.hits == hits + 1
+        assert sum(b["created"] for b in stats["buckets"]) == 4
+
+        response = await client.get("/metrics")
+        assert response.json()["caches"]["group_stats"]["hits"] == hits + 1
@@ -0,0 +1,132 @@
+import asyncio
+from typing import Any
+
+import pytest
+from app.leaderboard import LeaderboardRefresher
+from app.models.punishment import PunishmentCreate
+from app.queries import LEADERBOARD_LOCK_ID
+from app.types import GroupId, UserId
+from tests.fixtures import client, create_group
+
+
+async def punish(db: Any, group_id: GroupId, user_id: UserId, amount: int) -> None:
+    punishment_type = (await db.get_punishment_types(group_id))[0]
+    await db.insert_punishments(
+        group_id,
+        user_id,
+        user_id,
+        [
+            PunishmentCreate(
+                punishment_type_id=punishment_type.punishment_type_id,
+                reason="Reason",
+                amount=amount,
+            )
+        ],
+    )
+
+
+class TestLeaderboard:
+    @pytest.mark.asyncio
+    async def test_group_leaderboard(self, client: Any) -> None:
+        db = client.app.db
+        group_id, user_ids = await create_group(db, "Group", 4)
+        for user_id, amount in zip(user_ids, (2, 5, 1)):
+            await punish(db, group_id, user_id, amount)
+
+        # The second member paid, and an old punishment of the third member
+        # only counts for all time
+        punishment = (await db.get_punishments(user_ids[1], group_id))[0]
+        await db.verify_punishment(punishment.punishment_id, user_ids[0])
+        await punish(db, group_id, user_ids[2], 10)
+        await db.pool.execute(
+            """UPDATE group_punishments
+            SET created_time = created_time - interval '2 months'
+            WHERE user_id = $1 AND amount = 10""",
+            user_ids[2],
+        )
+
+        url = f"/group/{group_id}/leaderboard"
+        response = await client.get(url)
+        assert response.status_code == 200
+        assert response.json()["entries"] == []  # Not refreshed yet
+
+        assert await db.refresh_leaderboard(max_age=0)
+
+        async def get_user_ids(params: dict[str, Any]) -> list[int]:
+            response = await client.get(url, params=params)
+            assert response.status_code == 200
+            assert response.json()["refreshed_at"] is not None
+            return [e["user_id"] for e in response.json()["entries"]]
+
+        assert await get_user_ids({}) == [user_ids[2], user_ids[1], user_ids[0]]
+        assert await get_user_ids({"period": "month"}) == [
+            user_ids[1],
+            user_ids[0],
+            user_ids[2],
+        ]
+        assert await get_user_ids({"order": "unpaid"}) == [user_ids[2], user_ids[0]]
+        assert await get_user_ids({"limit": 1}) == [user_ids[2]]
+
+        entry = (await client.get(url)).json()["entries"][0]
+        value = (await db.get_punishment_types(group_id))[0].value
+        assert entry == {
+            "group_id": group_id,
+            "user_id": user_ids[2],
+            "first_name": f"First{group_id * 100 + 2}",
+            "last_name": f"Last{group_id * 100 + 2}",
+            "count": 2,
+            "total_value": 11 * value,
+            "unpaid_value": 11 * value,
+        }
+
+        for params in ({"limit": 0}, {"period": "year"}, {"order": "name"}):
+            response = await client.get(url, params=params)
+            assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_leaderboard_across_groups(self, client: Any) -> None:
+        db = client.app.db
+        group_id, user_ids = await create_group(db, "Other group", 2)
+        await punish(db, group_id, user_ids[0], 100)
+        assert await db.refresh_leaderboard(max_age=0)
+
+        response = await client.get("/leaderboard", params={"limit": 3})
+        assert response.status_code == 200
+        entries = response.json()["entries"]
+        assert len(entries) == 3
+        assert (entries[0]["group_id"], entries[0]["user_id"]) == (
+            group_id,
+            user_ids[0],
+        )
+        assert len({e["group_id"] for e in entries}) == 2
+        values = [e["total_value"] for e in entries]
+        assert values == sorted(values, reverse=True)
+
+    @pytest.mark.asyncio
+    async def test_refresh_skipped(self, client: Any) -> None:
+        db = client.app.db
+        refresher = LeaderboardRefresher(db, interval=60)
+        assert not await refresher.refresh()  # Refreshed by the tests above
+        assert refresher.stats()["skipped"] == 1
+
+        # Another process is refreshing
+        async def refresh_while_locked() -> bool:
+            async with db.pool.acquire() as conn:
+                await conn.execute("SELECT pg_advisory_lock($1)", LEADERBOARD_LOCK_ID)
+                try:
+                    return bool(
+                        await asyncio.create_task(db.refresh_leaderboard(max_age=0))
+                    )
+                finally:
+                    await conn.execute(
+                        "SELECT pg_advisory_unlock($1)", LEADERBOARD_LOCK_ID
+                    )
+
+        assert not await refresh_while_locked()
+        assert await db.refresh_leaderboard(max_age=0)
+
+        response = await client.get("/metrics")
+        assert response.status_code == 200
+        assert (
+            response.json()["leaderboard"] == client.app.leaderboard_refresher.stats()
+        )
@@ -0,0 +1,237 @@
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+from app.config import settings
+from app.migrator import MIGRATION_LOCK_ID, Migrator
+from asyncpg.exceptions import PostgresSyntaxError, UndefinedTableError
+from tests.fixtures import client
+
+ONLINE_MIGRATION = """-- migrate: online
+CREATE TABLE online_log (id SERIAL PRIMARY KEY, value INTEGER);
+INSERT INTO online_log (value) SELECT i FROM generate_series(1, 25) as i;
+ALTER TABLE online_log ADD COLUMN IF NOT EXISTS doubled INTEGER;
+-- migrate: batch
+UPDATE online_log SET doubled = value * 2 WHERE id IN (
+    SELECT id FROM online_log WHERE doubled IS NULL LIMIT 10
+);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS online_log_doubled_idx
+ON online_log (doubled);
+INSERT INTO online_dependency VALUES (1);
+"""
+
+
+def write_migrations(directory: Path, migrations: dict[str, str]) -> Path:
+    directory.mkdir(exist_ok=True)
+    for name, sql in migrations.items():
+        (directory / name).write_text(sql, encoding="utf-8")
+    return directory
+
+
+class TestMigrations:
+    @pytest.mark.asyncio
+    async def test_all_migrations_recorded(self, client: Any) -> None:
+        pool = client.app.db.pool
+        versions = [m.version for m in Migrator().load()]
+
+        res = await pool.fetch("SELECT * FROM schema_migrations ORDER BY version")
+        assert [r["version"] for r in res] == versions
+        assert all(len(r["checksum"]) == 64 for r in res)
+
+        # Nothing is pending
+        async with pool.acquire() as conn:
+            assert await Migrator().run(conn) == []
+
+    @pytest.mark.asyncio
+    async def test_pending_migrations_applied_in_order(
+        self,
+        client: Any,
+        tmp_path: Path,
+    ) -> None:
+        pool = client.app.db.pool
+        directory = write_migrations(
+            tmp_path,
+            {
+                name.name: name.read_text(encoding="utf-8")
+                for name in settings.migrations_directory.iterdir()
+            }
+            | {
+                "0101_second.sql": "INSERT INTO migration_log VALUES ('second');",
+                "0100_first.sql": (
+                    "CREATE TABLE migration_log (\n"
+                    "    name TEXT NOT NULL -- Spans lines\n"
+                    ");\n"
+                    "INSERT INTO migration_log VALUES ('first');\n"
+                ),
+            },
+        )
+
+        async with pool.acquire() as conn:
+            assert await Migrator(directory).run(conn) == [100, 101]
+
+        res = await pool.fetch("SELECT name FROM migration_log")
+        assert [r["name"] for r in res] == ["first", "second"]
+
+    @pytest.mark.asyncio
+    async def test_failed_migration_rolled_back(
+        self,
+        client: Any,
+        tmp_path: Path,
+    ) -> None:
+        pool = client.app.db.pool
+        directory = write_migrations(
+            tmp_path,
+            {
+                "0200_broken.sql": ("CREATE TABLE broken (id INTEGER);\nNOT SQL;\n"),
+            },
+        )
+
+        async with pool.acquire() as conn:
+            with pytest.raises(PostgresSyntaxError):
+                await Migrator(directory).run(conn)
+
+        query = "SELECT to_regclass('broken') IS NULL"
+        assert await pool.fetchval(query)
+        query = "SELECT 1 FROM schema_migrations WHERE version = 200"
+        assert await pool.fetchval(query) is None
+
+        # The lock was released
+        async with pool.acquire() as conn:
+            assert await conn.fetchval(
+                "SELECT pg_try_advisory_lock($1)", MIGRATION_LOCK_ID
+            )
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_migrators(self, client: Any, tmp_path: Path) -> None:
+        pool = client.app.db.pool
+        directory = write_migrations(
+            tmp_path,
+            {
+                "0300_slow.sql": (
+                    "SELECT pg_sleep(0.2);\n"
+                    "CREATE TABLE concurrent_log (id INTEGER);\n"
+                    "INSERT INTO concurrent_log VALUES (1);\n"
+                ),
+            },
+        )
+
+        async def migrate() -> list[int]:
+            async with pool.acquire() as conn:
+                return await Migrator(directory).run(conn)
+
+        results = await asyncio.gather(*(migrate() for _ in range(3)))
+
+        assert sorted(results) == [[], [], [300]]
+        assert await pool.fetchval("SELECT count(*) FROM concurrent_log") == 1
+
+    @pytest.mark.asyncio
+    async def test_skips_when_lock_held(self, client: Any, tmp_path: Path) -> None:
+        pool = client.app.db.pool
+        directory = write_migrations(
+            tmp_path,
+            {"0400_skipped.sql": "CREATE TABLE skipped (id INTEGER);"},
+        )
+
+        async def migrate() -> list[int]:
+            async with pool.acquire() as conn:
+                return await Migrator(directory, lock_timeout=0.2).run(conn)
+
+        async with pool.acquire() as holder:
+            await holder.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+            try:
+                # Another task, as if in another process
+                assert await asyncio.create_task(migrate()) == []
+            finally:
+                await holder.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+        assert await pool.fetchval("SELECT to_regclass('skipped') IS NULL")
+
+    @pytest.mark.asyncio
+    async def test_baseline_from_database_version(self, client: Any) -> None:
+        pool = client.app.db.pool
+
+        # Not in a transaction, as online migrations are run again. All of
+        # them are idempotent.
+        async with pool.acquire() as conn:
+            # As left behind by the previous migration runner
+            await conn.execute("DROP TABLE schema_migrations")
+            await conn.execute("SET mg.version TO 3")
+
+            assert await Migrator().run(conn) == [
+                m.version for m in Migrator().load() if m.version > 3
+            ]
+
+            res = await conn.fetch("SELECT version FROM schema_migrations")
+            assert {r["version"] for r in res} == {m.version for m in Migrator().load()}
+            await conn.execute("RESET mg.version")
+
+    @pytest.mark.asyncio
+    async def test_online_migration_resumes(
+        self,
+        client: Any,
+        tmp_path: Path,
+    ) -> None:
+        pool = client.app.db.pool
+        directory = write_migrations(tmp_path, {"0500_online.sql": ONLINE_MIGRATION})
+        migrator = Migrator(directory, batch_pause=0)
+
+        # The last statement fails, after the others were committed
+        async with pool.acquire() as conn:
+            with pytest.raises(UndefinedTableError):
+                await migrator.run(conn)
+
+        res = await pool.fetch(
+            "SELECT step FROM schema_migration_steps WHERE version = 500"
+        )
+        assert sorted(r["step"] for r in res) == [0, 1, 2, 3, 4]
+        query = "SELECT count(*) FROM online_log WHERE doubled = value * 2"
+        assert await pool.fetchval(query) == 25
+
+        await pool.execute("CREATE TABLE online_dependency (id INTEGER)")
+        async with pool.acquire() as conn:
+            assert await migrator.run(conn) == [500]
+
+        # The completed statements were not run again
+        assert await pool.fetchval("SELECT count(*) FROM online_log") == 25
+        query = "SELECT indisvalid FROM pg_index WHERE indexrelid = $1::regclass"
+        assert await pool.fetchval(query, "online_log_doubled_idx")
+        query = "SELECT count(*) FROM schema_migration_steps WHERE version = 500"
+        assert await pool.fetchval(query) == 0
+
+    def test_online_migration_steps(self, tmp_path: Path) -> None:
+        directory = write_migrations(tmp_path, {"0500_online.sql": ONLINE_MIGRATION})
+        migration = Migrator(directory).load()[0]
+
+        assert migration.online
+        steps = migration.steps()
+        assert len(steps) == 6
+        assert [step.batch for step in steps] == [
+            False,
+            False,
+            False,
+            True,
+            False,
+            False,
+        ]
+        assert steps[4].sql == (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS online_log_doubled_idx\n"
+            "ON online_log (doubled);"
+        )
+
+    def test_batch_steps_must_report_rows(self, tmp_path: Path) -> None:
+        directory = write_migrations(
+            tmp_path,
+            {
+                "0500_online.sql": (
+                    "-- migrate: online\n"
+                    "-- migrate: batch\n"
+                    "SELECT count(*) FROM online_log;\n"
+                )
+            },
+        )
+        migration = Migrator(directory).load()[0]
+
+        with pytest.raises(ValueError):
+            migration.steps()
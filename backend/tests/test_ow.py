@@ -68,6 +68,11 @@ ME_GROUPS_RESPONSE = [
                 "user_id": 1,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
             {
                 "ow_user_id": 1381,
@@ -78,6 +83,11 @@ ME_GROUPS_RESPONSE = [
                 "user_id": 2,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
             {
                 "ow_user_id": 1383,
@@ -88,6 +98,11 @@ ME_GROUPS_RESPONSE = [
                 "user_id": 3,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
             {
                 "ow_user_id": 2027,
@@ -98,6 +113,11 @@ ME_GROUPS_RESPONSE = [
                 "user_id": 4,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
             {
                 "ow_user_id": 2219,
@@ -108,6 +128,11 @@ ME_GROUPS_RESPONSE = [
                 "user_id": 5,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
             {
                 "ow_user_id": 1705,
@@ -118,6 +143,11 @@ ME_GROUPS_RESPONSE = [
                 "user_id": 6,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
             {
                 "ow_user_id": 1395,
@@ -128,6 +158,11 @@ ME_GROUPS_RESPONSE = [
                 "user_id": 7,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
         ],
     }
@@ -171,6 +206,11 @@ ME_GROUPS_UPDATED_RESPONSE = [
                 "user_id": 1,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
             {
                 "ow_user_id": 1381,
@@ -181,6 +221,11 @@ ME_GROUPS_UPDATED_RESPONSE = [
                 "user_id": 2,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
             {
                 "ow_user_id": 1383,
@@ -191,6 +236,11 @@ ME_GROUPS_UPDATED_RESPONSE = [
                 "user_id": 3,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
             {
                 "ow_user_id": 2027,
@@ -201,6 +251,11 @@ ME_GROUPS_UPDATED_RESPONSE = [
                 "user_id": 4,
                 "active": False,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
             {
                 "ow_user_id": 2219,
@@ -211,6 +266,11 @@ ME_GROUPS_UPDATED_RESPONSE = [
                 "user_id": 5,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
             # Removed user here
             {
@@ -222,6 +282,11 @@ ME_GROUPS_UPDATED_RESPONSE = [
                 "user_id": 7,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
             {  # Added user here
                 "ow_user_id": 1998,
@@ -232,6 +297,11 @@ ME_GROUPS_UPDATED_RESPONSE = [
                 "user_id": 8,
                 "active": True,
                 "punishments": [],
+                "total_count": 0,
+                "unpaid_count": 0,
+                "total_value": 0,
+                "unpaid_value": 0,
+                "punishment_type_totals": [],
             },
         ],
     }
@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any
+
+import pytest
+from app.config import settings
+from app.utils.pool_monitor import MonitoredPool
+from tests.fixtures import client
+
+
+async def hold(pool: MonitoredPool, seconds: float, in_use: list[int]) -> None:
+    async with pool.acquire() as conn:
+        in_use.append(pool.counters.in_use)
+        await conn.execute("SELECT pg_sleep($1)", seconds)
+
+
+class TestPoolMonitor:
+    @pytest.mark.asyncio
+    async def test_limit(self, client: Any) -> None:
+        pool = MonitoredPool(client.app.db.raw_pool, limit=2)
+        in_use: list[int] = []
+
+        tasks = [asyncio.create_task(hold(pool, 0.05, in_use)) for _ in range(4)]
+        await asyncio.sleep(0.02)
+        assert pool.counters.waiters == 2
+
+        await asyncio.gather(*tasks)
+        assert max(in_use) == 2
+        assert pool.stats() | {"acquire_ms": None} == {
+            "in_use": 0,
+            "waiters": 0,
+            "limit": 2,
+            "max_limit": 2,
+            "grows": 0,
+            "shrinks": 0,
+            "acquire_ms": None,
+        }
+        assert pool.counters.wait_times.stats()["count"] == 4
+
+    @pytest.mark.asyncio
+    async def test_adaptive_limit(self, client: Any) -> None:
+        pool = MonitoredPool(
+            client.app.db.raw_pool,
+            limit=1,
+            max_limit=3,
+            grow_threshold=0.01,
+            shrink_after=0.1,
+        )
+        assert pool.sizing.adaptive
+        in_use: list[int] = []
+
+        await asyncio.gather(*(hold(pool, 0.05, in_use) for _ in range(6)))
+        limit = pool.sizing.limit
+        assert limit > 1
+        assert max(in_use) == limit
+        assert pool.counters.grows == limit - 1
+
+        # Shrinks back once acquires stopped waiting
+        await asyncio.sleep(0.1)
+        for _ in range(limit - 1):
+            await hold(pool, 0, in_use)
+            await asyncio.sleep(0.1)
+
+        assert pool.sizing.limit == 1
+        assert pool.counters.shrinks == pool.counters.grows
+
+    @pytest.mark.asyncio
+    async def test_metrics(self, client: Any) -> None:
+        response = await client.get("/metrics")
+        assert response.status_code == 200
+
+        stats = response.json()["pool"]
+        assert stats["max_size"] == settings.postgres_pool_max_size
+        assert stats["limit"] == settings.postgres_pool_max_size
+        assert stats["in_use"] == 0
+        assert stats["waiters"] == 0
+        assert stats["acquire_ms"]["count"] > 0
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+from typing import Any
+
+import pytest
+from app.exceptions import PoolTraceViolation
+from app.utils.pool_tracer import TracedPool
+from tests.fixtures import client
+
+
+class TestPoolTracer:
+    @pytest.mark.asyncio
+    async def test_nested_acquire_raises(self, client: Any) -> None:
+        pool = client.app.db.pool
+        assert isinstance(pool, TracedPool)
+        nested_acquires = pool.counters.nested_acquires
+
+        async with pool.acquire():
+            with pytest.raises(PoolTraceViolation, match="test_pool_tracer.py"):
+                await client.app.db.get_raw_users()
+
+        assert pool.counters.nested_acquires == nested_acquires + 1
+        assert pool.stats()["held"] == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_tasks_are_not_nested(self, client: Any) -> None:
+        pool = client.app.db.pool
+        nested_acquires = pool.counters.nested_acquires
+
+        async def hold() -> None:
+            async with pool.acquire() as conn:
+                await asyncio.sleep(0.01)
+                await conn.execute("SELECT 1")
+
+        await asyncio.gather(*(hold() for _ in range(5)))
+
+        assert pool.counters.nested_acquires == nested_acquires
+
+    @pytest.mark.asyncio
+    async def test_long_hold_is_logged(self, client: Any, caplog: Any) -> None:
+        pool = TracedPool(client.app.db.pool.pool, hold_threshold=0.01)
+
+        with caplog.at_level(logging.WARNING, logger="app.utils.pool_tracer"):
+            conn = await pool.acquire()
+            await asyncio.sleep(0.02)
+            await pool.release(conn)
+
+        assert pool.counters.long_holds == 1
+        assert "was held for" in caplog.text
+        assert "test_pool_tracer.py" in caplog.text
+
+    @pytest.mark.asyncio
+    async def test_metrics(self, client: Any) -> None:
+        response = await client.get("/metrics")
+        assert response.status_code == 200
+
+        trace = response.json()["pool"]["trace"]
+        assert trace["acquires"] > 0
+        assert trace["wait_ms"]["count"] == trace["acquires"]
@@ -0,0 +1,346 @@
+import datetime
+import inspect
+import json
+from typing import Any, Iterable
+
+import pytest
+from app.db import Database
+from app.models.group import GroupCreate
+from app.models.group_member import GroupMemberCreate, GroupMemberUpdate
+from app.models.group_stats import StatsBucket
+from app.models.leaderboard import LeaderboardOrder, LeaderboardPeriod
+from app.models.punishment import PunishmentCreate, PunishmentFilters
+from app.models.punishment_type import PunishmentTypeCreate
+from app.models.user import UserCreate, UserUpdate
+from app.queries import (
+    GET_LEADERBOARD_REFRESHED_AT,
+    IS_LEADERBOARD_FRESH,
+    REFRESH_LEADERBOARD,
+    group_user_rows_json_query,
+)
+from app.types import (
+    GroupId,
+    OWGroupUserId,
+    OWUserId,
+    PunishmentId,
+    PunishmentTypeId,
+    UserId,
+)
+from asyncpg import Connection
+from tests.fixtures import client
+
+GROUPS = 500
+USERS = 20_000
+PUNISHMENTS_PER_USER = 2
+
+SEED = f"""
+INSERT INTO groups(ow_group_id, name, name_short, rules, image)
+SELECT i, 'Group ' || i, 'G' || i, 'No rules', 'NoImage'
+FROM generate_series(1, {GROUPS}) as i;
+
+INSERT INTO punishment_types(group_id, name, value, logo_url)
+SELECT g.group_id, t.name, 33, 'logo.svg'
+FROM groups as g CROSS JOIN (VALUES ('A'), ('B'), ('C')) as t(name);
+
+INSERT INTO users(ow_user_id, first_name, last_name, email)
+SELECT i, 'First', 'Last', 'user' || i || '@test.com'
+FROM generate_series(1, {USERS}) as i;
+
+INSERT INTO group_members(group_id, user_id, ow_group_user_id)
+SELECT u.user_id % {GROUPS} + 1, u.user_id, u.user_id FROM users as u;
+
+INSERT INTO group_punishments(
+    group_id, user_id, punishment_type_id, reason, amount,
+    created_by, verified_by, verified_time
+)
+SELECT
+    m.group_id, m.user_id, t.punishment_type_id, 'Reason', 1, m.user_id,
+    CASE WHEN i % 2 = 0 THEN m.user_id END,
+    CASE WHEN i % 2 = 0 THEN now() END
+FROM group_members as m
+INNER JOIN punishment_types as t ON t.group_id = m.group_id AND t.name = 'A'
+CROSS JOIN generate_series(1, {PUNISHMENTS_PER_USER}) as i;
+
+INSERT INTO group_syncs(group_id, last_synced_at, payload_hash)
+SELECT group_id, now() at time zone 'utc', 'hash' FROM groups;
+
+REFRESH MATERIALIZED VIEW group_leaderboard;
+
+ANALYZE;
+"""
+
+# Queries that read a whole table, or any one row of it, on purpose
+FULL_SCANS = {
+    "SELECT * FROM users",
+    GET_LEADERBOARD_REFRESHED_AT,
+    IS_LEADERBOARD_FRESH,
+    REFRESH_LEADERBOARD,
+}
+
+# Not queries on the data, or checked separately
+NOT_COVERED = {
+    "async_init",
+    "close",
+    "load_db_migrations",
+    "stream_group_users_json",
+}
+
+
+# The tables of the app. Queries asyncpg runs on the system catalogs are
+# logged as well, and are ignored.
+TABLES = {
+    "users",
+    "groups",
+    "group_members",
+    "punishment_types",
+    "group_punishments",
+    "group_syncs",
+    "group_member_totals",
+    "group_leaderboard",
+    "group_versions",
+}
+
+
+def seq_scans(plan: dict[str, Any]) -> list[str]:
+    scans = []
+    if plan["Node Type"] == "Seq Scan" and plan["Relation Name"] in TABLES:
+        scans.append(plan["Relation Name"])
+    for subplan in plan.get("Plans", []):
+        scans.extend(seq_scans(subplan))
+    return scans
+
+
+async def run_workload(db: Database, conn: Any) -> set[str]:
+    """Calls every query method of Database on the seeded data. Returns the
+    names of the methods called.
+    """
+    called: set[str] = set()
+
+    async def call(name: str, *args: Any, **kwargs: Any) -> Any:
+        called.add(name)
+        return await getattr(db, name)(*args, conn=conn, **kwargs)
+
+    group_id = GroupId(1)
+    user_id = UserId(GROUPS)  # A member of group 1
+    ow_user_id = OWUserId(GROUPS)
+
+    await call("get_raw_users")
+    await call("get_user", user_id)
+    await call("get_user", ow_user_id, is_ow_user_id=True)
+    await call("get_principal", ow_user_id)
+    await call("get_user_groups", user_id)
+    await call("get_user_groups", ow_user_id, is_ow_user_id=True)
+    await call("is_in_group", user_id, group_id)
+    await call("is_in_group", ow_user_id, group_id, is_ow_user_id=True)
+    await call(
+        "get_fresh_ow_group_ids",
+        user_id,
+        [1, 2, 3],
+        datetime.timedelta(minutes=1),
+    )
+    await call("touch_group_sync_if_unchanged", 1, "hash")
+    await call("set_group_synced", group_id, "hash")
+
+    await call("get_group", group_id)
+    await call("get_group_json", group_id)
+    await call("get_group_users_json", group_id)
+    await call(
+        "get_group_users_json", group_id, filters=PunishmentFilters(verified=False)
+    )
+    await call("get_raw_punishments_for_user", group_id, user_id)
+    await call("get_raw_punishments_for_users", group_id, [user_id])
+    await call("get_group_user", group_id, user_id)
+    await call("get_raw_group_users", group_id)
+    await call("get_group_users", group_id)
+    await call("get_group_members_raw", group_id)
+    await call("get_punishment_types", group_id)
+    await call("get_punishments", user_id, group_id)
+    page = await call("get_punishments_page", group_id, user_id, 2)
+    await call(
+        "get_punishments_page",
+        group_id,
+        user_id,
+        2,
+        after=(page[-1].created_time, page[-1].punishment_id),
+        filters=PunishmentFilters(verified=False),
+    )
+    await call("get_group_version", group_id)
+    await call("get_user_version", user_id)
+    await call("get_user_group_versions", user_id)
+    await call("get_group_stats", group_id, StatsBucket.WEEK)
+    await call("refresh_leaderboard", 0)
+    for order in LeaderboardOrder:
+        await call("get_leaderboard", LeaderboardPeriod.WEEK, order, 10)
+        await call(
+            "get_leaderboard", LeaderboardPeriod.WEEK, order, 10, group_id=group_id
+        )
+
+    new_user = UserCreate(
+        ow_user_id=OWUserId(USERS + 1),
+        first_name="New",
+        last_name="User",
+        email="new@test.com",
+    )
+    res = await call("insert_user", new_user)
+    new_user_id = res["id"]
+    await call(
+        "update_user",
+        new_user_id,
+        UserUpdate(**new_user.dict(), user_id=new_user_id),
+    )
+    await call("update_users", [UserUpdate(**new_user.dict(), user_id=new_user_id)])
+    await call("update_user_by_ow_user_id", new_user)
+    await call("insert_or_update_user", new_user)
+    await call(
+        "insert_many_users",
+        [
+            UserCreate(
+                ow_user_id=OWUserId(USERS + 2),
+                first_name="Other",
+                last_name="User",
+                email="other@test.com",
+            )
+        ],
+    )
+    await call("update_many_users_by_ow_id", [new_user])
+    await call("insert_or_update_users", [new_user])
+
+    new_group = GroupCreate(
+        name="New group",
+        name_short="New",
+        rules="No rules",
+        ow_group_id=GROUPS + 1,
+        image="NoImage",
+    )
+    res = await call("insert_group", new_group)
+    new_group_id = res["id"]
+    await call("update_group", new_group)
+    await call("insert_or_update_group", new_group)
+    await call(
+        "insert_user_in_group",
+        GroupMemberCreate(group_id=new_group_id, user_id=new_user_id),
+    )
+    await call(
+        "insert_users_in_group",
+        [GroupMemberCreate(group_id=new_group_id, user_id=user_id)],
+    )
+    await call(
+        "update_group_members",
+        [
+            GroupMemberUpdate(
+                group_id=group_id, user_id=user_id, ow_group_user_id=OWGroupUserId(1)
+            )
+        ],
+    )
+    await call("delete_user_from_group", new_group_id, new_user_id)
+    await call("delete_users_from_group", new_group_id, [user_id])
+
+    res = await call(
+        "insert_punishment_type",
+        group_id,
+        PunishmentTypeCreate(name="New", value=1, logo_url="logo.svg"),
+    )
+    punishment_type_id = PunishmentTypeId(res["id"])
+    await call(
+        "insert_punishments",
+        group_id,
+        user_id,
+        user_id,
+        [
+            PunishmentCreate(
+                punishment_type_id=punishment_type_id,
+                reason="Reason",
+                amount=1,
+            )
+        ],
+    )
+    punishment_id = PunishmentId(page[0].punishment_id)
+    await call("get_punishment", punishment_id)
+    await call("verify_punishment", punishment_id, user_id)
+    await call("delete_punishment", punishment_id)
+
+    res = await call(
+        "insert_punishment_type",
+        group_id,
+        PunishmentTypeCreate(name="Unused", value=1, logo_url="logo.svg"),
+    )
+    await call("delete_punishment_type", group_id, PunishmentTypeId(res["id"]))
+
+    return called
+
+
+class TestQueryPlans:
+    @pytest.mark.asyncio
+    async def test_no_sequential_scans(
+        self,
+        client: Any,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        db = client.app.db
+        queries: dict[str, tuple[Any, ...]] = {}
+
+        async def log_queries() -> set[str]:
+            """Runs the workload, recording every query sent through a
+            connection with the arguments of its first call.
+            """
+            with pytest.MonkeyPatch.context() as m:
+                for method in ("execute", "fetch", "fetchrow", "fetchval"):
+                    run = getattr(Connection, method)
+
+                    async def logged(
+                        conn: Connection,
+                        query: str,
+                        *args: Any,
+                        run: Any = run,
+                        **kwargs: Any,
+                    ) -> Any:
+                        queries.setdefault(query, args)
+                        return await run(conn, query, *args, **kwargs)
+
+                    m.setattr(Connection, method, logged)
+
+                executemany = Connection.executemany
+
+                async def logged_many(
+                    conn: Connection,
+                    query: str,
+                    args: Iterable[Any],
+                    **kwargs: Any,
+                ) -> Any:
+                    args = list(args)
+                    if args:
+                        queries.setdefault(query, tuple(args[0]))
+                    return await executemany(conn, query, args, **kwargs)
+
+                m.setattr(Connection, "executemany", logged_many)
+                return await run_workload(db, conn)
+
+        # Seeding, with the triggers on every inserted row, holds the
+        # connection for longer than requests may.
+        monkeypatch.setattr(db.pool, "hold_threshold", 60)
+
+        async with db.pool.acquire() as conn:
+            await conn.execute(SEED)
+            called = await log_queries()
+
+            # Read through a cursor, which is not logged
+            queries[group_user_rows_json_query()] = (GroupId(1), True)
+
+            failures = []
+            for query, args in list(queries.items()):
+                if query in FULL_SCANS:
+                    continue
+                plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args)
+                scans = seq_scans(json.loads(plan)[0]["Plan"])
+                if scans:
+                    failures.append(f"Seq Scan on {', '.join(scans)} in:\n{query}")
+
+        methods = {
+            name
+            for name, _ in inspect.getmembers(Database, inspect.iscoroutinefunction)
+        }
+        missing = methods - called - NOT_COVERED
+        assert not missing, f"Methods without a query plan check: {missing}"
+
+        if failures:
+            pytest.fail("\n\n".join(failures), pytrace=False)
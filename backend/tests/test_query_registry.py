@@ -0,0 +1,73 @@
+import asyncio
+from typing import Any
+
+import pytest
+from app.db import Database
+from app.queries import GET_USER, queries
+from app.types import GroupId, UserId
+from tests.fixtures import client
+
+
+class TestQueryRegistry:
+    @pytest.mark.asyncio
+    async def test_statements_prepared_on_every_connection(self, client: Any) -> None:
+        pool = client.app.db.pool
+        registered = {query.sql for query in queries.queries.values()}
+
+        async def prepared() -> set[str]:
+            async with pool.acquire() as conn:
+                res = await conn.fetch("SELECT statement FROM pg_prepared_statements")
+                # Hold on to the connection so every task gets its own
+                await asyncio.sleep(0.05)
+                return {r["statement"] for r in res}
+
+        results = await asyncio.gather(*(prepared() for _ in range(pool.get_size())))
+        assert all(registered <= statements for statements in results)
+
+    @pytest.mark.asyncio
+    async def test_new_connections_are_prepared(self, client: Any) -> None:
+        db = client.app.db
+        pool = db.pool
+        warmed = db.query_stats()["warmed"]
+
+        # Every connection is replaced on its next checkout
+        await pool.expire_connections()
+        async with pool.acquire() as conn:
+            res = await conn.fetch("SELECT statement FROM pg_prepared_statements")
+
+        assert db.query_stats()["warmed"] == warmed + len(queries.queries)
+        assert {query.sql for query in queries.queries.values()} <= {
+            r["statement"] for r in res
+        }
+
+    @pytest.mark.asyncio
+    async def test_metrics(self, client: Any) -> None:
+        db = client.app.db
+
+        def calls() -> int:
+            return int(db.query_stats()["statements"]["is_in_group"]["calls"])
+
+        before = calls()
+        await asyncio.gather(
+            *(db.is_in_group(UserId(1), GroupId(1)) for _ in range(20))
+        )
+        assert calls() == before + 20
+
+        response = await client.get("/metrics")
+        assert response.status_code == 200
+
+        stats = response.json()["queries"]
+        assert stats["warmed"] == db.query_stats()["warmed"]
+        assert set(stats["statements"]) == set(queries.queries)
+        assert stats["statements"]["is_in_group"]["calls"] == calls()
+        latency = stats["statements"]["is_in_group"]["latency_ms"]
+        assert latency["count"] == calls()
+
+        # Kept per database
+        stats = Database().query_stats()
+        assert stats["warmed"] == 0
+        assert stats["statements"]["is_in_group"]["calls"] == 0
+
+    def test_register_twice(self) -> None:
+        with pytest.raises(ValueError):
+            queries.register(GET_USER.name, GET_USER.sql)
@@ -0,0 +1,114 @@
+import asyncio
+from typing import Any
+
+import pytest
+from app.config import settings
+from app.exceptions import NotFound
+from app.models.user import UserCreate
+from app.types import GroupId, OWUserId, UserId
+from app.utils.replica import ReplicaPool
+from asyncpg import create_pool
+from tests.fixtures import replica_client
+
+
+class TestReplica:
+    @pytest.mark.asyncio
+    async def test_reads_routed_to_replica(self, replica_client: Any) -> None:
+        db = replica_client.app.db
+        replica = db.read_pool
+        assert isinstance(replica, ReplicaPool)
+        replica_reads = replica.replica_reads
+
+        await asyncio.create_task(db.get_user_groups(UserId(1)))
+        assert replica.replica_reads == replica_reads + 1
+
+        with pytest.raises(NotFound):
+            await asyncio.create_task(db.get_group(GroupId(1000)))
+        assert replica.replica_reads == replica_reads + 2
+
+    @pytest.mark.asyncio
+    async def test_reads_after_write_pinned_to_primary(
+        self,
+        replica_client: Any,
+    ) -> None:
+        db = replica_client.app.db
+        replica = db.read_pool
+        replica_reads = replica.replica_reads
+        primary_reads = replica.primary_reads
+
+        async def write_then_read() -> None:
+            await db.get_user_groups(UserId(1))
+            res = await db.insert_user(
+                UserCreate(
+                    ow_user_id=OWUserId(1),
+                    first_name="First",
+                    last_name="Last",
+                    email="first@test.com",
+                )
+            )
+            user = await db.get_user(res["id"])
+            assert user.ow_user_id == 1
+
+        await asyncio.create_task(write_then_read())
+
+        assert replica.replica_reads == replica_reads + 1
+        assert replica.primary_reads == primary_reads + 1
+
+        # Other requests are not pinned
+        await asyncio.create_task(db.get_user_groups(UserId(1)))
+        assert replica.replica_reads == replica_reads + 2
+
+    @pytest.mark.asyncio
+    async def test_fallback_when_lagging(self, replica_client: Any) -> None:
+        db = replica_client.app.db
+        replica = db.read_pool
+        primary_reads = replica.primary_reads
+
+        replica.health.max_lag = -1
+        try:
+            await replica.check()
+            assert not replica.health.healthy
+
+            await asyncio.create_task(db.get_user_groups(UserId(1)))
+            assert replica.primary_reads == primary_reads + 1
+        finally:
+            replica.health.max_lag = settings.replica_max_lag
+
+        await replica.check()
+        assert replica.health.healthy
+        assert replica.health.lag == 0
+
+    @pytest.mark.asyncio
+    async def test_fallback_when_down(self, replica_client: Any) -> None:
+        db = replica_client.app.db
+        replica = db.read_pool
+        primary_reads = replica.primary_reads
+
+        pool, replica.replica = replica.replica, await create_pool(
+            host=settings.postgres_host,
+            port=1,  # Nothing listens here
+            min_size=0,
+        )
+        try:
+            await asyncio.create_task(db.get_user_groups(UserId(1)))
+            assert replica.primary_reads == primary_reads + 1
+            assert not replica.health.healthy
+
+            await replica.check()
+            assert not replica.health.healthy
+        finally:
+            await replica.replica.close()
+            replica.replica = pool
+
+        await replica.check()
+        assert replica.health.healthy
+
+    @pytest.mark.asyncio
+    async def test_metrics(self, replica_client: Any) -> None:
+        response = await replica_client.get("/metrics")
+        assert response.status_code == 200
+
+        stats = response.json()["pool"]["replica"]
+        assert stats["healthy"]
+        assert stats["replica_reads"] > 0
+        assert stats["max_size"] == settings.postgres_pool_max_size
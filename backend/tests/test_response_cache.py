@@ -0,0 +1,119 @@
+import gzip
+from typing import Any
+
+import pytest
+from app.models.punishment import PunishmentCreate
+from app.types import GroupId
+from tests.fixtures import client, create_group
+
+IDENTITY = {"Accept-Encoding": "identity"}
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+async def punish(db: Any, group_id: GroupId) -> None:
+    members = await db.get_group_users(group_id)
+    punishment_type = (await db.get_punishment_types(group_id))[0]
+    await db.insert_punishments(
+        group_id,
+        members[0].user_id,
+        members[0].user_id,
+        [
+            PunishmentCreate(
+                punishment_type_id=punishment_type.punishment_type_id,
+                reason="Reason",
+                amount=1,
+            )
+        ],
+    )
+
+
+class TestResponseCache:
+    @pytest.mark.asyncio
+    async def test_group_response_cached(self, client: Any) -> None:
+        db = client.app.db
+        cache = client.app.app_state.group_responses
+        group_id, _ = await create_group(db, "Group", 5)
+        await punish(db, group_id)
+
+        for url in (f"/group/{group_id}", f"/group/{group_id}/users"):
+            stats = cache.stats()
+            response = await client.get(url, headers=IDENTITY)
+            assert response.status_code == 200
+            assert "content-encoding" not in response.headers
+
+            gzip_response = await client.get(url, headers=GZIP)
+            assert gzip_response.status_code == 200
+            assert gzip_response.headers["content-encoding"] == "gzip"
+            assert gzip_response.headers["vary"] == "Accept-Encoding"
+            assert gzip_response.content == response.content
+
+            assert cache.stats()["misses"] == stats["misses"] + 1
+            assert cache.stats()["hits"] == stats["hits"] + 1
+
+        # Compressed once, when cached
+        cached = cache.get(
+            (("group", True), group_id, await db.get_group_version(group_id))
+        )
+        assert cached is not None
+        assert gzip.decompress(cached.gzipped) == cached.body
+        assert cached.body == (await db.get_group_json(group_id)).encode()
+
+    @pytest.mark.asyncio
+    async def test_group_response_invalidated(self, client: Any) -> None:
+        db = client.app.db
+        group_id = GroupId(1)
+        url = f"/group/{group_id}"
+
+        response = await client.get(url)
+        await punish(db, group_id)
+        new_response = await client.get(url)
+        assert new_response.json() != response.json()
+        assert new_response.content == (await db.get_group_json(group_id)).encode()
+
+        # Filtered responses are not cached, and still compressed
+        stats = client.app.app_state.group_responses.stats()
+        response = await client.get(url, params={"verified": False}, headers=GZIP)
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert client.app.app_state.group_responses.stats() == stats
+
+        response = await client.get("/group/1000")
+        assert response.status_code == 404
+        response = await client.get("/group/1000/users")
+        assert response.status_code == 200
+        assert response.json() == []
+
+    @pytest.mark.asyncio
+    async def test_group_response_read_on_one_connection(
+        self, client: Any, monkeypatch: Any
+    ) -> None:
+        db = client.app.db
+        group_id, _ = await create_group(db, "Connection", 2)
+        connections = []
+
+        def recorded(method: Any) -> Any:
+            async def wrapper(*args: Any, conn: Any = None, **kwargs: Any) -> Any:
+                connections.append(conn)
+                return await method(*args, conn=conn, **kwargs)
+
+            return wrapper
+
+        for name in ("get_group_version", "get_group_json", "get_group_users_json"):
+            monkeypatch.setattr(db, name, recorded(getattr(db, name)))
+
+        for url in (f"/group/{group_id}", f"/group/{group_id}/users"):
+            connections.clear()
+            response = await client.get(url)
+            assert response.status_code == 200
+            assert len(connections) == 2
+            assert connections[0] is not None
+            assert connections[0] is connections[1]
+
+    @pytest.mark.asyncio
+    async def test_metrics(self, client: Any) -> None:
+        response = await client.get("/metrics")
+        assert response.status_code == 200
+
+        stats = response.json()["caches"]["group_responses"]
+        assert stats["bytes"] > 0
+        assert 0 < stats["hit_ratio"] < 1
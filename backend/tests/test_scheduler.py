@@ -0,0 +1,156 @@
+import asyncio
+from typing import Any, cast
+
+import pytest
+from app.exceptions import NotFound
+from app.scheduler import BACKGROUND, INTERACTIVE, SyncScheduler
+from app.types import OWUserId
+
+OW_USER_ID = OWUserId(1)
+
+
+class FakeOWSync:
+    def __init__(
+        self,
+        failures: int = 0,
+        delay: float = 0,
+        error: type[Exception] = RuntimeError,
+    ) -> None:
+        self.calls: list[int] = []
+        self.group_data: list[dict[str, Any]] = []
+        self.failures = failures
+        self.delay = delay
+        self.error = error
+
+    async def sync_group_for_user(
+        self,
+        ow_user_id: OWUserId,
+        group_data: dict[str, Any],
+        *,
+        force: bool = False,
+    ) -> None:
+        self.calls.append(group_data["id"])
+        self.group_data.append(group_data)
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise self.error("OW is down")
+
+
+def create_scheduler(ow_sync: FakeOWSync, **kwargs: Any) -> SyncScheduler:
+    scheduler = SyncScheduler(cast(Any, ow_sync), **kwargs)
+    scheduler.start()
+    return scheduler
+
+
+class TestSyncScheduler:
+    @pytest.mark.asyncio
+    async def test_queued_jobs_for_a_group_are_merged(self) -> None:
+        ow_sync = FakeOWSync(delay=0.01)
+        scheduler = create_scheduler(ow_sync, workers=1)
+
+        blocking = scheduler.enqueue(OW_USER_ID, {"id": 1})
+        await asyncio.sleep(0)  # Let the worker pick up the first job
+
+        waiters = [scheduler.enqueue(OW_USER_ID, {"id": 2}) for _ in range(5)]
+        await asyncio.gather(blocking, *waiters)
+
+        assert ow_sync.calls == [1, 2]
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_interactive_jobs_run_first(self) -> None:
+        ow_sync = FakeOWSync(delay=0.01)
+        scheduler = create_scheduler(ow_sync, workers=1)
+
+        blocking = scheduler.enqueue(OW_USER_ID, {"id": 1})
+        await asyncio.sleep(0)  # Let the worker pick up the first job
+
+        waiters = [
+            blocking,
+            scheduler.enqueue(OW_USER_ID, {"id": 2}, priority=BACKGROUND),
+            scheduler.enqueue(OW_USER_ID, {"id": 3}, priority=INTERACTIVE),
+            # Upgrades the queued background job
+            scheduler.enqueue(OW_USER_ID, {"id": 4}, priority=BACKGROUND),
+            scheduler.enqueue(OW_USER_ID, {"id": 4}, priority=INTERACTIVE),
+        ]
+        await asyncio.gather(*waiters)
+
+        assert ow_sync.calls == [1, 3, 4, 2]
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_failed_jobs_are_retried(self) -> None:
+        ow_sync = FakeOWSync(failures=2)
+        scheduler = create_scheduler(ow_sync, max_retries=3, retry_delay=0.01)
+
+        await scheduler.enqueue(OW_USER_ID, {"id": 1})
+
+        assert ow_sync.calls == [1, 1, 1]
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_failed_jobs_give_up(self) -> None:
+        ow_sync = FakeOWSync(failures=5)
+        scheduler = create_scheduler(ow_sync, max_retries=1, retry_delay=0.01)
+
+        with pytest.raises(RuntimeError):
+            await scheduler.enqueue(OW_USER_ID, {"id": 1})
+
+        assert ow_sync.calls == [1, 1]
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_not_found_jobs_are_not_retried(self) -> None:
+        ow_sync = FakeOWSync(failures=5, error=NotFound)
+        scheduler = create_scheduler(ow_sync, max_retries=3, retry_delay=0.01)
+
+        with pytest.raises(NotFound):
+            await scheduler.enqueue(OW_USER_ID, {"id": 1})
+
+        assert ow_sync.calls == [1]
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_retried_jobs_keep_newer_data(self) -> None:
+        ow_sync = FakeOWSync(failures=1, delay=0.02)
+        scheduler = create_scheduler(ow_sync, workers=1, retry_delay=0.01)
+
+        failing = scheduler.enqueue(OW_USER_ID, {"id": 1, "name": "Old"})
+        await asyncio.sleep(0)  # Let the worker pick up the first job
+
+        # The retry is merged into the newer job queued behind the blocking one
+        blocking = scheduler.enqueue(OW_USER_ID, {"id": 2})
+        newer = scheduler.enqueue(OW_USER_ID, {"id": 1, "name": "New"})
+        await asyncio.gather(failing, blocking, newer)
+
+        assert ow_sync.calls == [1, 2, 1]
+        assert ow_sync.group_data[-1]["name"] == "New"
+        await scheduler.stop()
+
+    @pytest.mark.asyncio
+    async def test_stop_resolves_running_jobs(self) -> None:
+        ow_sync = FakeOWSync(delay=10)
+        scheduler = create_scheduler(ow_sync, workers=1)
+
+        running = scheduler.enqueue(OW_USER_ID, {"id": 1})
+        await asyncio.sleep(0)  # Let the worker pick up the job
+        await scheduler.stop(timeout=0.01)
+
+        assert running.done()
+        with pytest.raises(RuntimeError):
+            running.result()
+
+    @pytest.mark.asyncio
+    async def test_stop_drains_queue(self) -> None:
+        ow_sync = FakeOWSync(delay=0.01)
+        scheduler = create_scheduler(ow_sync, workers=2)
+
+        waiters = [scheduler.enqueue(OW_USER_ID, {"id": i}) for i in range(6)]
+        await scheduler.stop()
+
+        assert all(waiter.done() for waiter in waiters)
+        assert sorted(ow_sync.calls) == list(range(6))
+
+        with pytest.raises(RuntimeError):
+            scheduler.enqueue(OW_USER_ID, {"id": 1})
@@ -0,0 +1,154 @@
+from typing import Any
+
+from app.models.principal import Principal
+from app.state import State
+from app.types import GroupId, OWUserId, UserId
+from app.utils.cache import SizedLRUCache, TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestState:
+    def test_cache_lru_eviction(self) -> None:
+        cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1  # "b" is now least recently used
+
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert len(cache) == 2
+        assert cache.stats()["evictions"] == 1
+
+    def test_cache_ttl(self, monkeypatch: Any) -> None:
+        clock = FakeClock()
+        monkeypatch.setattr("app.utils.cache.monotonic", clock)
+
+        cache: TTLCache[str, int] = TTLCache(maxsize=10, ttl=5)
+        cache.set("a", 1)
+        clock.now = 4
+        assert cache.get("a") == 1
+
+        clock.now = 6
+        assert cache.get("a") is None
+        assert len(cache) == 0
+        assert cache.stats()["expirations"] == 1
+
+    def test_cache_on_evict(self) -> None:
+        evicted: list[tuple[str, int]] = []
+        cache: TTLCache[str, int] = TTLCache(
+            maxsize=2, ttl=60, on_evict=lambda key, value: evicted.append((key, value))
+        )
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("c", 3)
+        assert cache.pop("b") == 2
+        assert cache.pop("b") is None
+        cache.clear()
+
+        assert evicted == [("a", 1), ("b", 2), ("c", 3)]
+        assert cache.stats()["evictions"] == 1
+
+    def test_sized_cache_eviction(self) -> None:
+        cache: SizedLRUCache[str, bytes] = SizedLRUCache(maxbytes=10, sizeof=len)
+        cache.set("a", b"1234")
+        cache.set("b", b"1234")
+        assert cache.get("a") == b"1234"  # "b" is now least recently used
+
+        cache.set("c", b"1234")
+        assert cache.get("b") is None
+        assert cache.nbytes == 8
+
+        cache.set("a", b"12")  # Replacing a value updates the size
+        assert cache.nbytes == 6
+        cache.set("d", b"12345678901")  # Larger than the cache
+        assert cache.get("d") is None
+
+        assert cache.stats() == {
+            "size": 2,
+            "bytes": 6,
+            "maxbytes": 10,
+            "hits": 1,
+            "misses": 2,
+            "hit_ratio": 0.3333,
+            "evictions": 1,
+        }
+
+    def test_state_expired_token(self, monkeypatch: Any) -> None:
+        clock = FakeClock()
+        monkeypatch.setattr("app.utils.cache.monotonic", clock)
+
+        state = State()
+        state.add_access_token("token", OWUserId(1))
+        assert state.get_ow_user_id_by_access_token("token") == 1
+        assert state.get_access_token_by_ow_user_id(OWUserId(1)) == "token"
+
+        clock.now = state.access_tokens_to_ow_user_ids.ttl + 1
+        assert state.get_ow_user_id_by_access_token("token") is None
+        assert state.get_access_token_by_ow_user_id(OWUserId(1)) is None
+        assert not state.ow_user_ids_to_access_tokens
+
+    def test_state_replaces_old_token(self) -> None:
+        state = State()
+        state.add_access_token("old", OWUserId(1))
+        state.add_access_token("new", OWUserId(1))
+
+        assert state.get_ow_user_id_by_access_token("old") is None
+        assert state.get_ow_user_id_by_access_token("new") == 1
+        assert state.get_access_token_by_ow_user_id(OWUserId(1)) == "new"
+
+    def test_state_bounded(self) -> None:
+        state = State()
+        maxsize = state.access_tokens_to_ow_user_ids.maxsize
+        for i in range(maxsize + 100):
+            state.add_access_token(f"token{i}", OWUserId(i))
+
+        assert len(state.access_tokens_to_ow_user_ids) == maxsize
+        assert len(state.ow_user_ids_to_access_tokens) == maxsize
+
+    def test_state_principals(self, monkeypatch: Any) -> None:
+        clock = FakeClock()
+        monkeypatch.setattr("app.utils.cache.monotonic", clock)
+
+        def principal(user_id: int) -> Principal:
+            return Principal(
+                user_id=UserId(user_id),
+                ow_user_id=OWUserId(user_id + 100),
+                group_ids=frozenset({GroupId(1)}),
+            )
+
+        state = State()
+        state.add_principal(principal(1))
+        state.add_principal(principal(2))
+        assert state.get_principal(OWUserId(101)) == principal(1)
+
+        state.invalidate_principals([UserId(1), UserId(3)])
+        assert state.get_principal(OWUserId(101)) is None
+        assert state.get_principal(OWUserId(102)) == principal(2)
+        assert set(state.user_ids_to_ow_user_ids) == {2}
+
+        # Expired principals are dropped from the user id mapping as well
+        clock.now = state.principals.ttl + 1
+        assert state.get_principal(OWUserId(102)) is None
+        assert not state.user_ids_to_ow_user_ids
+
+        # As are cleared ones
+        state.add_principal(principal(1))
+        state.principals.clear()
+        assert not state.user_ids_to_ow_user_ids
+
+    def test_state_cleared_tokens(self) -> None:
+        state = State()
+        state.add_access_token("token", OWUserId(1))
+        state.access_tokens_to_ow_user_ids.clear()
+
+        assert state.get_access_token_by_ow_user_id(OWUserId(1)) is None
+        assert not state.ow_user_ids_to_access_tokens
@@ -0,0 +1,311 @@
+import asyncio
+from typing import Any
+
+import pytest
+from app.config import settings
+from app.types import OWUserId
+from tests.fixtures import (
+    client,
+    create_group,
+    ow_group_users_response,
+    ow_groups_for_user_response,
+    ow_profile_response,
+    small_pool_client,
+)
+
+
+class TestSync:
+    @pytest.mark.asyncio
+    async def test_concurrent_access_token_lookups_are_coalesced(
+        self,
+        client: Any,
+        monkeypatch: Any,
+    ) -> None:
+        app = client.app
+        profile_calls = 0
+        create_calls = 0
+
+        async def get_ow_profile_by_access_token(access_token: str) -> Any:
+            nonlocal profile_calls
+            profile_calls += 1
+            await asyncio.sleep(0.05)
+            return ow_profile_response
+
+        create_user_if_not_exists = app.ow_sync.create_user_if_not_exists
+
+        async def counting_create_user_if_not_exists(*args: Any, **kwargs: Any) -> Any:
+            nonlocal create_calls
+            create_calls += 1
+            return await create_user_if_not_exists(*args, **kwargs)
+
+        monkeypatch.setattr(
+            app.http,
+            "get_ow_profile_by_access_token",
+            get_ow_profile_by_access_token,
+        )
+        monkeypatch.setattr(
+            app.ow_sync,
+            "create_user_if_not_exists",
+            counting_create_user_if_not_exists,
+        )
+
+        results = await asyncio.gather(
+            *(app.ow_sync.sync_for_access_token("new-token") for _ in range(20))
+        )
+
+        assert profile_calls == 1
+        assert create_calls == 1
+        assert len(set(results)) == 1
+        assert results[0][1] == ow_profile_response["id"]
+
+        # Later calls are served from the access token cache.
+        await app.ow_sync.sync_for_access_token("new-token")
+        assert profile_calls == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_group_syncs_share_fetch_and_reconciliation(
+        self,
+        client: Any,
+        monkeypatch: Any,
+    ) -> None:
+        app = client.app
+        fetch_calls = 0
+        reconcile_calls = 0
+
+        async def get_ow_group_users(group_id: int) -> Any:
+            nonlocal fetch_calls
+            fetch_calls += 1
+            await asyncio.sleep(0.05)
+            return ow_group_users_response
+
+        sync_group = app.ow_sync.sync_group
+
+        async def counting_sync_group(*args: Any, **kwargs: Any) -> Any:
+            nonlocal reconcile_calls
+            reconcile_calls += 1
+            return await sync_group(*args, **kwargs)
+
+        monkeypatch.setattr(app.http, "get_ow_group_users", get_ow_group_users)
+        monkeypatch.setattr(app.ow_sync, "sync_group", counting_sync_group)
+        monkeypatch.setattr(app.app_state.ow_group_users, "ttl", 5)
+
+        group_data = ow_groups_for_user_response["results"][0]
+        ow_user_ids = [u["user"]["id"] for u in ow_group_users_response]
+        await asyncio.gather(
+            *(
+                app.ow_sync.sync_group_for_user(ow_user_id, group_data)
+                for ow_user_id in ow_user_ids * 5
+            )
+        )
+
+        assert fetch_calls == 1
+        assert reconcile_calls == 1
+
+        # The roster is reused inside the reuse window.
+        # The reconciliation is not, once the shared one has finished. It
+        # returns early on the unchanged payload.
+        await app.ow_sync.sync_group_for_user(ow_user_ids[0], group_data)
+        assert fetch_calls == 1
+        assert reconcile_calls == 2
+
+    @pytest.mark.asyncio
+    async def test_fresh_groups_are_skipped(
+        self,
+        client: Any,
+        monkeypatch: Any,
+    ) -> None:
+        app = client.app
+        fetch_calls = 0
+
+        async def get_ow_groups_by_user_id(user_id: int) -> Any:
+            return ow_groups_for_user_response
+
+        async def get_ow_group_users(group_id: int) -> Any:
+            nonlocal fetch_calls
+            fetch_calls += 1
+            return ow_group_users_response
+
+        monkeypatch.setattr(
+            app.http,
+            "get_ow_groups_by_user_id",
+            get_ow_groups_by_user_id,
+        )
+        monkeypatch.setattr(app.http, "get_ow_group_users", get_ow_group_users)
+        monkeypatch.setattr(settings, "group_sync_freshness", 60)
+
+        ow_user_id = ow_profile_response["id"]
+        user_id = await app.ow_sync.create_user_if_not_exists(
+            ow_user_id,
+            ow_profile_response["first_name"],
+            ow_profile_response["last_name"],
+            ow_profile_response["email"],
+        )
+        await app.ow_sync.sync_for_user(ow_user_id, user_id, force=True)
+        assert fetch_calls == 1
+
+        await app.ow_sync.sync_for_user(ow_user_id, user_id)
+        assert fetch_calls == 1
+
+        await app.ow_sync.sync_for_user(ow_user_id, user_id, force=True)
+        assert fetch_calls == 2
+
+    @pytest.mark.asyncio
+    async def test_unchanged_group_payload_is_skipped(
+        self,
+        client: Any,
+        monkeypatch: Any,
+    ) -> None:
+        app = client.app
+
+        async def get_ow_group_users(group_id: int) -> Any:
+            return ow_group_users_response
+
+        monkeypatch.setattr(app.http, "get_ow_group_users", get_ow_group_users)
+
+        group_data = ow_groups_for_user_response["results"][0]
+        ow_user_id = ow_profile_response["id"]
+        await app.ow_sync.sync_group_for_user(ow_user_id, group_data)
+
+        response = await client.get("/metrics")
+        before = response.json()["group_syncs"]
+
+        await app.ow_sync.sync_group_for_user(ow_user_id, group_data)
+
+        response = await client.get("/metrics")
+        after = response.json()["group_syncs"]
+        assert after["unchanged"] == before["unchanged"] + 1
+        assert after["applied"] == before["applied"]
+
+        changed_group_data = group_data | {"name_short": "Changed"}
+        await app.ow_sync.sync_group_for_user(ow_user_id, changed_group_data)
+
+        response = await client.get("/metrics")
+        after = response.json()["group_syncs"]
+        assert after["applied"] == before["applied"] + 1
+
+    @pytest.mark.asyncio
+    async def test_principal_is_cached_until_memberships_change(
+        self,
+        client: Any,
+        monkeypatch: Any,
+    ) -> None:
+        app = client.app
+        principal_calls = 0
+        group_id, user_ids = await create_group(app.db, "Principal", 1)
+        ow_user_id = OWUserId(group_id * 100)
+        app.app_state.add_access_token("principal-token", ow_user_id)
+
+        get_principal = app.db.get_principal
+
+        async def counting_get_principal(*args: Any, **kwargs: Any) -> Any:
+            nonlocal principal_calls
+            principal_calls += 1
+            return await get_principal(*args, **kwargs)
+
+        monkeypatch.setattr(app.db, "get_principal", counting_get_principal)
+
+        principal = await app.ow_sync.resolve_principal("principal-token")
+        assert principal.user_id == user_ids[0]
+        assert principal.group_ids == {group_id}
+        assert await app.ow_sync.resolve_principal("principal-token") == principal
+        assert principal_calls == 1
+
+        # The member is no longer in the group in OW
+        await app.ow_sync.handle_group_update(group_id, [], [])
+        principal = await app.ow_sync.resolve_principal("principal-token")
+        assert principal.group_ids == frozenset()
+        assert principal_calls == 2
+
+    @pytest.mark.asyncio
+    async def test_users_missing_from_the_group_are_not_retried(
+        self,
+        client: Any,
+        monkeypatch: Any,
+    ) -> None:
+        app = client.app
+        fetch_calls = 0
+        group_users = ow_group_users_response
+        new_group_user = ow_group_users_response[0] | {
+            "id": 999,
+            "user": ow_group_users_response[0]["user"]
+            | {"id": 999, "email": "missing@test.com"},
+        }
+
+        async def get_ow_groups_by_user_id(user_id: int) -> Any:
+            return ow_groups_for_user_response
+
+        async def get_ow_group_users(group_id: int) -> Any:
+            nonlocal fetch_calls
+            fetch_calls += 1
+            return group_users
+
+        monkeypatch.setattr(
+            app.http,
+            "get_ow_groups_by_user_id",
+            get_ow_groups_by_user_id,
+        )
+        monkeypatch.setattr(app.http, "get_ow_group_users", get_ow_group_users)
+
+        ow_user_id = OWUserId(999)
+        user_id = await app.ow_sync.create_user_if_not_exists(
+            ow_user_id, "First", "Last", "missing@test.com"
+        )
+
+        # The cached users are fetched again once, without retries
+        await app.ow_sync.sync_for_user(ow_user_id, user_id)
+        assert fetch_calls == 2
+        assert await app.db.get_user_groups(user_id) == []
+
+        # Users that joined after the users were cached are found
+        group_users = ow_group_users_response + [new_group_user]
+        await app.ow_sync.sync_for_user(ow_user_id, user_id)
+        assert fetch_calls == 3
+        assert len(await app.db.get_user_groups(user_id)) == 1
+
+
+class TestSyncStress:
+    @pytest.mark.asyncio
+    async def test_concurrent_syncs_do_not_exhaust_pool(
+        self,
+        small_pool_client: Any,
+        monkeypatch: Any,
+    ) -> None:
+        client = small_pool_client
+        app = client.app
+        users = [u["user"] for u in ow_group_users_response]
+
+        async def get_ow_profile_by_access_token(access_token: str) -> Any:
+            user = users[int(access_token) % len(users)]
+            return ow_profile_response | user
+
+        async def get_ow_groups_by_user_id(user_id: int) -> Any:
+            return ow_groups_for_user_response
+
+        async def get_ow_group_users(group_id: int) -> Any:
+            await asyncio.sleep(0.01)
+            return ow_group_users_response
+
+        monkeypatch.setattr(
+            app.http,
+            "get_ow_profile_by_access_token",
+            get_ow_profile_by_access_token,
+        )
+        monkeypatch.setattr(
+            app.http,
+            "get_ow_groups_by_user_id",
+            get_ow_groups_by_user_id,
+        )
+        monkeypatch.setattr(app.http, "get_ow_group_users", get_ow_group_users)
+
+        responses = await asyncio.wait_for(
+            asyncio.gather(
+                *(
+                    client.get("/group/me", headers={"Authorization": f"Bearer {i}"})
+                    for i in range(200)
+                )
+            ),
+            timeout=30,
+        )
+
+        assert all(response.status_code == 200 for response in responses)
+        assert app.ow_sync.pool.limit == 2